@@ -1,5 +1,41 @@
-from .agent import ToxicityAgent
-from .classifierAgent import ClassifierAgent
-from .responderAgent import ResponderAgent
-from .sarcasmDetector import SarcasmDetector
-from .translatorAgent import TranslatorAgent
\ No newline at end of file
+import importlib
+from typing import TYPE_CHECKING
+
+# The package's names resolve on first access (PEP 562), so `import agentai`
+# or `from agentai.pipelineRunner import PipelineRunner` does not load
+# rag_setup and every agent module up front.
+_EXPORTS = {
+    "ToxicityAgent":    ".agent",
+    "ClassifierAgent":  ".classifierAgent",
+    "FusedAgent":       ".fusedAgent",
+    "LanguageDetector": ".languageDetector",
+    "PipelineRunner":   ".pipelineRunner",
+    "PreClassifier":    ".preClassifier",
+    "ResponderAgent":   ".responderAgent",
+    "SarcasmDetector":  ".sarcasmDetector",
+    "TranslatorAgent":  ".translatorAgent",
+}
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .agent import ToxicityAgent
+    from .classifierAgent import ClassifierAgent
+    from .fusedAgent import FusedAgent
+    from .languageDetector import LanguageDetector
+    from .pipelineRunner import PipelineRunner
+    from .preClassifier import PreClassifier
+    from .responderAgent import ResponderAgent
+    from .sarcasmDetector import SarcasmDetector
+    from .translatorAgent import TranslatorAgent
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value   # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,47 +1,634 @@
-from rag_setup import ToxicityRAG
+from instrumentation import record_result
+from rag_setup import EMBEDDING_MODEL, RESULT_STORE_CONFIG, SEMANTIC_CACHE_CONFIG, ToxicityRAG
+from result_store import ResultStore
+from semantic_cache import SemanticCache
 from .classifierAgent import ClassifierAgent
+from .conversation    import ConversationStore, conversation_context, current_context
+from .deadline        import DEADLINE, DeadlineRun, StageEstimates, pipeline_deadline
+from .fusedAgent      import FusedAgent
+from .longDocument    import LongDocumentAnalyzer
+from .preClassifier   import PreClassifier
 from .responderAgent  import ResponderAgent
 from .sarcasmDetector import SarcasmDetector
+from .stageGraph      import LABELS, StageGraph
 from .translatorAgent import TranslatorAgent
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# "staged": translator → sarcasm → classifier → responder (4 LLM calls)
+# "fused":  one structured call that returns the same result dict; it is
+#           cached under its own key but always pays for the call — no
+#           local language fast path, no pre-classifier cascade
+PIPELINE_MODES = ("staged", "fused")
+
+# when the responder's LLM explanation is generated (staged mode):
+# "always":    for every message
+# "toxic":     only for TOXIC results; GOOD / NEUTRAL get a template
+# "on_demand": never up front — every result gets a template and callers
+#              ask for the LLM explanation with explain() / aexplain()
+EXPLAIN_POLICIES = ("always", "toxic", "on_demand")
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+async def _atimed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
 
 class ToxicityAgent:
-    def __init__(self):
-        self.rag = ToxicityRAG()
+    def __init__(self, mode: str = "staged", cascade: bool = False, cascade_thresholds: dict | None = None,
+                 cache: bool = True, explain: str = "always", speculative: bool = False,
+                 micro_batch: dict | None = None, long_document: dict | None = None,
+                 semantic_cache: bool | dict = False, early_exit: bool | dict = False,
+                 conversation: dict | None = None, result_store: bool | dict = False):
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode '{mode}', expected one of {PIPELINE_MODES}")
+        if explain not in EXPLAIN_POLICIES:
+            raise ValueError(f"Unknown explain policy '{explain}', expected one of {EXPLAIN_POLICIES}")
+        if cascade and mode != "staged":
+            # the fused call does its own translation; tier 1 only fits the staged pipeline
+            raise ValueError("cascade=True is only supported with mode='staged'")
+        if explain != "always" and mode != "staged":
+            # the fused call writes its explanation in the same completion
+            raise ValueError(f"explain='{explain}' is only supported with mode='staged'")
+        if speculative and mode != "staged":
+            raise ValueError("speculative=True is only supported with mode='staged'")
+        if micro_batch and mode != "staged":
+            raise ValueError("micro_batch is only supported with mode='staged'")
+        staged_graph = isinstance(early_exit, dict) or bool(early_exit)   # {}: graph, counters, no rules
+        if staged_graph and mode != "staged":
+            raise ValueError("early_exit is only supported with mode='staged'")
+        if staged_graph and speculative:
+            # speculation pays for the classifier before the sarcasm verdict is known
+            raise ValueError("early_exit and speculative=True cannot be combined")
+        self.mode           = mode
+        self.explain_policy = explain
+        # speculative: classify at face value while the SarcasmDetector runs,
+        # and re-classify only if the text turns out (possibly) sarcastic
+        self.speculative    = speculative
+        self._spec_pool     = None
+        self._spec_lock     = threading.Lock()
+        self.speculation    = {"runs": 0, "hits": 0, "time_saved_s": 0.0}
+        # deadlines: expected seconds per stage, and the pool sync stage calls run on
+        self.estimates      = StageEstimates()
+        self._deadline_pool = None
+        self.rag  = ToxicityRAG(cache=cache)
 
-        print("\n  Initialising agents …")
+        log.info("\n  Initialising agents …")
         self.translator = TranslatorAgent(self.rag)
         self.sarcasm    = SarcasmDetector(self.rag)   
         self.classifier = ClassifierAgent(self.rag)   
         self.responder  = ResponderAgent(self.rag)    
-        print("  All agents ready!\n")
+        self.fused      = FusedAgent(self.rag)
+        if micro_batch:
+            # e.g. {"max_batch": 16, "max_wait_ms": 20}; only the async path batches
+            self.sarcasm.enable_batching(**micro_batch)
+            self.classifier.enable_batching(**micro_batch)
+        # tier 1 of the cascade (staged mode only): settle clear GOOD / TOXIC locally
+        self.pre_classifier = PreClassifier(self.rag, thresholds=cascade_thresholds) if cascade else None
+        # e.g. {"max_tokens": 400, "overlap_tokens": 40, "max_concurrency": 8}: longer
+        # inputs are split into chunks, analyzed concurrently and merged worst-of
+        self.long_document  = LongDocumentAnalyzer(self, **long_document) if long_document else None
+        # True (EARLY_EXIT_RULES) or {name: rule}: run the staged pipeline as a stage graph
+        # that skips stages the SarcasmDetector's own verdict already settles
+        rules               = early_exit if isinstance(early_exit, dict) else None
+        self.graph          = StageGraph(self, rules=rules) if staged_graph else None
+        # True, or SEMANTIC_CACHE_CONFIG overrides: near-duplicates of an analyzed message reuse its result
+        self.semantic_cache = SemanticCache(
+            self.rag.embed, self._semantic_namespace(),
+            **{**SEMANTIC_CACHE_CONFIG, **(semantic_cache if isinstance(semantic_cache, dict) else {})},
+        ) if semantic_cache else None
+        # thread mode (detect_in_thread): per-conversation context windows, e.g.
+        # {"max_context_tokens": 320, "summary_tokens": 80, "idle_ttl_s": 1800}
+        self.threads        = ConversationStore(**(conversation or {}))
+        # True, or RESULT_STORE_CONFIG overrides: every returned result is appended to SQLite
+        self.result_store   = ResultStore(
+            **{**RESULT_STORE_CONFIG, **(result_store if isinstance(result_store, dict) else {})},
+        ) if result_store else None
+        log.info("  All agents ready!\n")
+
+    def _is_long(self, content: str) -> bool:
+        return self.long_document is not None and self.long_document.needs_split(content)
+
+    def warmup(self) -> dict:
+        """Pay every first-use cost now, concurrently: stage clients, the
+        example index, and the embedding model / pre-classifier corpus when
+        this configuration uses them. Returns {task: seconds}."""
+        needs_embedder = self.pre_classifier is not None or self.semantic_cache is not None
+        extra = {"pre_classifier": self.pre_classifier.load} if self.pre_classifier is not None else None
+        return self.rag.warmup(embedder=True if needs_embedder else None, extra=extra)
+
+    async def awarmup(self) -> dict:
+        return await asyncio.to_thread(self.warmup)
+
+    def _semantic_namespace(self) -> str:
+        # vectors depend on the embedding model; whole results on every stage's
+        # model and on how the pipeline is configured
+        models = "|".join(self.rag.model_for(stage) for stage in ("translator", "sarcasm", "classifier", "responder", "fused"))
+        namespace = f"{EMBEDDING_MODEL}:{self.mode}:{self.explain_policy}:{models}"
+        if self.graph is not None:   # early exits report other sub-labels / templates
+            namespace += ":early_exit=" + ",".join(self.graph.rules)
+        return namespace
+
+    def model_versions(self) -> dict:
+        """Model and prompt version behind each stage, stored with every result."""
+        stages = {"fused": self.fused} if self.mode == "fused" else {
+            "translator": self.translator, "sarcasm": self.sarcasm, "classifier": self.classifier,
+            "responder": self.responder,
+        }
+        versions = {stage: f"{self.rag.model_for(stage)}@v{agent.PROMPT_VERSION}" for stage, agent in stages.items()}
+        if self.pre_classifier is not None:
+            versions["pre_classifier"] = EMBEDDING_MODEL
+        return {"mode": self.mode, **versions}
+
+    def _store(self, result: dict, start: float) -> dict:
+        if self.result_store is not None:
+            self.result_store.add(result, time.perf_counter() - start, self.model_versions())
+        return result
+
+    def detect_and_respond(self, content: str, deadline_s: float | None = None) -> dict:
+        """`deadline_s`: return a (possibly degraded) verdict within that many seconds."""
+        start = time.perf_counter()
+        return self._store(self._analyze(content, deadline_s), start)
+
+    def _analyze(self, content: str, deadline_s: float | None = None) -> dict:
+        # detect_and_respond without storing the result (long-document chunks come through here)
+        if deadline_s is not None:
+            with pipeline_deadline(deadline_s):
+                return self._analyze(content)
+        if self._is_long(content):
+            return self.long_document.analyze(content)
+        if self.semantic_cache is not None and current_context() is None:   # a neighbour's verdict had other context
+            return self.semantic_cache.through(content, self._detect_and_respond)
+        return self._detect_and_respond(content)
+
+    def _detect_and_respond(self, content: str) -> dict:
+        if DEADLINE.get() is not None:
+            return self._detect_by_deadline(content, DEADLINE.get())
+        if self.mode == "fused":
+            return record_result(self.fused.analyze(content))
+
+        log.info("  PIPELINE START\n  Input: %.100s%s\n", content, "…" if len(content) > 100 else "")
+        if self.graph is not None:
+            return self.graph.run(content)
 
-    def detect_and_respond(self, content: str) -> dict:
-        print(f"  PIPELINE START")
-        print(f"  Input: {content[:100]}{'…' if len(content) > 100 else ''}\n")
-        
         translation     = self.translator.translate(content)
         working_content = translation["translated"]
-        sarcasm_result = self.sarcasm.detect(working_content)
-        toxicity, sub_label = self.classifier.classify(working_content, sarcasm_result)
-        explanation = self.responder.respond(working_content, toxicity, sub_label, sarcasm_result)
 
-        print(f"\n  Pipeline complete → {toxicity} (sarcasm: {sarcasm_result['is_sarcasm']})")
+        if self.pre_classifier is not None:
+            tier1 = self.pre_classifier.classify(working_content)
+            if tier1["settled"]:
+                return self._build_local_result(content, translation, tier1)
+
+        if self.speculative:
+            sarcasm_result, (toxicity, sub_label) = self._speculative_classify(working_content)
+        else:
+            sarcasm_result = self.sarcasm.detect(working_content)
+            toxicity, sub_label = self.classifier.classify(working_content, sarcasm_result)
+        if self._wants_llm_explanation(toxicity):
+            explanation, source = self.responder.respond(working_content, toxicity, sub_label, sarcasm_result), "llm"
+        else:
+            explanation, source = self.responder.template(toxicity, sub_label, sarcasm_result), "template"
+
+        return self._build_result(content, translation, sarcasm_result, toxicity, sub_label, explanation,
+                                  explanation_source=source)
+
+    async def adetect_and_respond(self, content: str, deadline_s: float | None = None) -> dict:
+        start = time.perf_counter()
+        return self._store(await self._aanalyze(content, deadline_s), start)
 
+    async def _aanalyze(self, content: str, deadline_s: float | None = None) -> dict:
+        if deadline_s is not None:
+            with pipeline_deadline(deadline_s):
+                return await self._aanalyze(content)
+        await self.rag.aconnect()
+        if self._is_long(content):
+            return await self.long_document.aanalyze(content)
+        if self.semantic_cache is not None and current_context() is None:
+            return await self.semantic_cache.athrough(content, self._adetect_and_respond)
+        return await self._adetect_and_respond(content)
+
+    def detect_in_thread(self, thread_id: str, content: str, speaker: str | None = None,
+                         deadline_s: float | None = None) -> dict:
+        """Analyze `content` as the next message of conversation `thread_id`:
+        the sarcasm and classifier prompts see a summary of the thread plus
+        its recent turns (see conversation.py), then the message joins it."""
+        self._check_thread_mode()
+        start = time.perf_counter()
+        with conversation_context(self.threads.context(thread_id)):
+            result = self._analyze(content, deadline_s)
+        return self._store(self._thread_result(thread_id, speaker, content, result), start)
+
+    async def adetect_in_thread(self, thread_id: str, content: str, speaker: str | None = None,
+                                deadline_s: float | None = None) -> dict:
+        self._check_thread_mode()
+        start = time.perf_counter()
+        with conversation_context(self.threads.context(thread_id)):
+            result = await self._aanalyze(content, deadline_s)
+        return self._store(self._thread_result(thread_id, speaker, content, result), start)
+
+    def _check_thread_mode(self) -> None:
+        if self.mode != "staged":
+            # the fused prompt has no place for earlier turns
+            raise ValueError("detect_in_thread is only supported with mode='staged'")
+
+    def _thread_result(self, thread_id: str, speaker: str | None, content: str, result: dict) -> dict:
+        thread = self.threads.record(thread_id, speaker, content, result)
+        return {**result, "thread": {"id": thread_id, "turns": thread.total_turns,
+                                     "context_tokens": thread.window}}
+
+    async def _adetect_and_respond(self, content: str) -> dict:
+        if DEADLINE.get() is not None:
+            return await self._adetect_by_deadline(content, DEADLINE.get())
+        if self.mode == "fused":
+            return record_result(await self.fused.aanalyze(content))
+
+        log.info("  PIPELINE START (async)\n  Input: %.100s%s\n", content, "…" if len(content) > 100 else "")
+        if self.graph is not None:
+            return await self.graph.arun(content)
+
+        translation     = await self.translator.atranslate(content)
+        working_content = translation["translated"]
+
+        if self.pre_classifier is not None:
+            tier1 = await self.pre_classifier.aclassify(working_content)
+            if tier1["settled"]:
+                return self._build_local_result(content, translation, tier1)
+
+        if self.speculative:
+            sarcasm_result, (toxicity, sub_label) = await self._aspeculative_classify(working_content)
+        else:
+            sarcasm_result = await self.sarcasm.adetect(working_content)
+            toxicity, sub_label = await self.classifier.aclassify(working_content, sarcasm_result)
+        if self._wants_llm_explanation(toxicity):
+            explanation, source = await self.responder.arespond(working_content, toxicity, sub_label, sarcasm_result), "llm"
+        else:
+            explanation, source = self.responder.template(toxicity, sub_label, sarcasm_result), "template"
+
+        return self._build_result(content, translation, sarcasm_result, toxicity, sub_label, explanation,
+                                  explanation_source=source)
+
+    # speculation: most texts come back "no" sarcasm, and then the classifier
+    # sees exactly the face-value input, so its call can overlap the
+    # SarcasmDetector's instead of waiting for it
+    @staticmethod
+    def _face_value(working_content: str) -> dict:
+        return {"is_sarcasm": "no", "meaning": working_content}
+
+    def _speculative_classify(self, working_content: str) -> tuple[dict, tuple[str, str]]:
+        with self._spec_lock:
+            if self._spec_pool is None:
+                self._spec_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative-sarcasm")
+        # copy_context: the pool thread keeps the caller's LLM priority
+        future = self._spec_pool.submit(contextvars.copy_context().run, _timed, self.sarcasm.detect, working_content)
+        guess, classify_s = _timed(self.classifier.classify, working_content, self._face_value(working_content))
+        sarcasm_result, sarcasm_s = future.result()
+        if self._record_speculation(sarcasm_result, sarcasm_s, classify_s):
+            return sarcasm_result, guess
+        return sarcasm_result, self.classifier.classify(working_content, sarcasm_result)
+
+    async def _aspeculative_classify(self, working_content: str) -> tuple[dict, tuple[str, str]]:
+        (sarcasm_result, sarcasm_s), (guess, classify_s) = await asyncio.gather(
+            _atimed(self.sarcasm.adetect(working_content)),
+            _atimed(self.classifier.aclassify(working_content, self._face_value(working_content))),
+        )
+        if self._record_speculation(sarcasm_result, sarcasm_s, classify_s):
+            return sarcasm_result, guess
+        return sarcasm_result, await self.classifier.aclassify(working_content, sarcasm_result)
+
+    def _record_speculation(self, sarcasm_result: dict, sarcasm_s: float, classify_s: float) -> bool:
+        """Count the outcome; True if the face-value classification stands."""
+        hit = sarcasm_result["is_sarcasm"] == "no"
+        # vs. sequential: a hit overlaps the two calls; a miss only adds
+        # whatever the wasted classify took beyond the sarcasm call
+        saved = min(sarcasm_s, classify_s) if hit else -max(0.0, classify_s - sarcasm_s)
+        with self._spec_lock:
+            self.speculation["runs"] += 1
+            self.speculation["hits"] += hit
+            self.speculation["time_saved_s"] += saved
+        log.info("     Speculation: %s (%+.2fs)", "hit" if hit else "miss — re-classifying", saved)
+        return hit
+
+    def speculation_summary(self) -> dict:
+        """Hit rate, net wall-clock saved, and classifier calls thrown away."""
+        with self._spec_lock:
+            runs, hits, saved = self.speculation["runs"], self.speculation["hits"], self.speculation["time_saved_s"]
         return {
+            "runs":                    runs,
+            "hits":                    hits,
+            "hit_rate":                round(hits / runs, 4) if runs else 0.0,
+            "time_saved_s":            round(saved, 3),
+            "wasted_classifier_calls": runs - hits,
+        }
+
+    # deadlines (see deadline.py): the staged pipeline, stage by stage within
+    # the time left; a stage that does not fit or runs late is degraded and
+    # flagged in result["deadline"], but a classification always comes back
+    def _stages_after(self, stage: str) -> list[str]:
+        later = {"translator": ["sarcasm", "classifier"], "sarcasm": ["classifier"], "classifier": []}[stage]
+        # the label is not known yet, so reserve time for any explanation the policy may ask for
+        return later + (["responder"] if self.explain_policy != "on_demand" else [])
+
+    def _deadline_executor(self) -> ThreadPoolExecutor:
+        with self._spec_lock:
+            if self._deadline_pool is None:
+                self._deadline_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="deadline-stage")
+        return self._deadline_pool
+
+    @staticmethod
+    def _fallback_label(sarcasm_result: dict | None) -> tuple[str, str]:
+        # the classifier did not answer: the sarcasm stage's own verdict, if any
+        if sarcasm_result is not None and sarcasm_result.get("toxicity") in LABELS:
+            return sarcasm_result["toxicity"], "UNVERIFIED"
+        return "NEUTRAL", "UNKNOWN"
+
+    def _finish_by_deadline(self, run: DeadlineRun, result: dict) -> dict:
+        result["deadline"] = run.report()
+        if result["deadline"]["degraded"]:
+            log.warning("  Deadline degraded the pipeline: skipped %s, timed out %s",
+                        run.skipped or "-", run.timed_out or "-")
+        return result
+
+    def _detect_by_deadline(self, content: str, end: float) -> dict:
+        if self.mode != "staged":
+            raise ValueError("deadlines are only supported with mode='staged'")
+        run, pool = DeadlineRun(end, self.estimates), self._deadline_executor()
+        log.info("  PIPELINE START (%.2fs budget)\n  Input: %.100s%s\n", run.remaining(), content,
+                 "…" if len(content) > 100 else "")
+
+        translation = self.translator.local_result(content)
+        if translation is None:
+            translation, ok = run.call("translator", self._stages_after("translator"), pool,
+                                       self.translator.translate, content)
+            if not ok:
+                translation = self.translator.untranslated(content)
+        working_content = translation["translated"]
+
+        if self.pre_classifier is not None:
+            tier1 = self.pre_classifier.classify(working_content)
+            if tier1["settled"]:
+                return self._finish_by_deadline(run, self._build_local_result(content, translation, tier1))
+
+        sarcasm_result, ok = run.call("sarcasm", self._stages_after("sarcasm"), pool, self.sarcasm.detect, working_content)
+        checked = sarcasm_result if ok else None
+        if not ok:
+            sarcasm_result = {"is_sarcasm": "unchecked", "meaning": working_content}
+
+        rule = self.graph.match(checked) if self.graph is not None and checked is not None else None
+        if rule is not None and self.graph.skips(rule, "classifier"):
+            toxicity, sub_label = self.graph.settle(rule, checked)
+        else:
+            face_value = checked or self._face_value(working_content)
+            label, ok = run.call("classifier", self._stages_after("classifier"), pool,
+                                 self.classifier.classify, working_content, face_value)
+            toxicity, sub_label = label if ok else self._fallback_label(checked)
+
+        explanation = None
+        if self._wants_llm_explanation(toxicity) and not (rule is not None and self.graph.skips(rule, "responder")):
+            explanation, ok = run.call("responder", [], pool, self.responder.respond,
+                                       working_content, toxicity, sub_label, sarcasm_result)
+        source = "llm" if explanation is not None else "template"
+        if explanation is None:
+            explanation = self.responder.template(toxicity, sub_label, sarcasm_result)
+
+        if self.graph is not None:
+            self.graph.record(rule or "full", toxicity)
+        return self._finish_by_deadline(run, self._build_result(
+            content, translation, sarcasm_result, toxicity, sub_label, explanation, explanation_source=source))
+
+    async def _adetect_by_deadline(self, content: str, end: float) -> dict:
+        if self.mode != "staged":
+            raise ValueError("deadlines are only supported with mode='staged'")
+        run = DeadlineRun(end, self.estimates)
+        log.info("  PIPELINE START (async, %.2fs budget)\n  Input: %.100s%s\n", run.remaining(), content,
+                 "…" if len(content) > 100 else "")
+
+        translation = self.translator.local_result(content)
+        if translation is None:
+            translation, ok = await run.acall("translator", self._stages_after("translator"),
+                                              self.translator.atranslate, content)
+            if not ok:
+                translation = self.translator.untranslated(content)
+        working_content = translation["translated"]
+
+        if self.pre_classifier is not None:
+            tier1 = await self.pre_classifier.aclassify(working_content)
+            if tier1["settled"]:
+                return self._finish_by_deadline(run, self._build_local_result(content, translation, tier1))
+
+        sarcasm_result, ok = await run.acall("sarcasm", self._stages_after("sarcasm"), self.sarcasm.adetect, working_content)
+        checked = sarcasm_result if ok else None
+        if not ok:
+            sarcasm_result = {"is_sarcasm": "unchecked", "meaning": working_content}
+
+        rule = self.graph.match(checked) if self.graph is not None and checked is not None else None
+        if rule is not None and self.graph.skips(rule, "classifier"):
+            toxicity, sub_label = self.graph.settle(rule, checked)
+        else:
+            face_value = checked or self._face_value(working_content)
+            label, ok = await run.acall("classifier", self._stages_after("classifier"),
+                                        self.classifier.aclassify, working_content, face_value)
+            toxicity, sub_label = label if ok else self._fallback_label(checked)
+
+        explanation = None
+        if self._wants_llm_explanation(toxicity) and not (rule is not None and self.graph.skips(rule, "responder")):
+            explanation, ok = await run.acall("responder", [], self.responder.arespond,
+                                              working_content, toxicity, sub_label, sarcasm_result)
+        source = "llm" if explanation is not None else "template"
+        if explanation is None:
+            explanation = self.responder.template(toxicity, sub_label, sarcasm_result)
+
+        if self.graph is not None:
+            self.graph.record(rule or "full", toxicity)
+        return self._finish_by_deadline(run, self._build_result(
+            content, translation, sarcasm_result, toxicity, sub_label, explanation, explanation_source=source))
+
+    # streaming: the same pipeline, but every stage result is yielded as an
+    # `(event, payload)` pair the moment it is known, and the explanation
+    # arrives token by token:
+    #   ("translation", translation dict)   ("sarcasm", sarcasm_result)
+    #   ("classification", {"classification", "sub_label", "tier"})
+    #   ("explanation", text delta) …       ("result", the final result dict)
+    def stream_detect_and_respond(self, content: str) -> Iterator[tuple[str, object]]:
+        start = time.perf_counter()
+        for event, payload in self._stream(content):
+            if event == "result":
+                self._store(payload, start)
+            yield event, payload
+
+    async def astream_detect_and_respond(self, content: str) -> AsyncIterator[tuple[str, object]]:
+        start = time.perf_counter()
+        async for event, payload in self._astream(content):
+            if event == "result":
+                self._store(payload, start)
+            yield event, payload
+
+    def _stream(self, content: str) -> Iterator[tuple[str, object]]:
+        if self._is_long(content):
+            # chunks finish in any order and are merged at the end
+            yield "result", self.long_document.analyze(content)
+            return
+        if self.mode == "fused":
+            # one completion, parsed as a whole — nothing to stream before the end
+            yield "result", record_result(self.fused.analyze(content))
+            return
+
+        translation     = self.translator.translate(content)
+        working_content = translation["translated"]
+        yield "translation", translation
+
+        if self.pre_classifier is not None:
+            tier1 = self.pre_classifier.classify(working_content)
+            if tier1["settled"]:
+                if self.graph is not None:
+                    self.graph.record("local")
+                yield "result", self._build_local_result(content, translation, tier1)
+                return
+
+        sarcasm_result = self.sarcasm.detect(working_content)
+        yield "sarcasm", sarcasm_result
+
+        rule = self.graph.match(sarcasm_result) if self.graph is not None else None
+        if rule is not None and self.graph.skips(rule, "classifier"):
+            toxicity, sub_label = self.graph.settle(rule, sarcasm_result)
+        else:
+            toxicity, sub_label = self.classifier.classify(working_content, sarcasm_result)
+        yield "classification", {"classification": toxicity, "sub_label": sub_label, "tier": "llm"}
+
+        if self._wants_llm_explanation(toxicity) and not (rule is not None and self.graph.skips(rule, "responder")):
+            deltas = []
+            for delta in self.responder.stream(working_content, toxicity, sub_label, sarcasm_result):
+                deltas.append(delta)
+                yield "explanation", delta
+            explanation, source = "".join(deltas).strip(), "llm"
+        else:
+            explanation, source = self.responder.template(toxicity, sub_label, sarcasm_result), "template"
+            yield "explanation", explanation
+
+        if self.graph is not None:
+            self.graph.record(rule or "full", toxicity)
+        yield "result", self._build_result(content, translation, sarcasm_result, toxicity, sub_label,
+                                           explanation, explanation_source=source)
+
+    async def _astream(self, content: str) -> AsyncIterator[tuple[str, object]]:
+        await self.rag.aconnect()
+        if self._is_long(content):
+            yield "result", await self.long_document.aanalyze(content)
+            return
+        if self.mode == "fused":
+            yield "result", record_result(await self.fused.aanalyze(content))
+            return
+
+        translation     = await self.translator.atranslate(content)
+        working_content = translation["translated"]
+        yield "translation", translation
+
+        if self.pre_classifier is not None:
+            tier1 = await self.pre_classifier.aclassify(working_content)
+            if tier1["settled"]:
+                if self.graph is not None:
+                    self.graph.record("local")
+                yield "result", self._build_local_result(content, translation, tier1)
+                return
+
+        sarcasm_result = await self.sarcasm.adetect(working_content)
+        yield "sarcasm", sarcasm_result
+
+        rule = self.graph.match(sarcasm_result) if self.graph is not None else None
+        if rule is not None and self.graph.skips(rule, "classifier"):
+            toxicity, sub_label = self.graph.settle(rule, sarcasm_result)
+        else:
+            toxicity, sub_label = await self.classifier.aclassify(working_content, sarcasm_result)
+        yield "classification", {"classification": toxicity, "sub_label": sub_label, "tier": "llm"}
+
+        if self._wants_llm_explanation(toxicity) and not (rule is not None and self.graph.skips(rule, "responder")):
+            deltas = []
+            async for delta in self.responder.astream(working_content, toxicity, sub_label, sarcasm_result):
+                deltas.append(delta)
+                yield "explanation", delta
+            explanation, source = "".join(deltas).strip(), "llm"
+        else:
+            explanation, source = self.responder.template(toxicity, sub_label, sarcasm_result), "template"
+            yield "explanation", explanation
+
+        if self.graph is not None:
+            self.graph.record(rule or "full", toxicity)
+        yield "result", self._build_result(content, translation, sarcasm_result, toxicity, sub_label,
+                                           explanation, explanation_source=source)
+
+    def _wants_llm_explanation(self, toxicity: str) -> bool:
+        return self.explain_policy == "always" or (self.explain_policy == "toxic" and toxicity == "TOXIC")
+
+    @staticmethod
+    def _explain_inputs(result: dict) -> tuple[str, dict]:
+        # a merged long-document result is explained from the chunk that set its label, not the whole text
+        chunks = [c for c in result.get("chunks", ()) if c["classification"] == result["classification"]]
+        focus  = result["original"][chunks[0]["start"]:chunks[0]["end"]] if chunks else result["original"]
+        working_content = result["translated"] or focus
+        return working_content, {"is_sarcasm": result["is_sarcasm"], "meaning": result["meaning"]}
+
+    def explain(self, result: dict) -> dict:
+        """Return `result` with the LLM explanation, generating it if it was templated."""
+        if result.get("explanation_source") == "llm":
+            return result
+        working_content, sarcasm_result = self._explain_inputs(result)
+        explanation = self.responder.respond(working_content, result["classification"], result["sub_label"], sarcasm_result)
+        return {**result, "explanation": explanation, "explanation_source": "llm"}
+
+    async def aexplain(self, result: dict) -> dict:
+        if result.get("explanation_source") == "llm":
+            return result
+        await self.rag.aconnect()
+        working_content, sarcasm_result = self._explain_inputs(result)
+        explanation = await self.responder.arespond(working_content, result["classification"], result["sub_label"], sarcasm_result)
+        return {**result, "explanation": explanation, "explanation_source": "llm"}
+
+    def _build_local_result(self, content: str, translation: dict, tier1: dict) -> dict:
+        label, sub_label = tier1["label"], tier1["sub_label"]
+        explanation = (
+            f"Settled locally as {label} ({sub_label.lower()}): the text closely matches labeled "
+            f"{label} examples (confidence {tier1['confidence']:.2f}). No LLM explanation was generated."
+        )
+        # the SarcasmDetector never ran, so don't claim the text is sincere
+        sarcasm_result = {"is_sarcasm": "unchecked", "meaning": translation["translated"]}
+        return self._build_result(content, translation, sarcasm_result, label, sub_label, explanation,
+                                  tier="local", explanation_source="template")
+
+    def _build_result(self, content: str, translation: dict, sarcasm_result: dict,
+                      toxicity: str, sub_label: str, explanation: str, tier: str = "llm",
+                      explanation_source: str = "llm") -> dict:
+        log.info("\n  Pipeline complete → %s (sarcasm: %s, tier: %s)", toxicity, sarcasm_result["is_sarcasm"], tier)
+
+        return record_result({
             "classification":     toxicity,
             "sub_label":          sub_label,
             "explanation":        explanation,
+            "explanation_source": explanation_source,
             "is_sarcasm":         sarcasm_result["is_sarcasm"],
             "meaning":            sarcasm_result["meaning"],
             "original":           content,
             "detected_language":  translation["detected_language"],
             "translated":         translation["translated"] if not translation["is_english"] else None,
-        }
+            "translation_path":   translation.get("path", "llm"),
+            "tier":               tier,
+        })
 
     def display_result(self, result: dict) -> None:
         colors = {"TOXIC": "\033[91m", "NEUTRAL": "\033[93m", "GOOD": "\033[92m"}
         icons  = {"TOXIC": "🔴", "NEUTRAL": "🟡", "GOOD": "🟢"}
-        sarcasm_icons = {"no": "⚪", "ambiguous": "🟡", "sarcastic": "🟠"}
+        sarcasm_icons = {"no": "⚪", "ambiguous": "🟡", "sarcastic": "🟠", "unchecked": "▫️"}
         reset  = "\033[0m"
 
         c = result["classification"]
@@ -59,6 +646,10 @@ class ToxicityAgent:
             print(f"  Note: sarcasm was ambiguous — classified at face value")
 
         print(f"\n  Responder: {result['explanation']}")
+        if result.get("explanation_source") == "template":
+            print(f"  (templated — no LLM explanation was generated)")
 
 if __name__ == "__main__":
+    from instrumentation import setup_logging
+    setup_logging("INFO")
     agent = ToxicityAgent()
\ No newline at end of file
@@ -1,12 +1,32 @@
+from instrumentation import PARSES, timed_stage
 from rag_setup import ToxicityRAG
+from result_cache import make_key, normalize_text
+from .conversation import current_context
+from .microBatcher import MicroBatcher, split_numbered_blocks
+import logging
 import re
 
+log = logging.getLogger(__name__)
+
 class ClassifierAgent:
-    def __init__(self, rag: ToxicityRAG):
-        self.rag = rag
-        print("   Classifier ready")
+    PROMPT_VERSION = 2   # bump whenever _build_prompt changes (invalidates cached results)
+
+    def __init__(self, rag: ToxicityRAG, few_shot_k: int = 4):
+        self.rag        = rag
+        self.few_shot_k = few_shot_k   # nearest labeled examples shown in the prompt (0 = zero-shot)
+        self.batcher    = None         # MicroBatcher once enable_batching() is called (async path only)
+        log.info("   Classifier ready")
+
+    def enable_batching(self, max_batch: int = 16, max_wait_ms: float = 20.0) -> None:
+        self.batcher = MicroBatcher(
+            self._aclassify_batch, lambda item: self._aclassify_one(*item), max_batch, max_wait_ms, name="classifier",
+        )
 
-    def _build_prompt(self, content: str, sarcasm_result: dict) -> str:
+    @staticmethod
+    def _text_to_classify(content: str, sarcasm_result: dict) -> str:
+        return sarcasm_result["meaning"] if sarcasm_result["is_sarcasm"] == "sarcastic" else content
+
+    def _build_prompt(self, content: str, sarcasm_result: dict, examples: list[dict] = ()) -> str:
         is_sarcasm = sarcasm_result["is_sarcasm"]
         meaning    = sarcasm_result["meaning"]
 
@@ -18,13 +38,28 @@ class ClassifierAgent:
                 f"  True meaning: \"{meaning}\"\n"
                 f"Classify based on the TRUE MEANING, not the literal words.\n"
             )
-        elif is_sarcasm == "ambiguous":
+        elif is_sarcasm == "ambiguous" and not current_context():
             sarcasm_note = (
                 "\nNOTE: This text may or may not be sarcastic — context is unavailable.\n"
                 "Classify at face value, but be aware the true intent is uncertain.\n"
             )
+        elif is_sarcasm == "ambiguous":
+            sarcasm_note = (
+                "\nNOTE: This text may or may not be sarcastic.\n"
+                "Use the conversation so far to judge the intent.\n"
+            )
+
+        context = current_context()
+        if context:
+            sarcasm_note += "\nCONVERSATION SO FAR (context only — classify the TEXT, not these messages):\n" + context + "\n"
 
-        text_to_classify = meaning if is_sarcasm == "sarcastic" else content  # Fix 2: was always `meaning`
+        text_to_classify = self._text_to_classify(content, sarcasm_result)  # Fix 2: was always `meaning`
+
+        few_shot = ""
+        if examples:
+            few_shot = "\nLABELED EXAMPLES (similar texts, for reference):\n" + "".join(
+                f"\"{e['text']}\" → {e['label']} - {e['sub_label']}\n" for e in examples
+            )
 
         return f"""You are a strict content classification engine.
 
@@ -32,7 +67,7 @@ DEFINITIONS:
 - TOXIC   : hate speech, threats, harassment, discrimination, personal attacks, obscene language
 - NEUTRAL : factual statements, disagreements without hostility, questions, constructive criticism
 - GOOD    : supportive, encouraging, appreciative, respectful, constructive communication
-{sarcasm_note}
+{sarcasm_note}{few_shot}
 TEXT TO CLASSIFY:
 \"\"\"{text_to_classify}\"\"\"
 
@@ -45,10 +80,44 @@ GOOD - SUPPORTIVE
 
 Reply with these LABELS ONLY. No extra punctuation other than the hyphen. No additional explanation."""
 
-    def classify(self, content: str, sarcasm_result: dict) -> tuple[str, str]:
-        prompt = self._build_prompt(content, sarcasm_result)
-        raw_response = self.rag.llm_classifier.invoke(prompt)
+    BATCH_EXAMPLES = 8   # shared few-shot lines in a batched prompt
+
+    def _build_batch_prompt(self, items: list[tuple[str, dict]], examples: list[dict] = ()) -> str:
+        notes = {
+            "sarcastic": " (sarcastic — this is its TRUE meaning, classify it)",
+            "ambiguous": " (may be sarcastic — classify at face value)",
+        }
+        texts = "\n".join(
+            f'[{i}] """{self._text_to_classify(content, sarcasm)}"""{notes.get(sarcasm["is_sarcasm"], "")}'
+            for i, (content, sarcasm) in enumerate(items, 1)
+        )
+        few_shot = ""
+        if examples:
+            few_shot = "\nLABELED EXAMPLES (similar texts, for reference):\n" + "".join(
+                f"\"{e['text']}\" → {e['label']} - {e['sub_label']}\n" for e in examples
+            )
+
+        return f"""You are a strict content classification engine. Classify each numbered text independently.
+
+DEFINITIONS:
+- TOXIC   : hate speech, threats, harassment, discrimination, personal attacks, obscene language
+- NEUTRAL : factual statements, disagreements without hostility, questions, constructive criticism
+- GOOD    : supportive, encouraging, appreciative, respectful, constructive communication
+{few_shot}
+TEXTS TO CLASSIFY:
+{texts}
+
+Reply with one block per text, in order: the number on its own line, then ONE label line.
+No periods, explanations, or any other text.
 
+[1]
+TOXIC - HATE SPEECH
+[2]
+GOOD - SUPPORTIVE"""
+
+    def _parse_response(self, raw_response) -> tuple[tuple[str, str], bool]:
+        """Return ((toxicity, sub_label), parsed). `parsed` is False when no
+        line matched the LABEL - SUB-LABEL format and the fallback was used."""
         # extract text first, then strip <think>
         raw = raw_response.content if hasattr(raw_response, "content") else raw_response
         if "<think>" in raw:
@@ -72,5 +141,69 @@ Reply with these LABELS ONLY. No extra punctuation other than the hyphen. No add
             TOXICITY  = fallback.group(1) if fallback else "NEUTRAL"
             SUB_LABEL = "UNKNOWN"
 
-        print(f"     Classifier: {TOXICITY.capitalize()} - {SUB_LABEL.lower()}")
-        return TOXICITY, SUB_LABEL
\ No newline at end of file
+        log.info("     Classifier: %s - %s", TOXICITY.capitalize(), SUB_LABEL.lower())
+        PARSES.inc(stage="classifier", outcome="ok" if SUB_LABEL != "UNKNOWN" else "fallback")
+        return (TOXICITY, SUB_LABEL), SUB_LABEL != "UNKNOWN"
+
+    def _cache_key(self, content: str, sarcasm_result: dict) -> str:
+        # the index version stands in for the retrieved examples: same corpus + same text → same prompt
+        return make_key(
+            "classifier", self.rag.model_for("classifier"), self.PROMPT_VERSION,
+            normalize_text(content), sarcasm_result["is_sarcasm"], normalize_text(sarcasm_result["meaning"]),
+            self.rag.index_version if self.few_shot_k else None, self.few_shot_k,
+            *((current_context(),) if current_context() else ()),
+        )
+
+    @timed_stage("classifier")
+    def classify(self, content: str, sarcasm_result: dict) -> tuple[str, str]:
+        key = self._cache_key(content, sarcasm_result)
+        cached = self.rag.cache.get("classifier", key)
+        if cached is not None:
+            return tuple(cached)
+
+        examples = self.rag.retrieve(self._text_to_classify(content, sarcasm_result), self.few_shot_k)
+        prompt = self._build_prompt(content, sarcasm_result, examples)
+        raw_response = self.rag.llm_classifier.invoke(prompt)
+        result, parsed = self._parse_response(raw_response)
+        if parsed:   # never cache the NEUTRAL / UNKNOWN fallback
+            self.rag.cache.set("classifier", key, result)
+        return result
+
+    @timed_stage("classifier")
+    async def aclassify(self, content: str, sarcasm_result: dict) -> tuple[str, str]:
+        key = self._cache_key(content, sarcasm_result)
+        cached = await self.rag.cache.aget("classifier", key)
+        if cached is not None:
+            return tuple(cached)
+        if self.batcher is not None and current_context() is None:   # a batch prompt has no per-item context
+            return await self.batcher.submit((content, sarcasm_result))
+        return await self._aclassify_one(content, sarcasm_result)
+
+    async def _aclassify_batch(self, items: list[tuple[str, dict]]) -> list[tuple[str, str] | None]:
+        # one shared, de-duplicated few-shot block for the whole batch
+        examples, seen = [], set()
+        for content, sarcasm in items:
+            for example in await self.rag.aretrieve(self._text_to_classify(content, sarcasm), self.few_shot_k):
+                if example["text"] not in seen and len(examples) < self.BATCH_EXAMPLES:
+                    seen.add(example["text"])
+                    examples.append(example)
+
+        raw_response = await self.rag.llm_for("classifier_batch").ainvoke(self._build_batch_prompt(items, examples))
+        raw = raw_response.content if hasattr(raw_response, "content") else raw_response
+        results = []
+        for (content, sarcasm), block in zip(items, split_numbered_blocks(raw, len(items))):
+            result, parsed = self._parse_response(block) if block else (None, False)
+            if parsed:
+                await self.rag.cache.aset("classifier", self._cache_key(content, sarcasm), result)
+            results.append(result if parsed else None)
+        return results
+
+    async def _aclassify_one(self, content: str, sarcasm_result: dict) -> tuple[str, str]:
+        key = self._cache_key(content, sarcasm_result)
+        examples = await self.rag.aretrieve(self._text_to_classify(content, sarcasm_result), self.few_shot_k)
+        prompt = self._build_prompt(content, sarcasm_result, examples)
+        raw_response = await self.rag.llm_classifier.ainvoke(prompt)
+        result, parsed = self._parse_response(raw_response)
+        if parsed:
+            await self.rag.cache.aset("classifier", key, result)
+        return result
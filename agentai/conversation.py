@@ -0,0 +1,183 @@
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .longDocument import CHARS_PER_TOKEN
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Thread mode: earlier messages of a conversation as context for the
+# SarcasmDetector and ClassifierAgent prompts.
+#
+# Every conversation ID keeps a rolling window of its most recent turns
+# within `max_context_tokens`. A turn pushed out of the window is folded
+# into a compact summary instead of being resent: message and label counts
+# plus a few notable (toxic / sarcastic) turns, capped at
+# `summary_tokens`. The summary is built locally, not by an LLM, so the
+# per-message cost stays at the two existing calls with a bounded context,
+# however long the thread gets. The rendered context is reused until the
+# thread gets its next turn.
+#
+# The context for the message being analyzed travels in a ContextVar (like
+# the LLM priority and deadlines), so every pipeline path — graph,
+# deadlines, long documents — picks it up; the stage caches key on it and
+# the semantic cache is bypassed while it is set.
+#
+# Threads idle for `idle_ttl_s` are evicted (checked on access, at most
+# every `sweep_every_s`), and at most `max_threads` are kept (LRU).
+# ---------------------------------------------------------------------------
+
+MAX_TURN_TOKENS = 60   # a single turn is truncated to this in the window
+NOTABLE_TOKENS  = 16   # … and to this when quoted in the summary
+
+CONVERSATION = ContextVar("conversation_context", default=None)   # rendered context of the current message
+
+
+@contextmanager
+def conversation_context(context: str | None):
+    token = CONVERSATION.set(context)
+    try:
+        yield
+    finally:
+        CONVERSATION.reset(token)
+
+
+def current_context() -> str | None:
+    return CONVERSATION.get()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def clip(text: str, tokens: int) -> str:
+    text = " ".join(text.split())
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class ConversationThread:
+    """One conversation's window, folded summary and render cache."""
+
+    def __init__(self):
+        self.turns        = deque()     # (speaker, text, tokens, label, is_sarcasm), oldest first
+        self.window       = 0           # tokens of the turns in the window
+        self.folded       = 0           # turns summarized
+        self.labels       = Counter()   # classification -> folded turns
+        self.sarcastic    = 0
+        self.notable      = deque()     # "speaker: text (LABEL)" of folded toxic / sarcastic turns
+        self.total_turns  = 0
+        self.last_seen    = time.monotonic()
+        self._rendered    = None
+
+    def summary(self, budget: int) -> str:
+        if not self.folded:
+            return ""
+        counts = ", ".join(f"{n} {label}" for label, n in self.labels.most_common())
+        line = f"[{self.folded} earlier messages: {counts}" + (f"; {self.sarcastic} sarcastic]" if self.sarcastic else "]")
+        # newest notable turns first, as many as fit
+        notable = []
+        for entry in reversed(self.notable):
+            if estimate_tokens(line + "".join(notable) + entry) > budget:
+                break
+            notable.append(f"\n  earlier: {entry}")
+        return line + "".join(reversed(notable))
+
+    def render(self, summary_tokens: int) -> str | None:
+        if self._rendered is None:
+            lines = [self.summary(summary_tokens)] if self.folded else []
+            lines += [f"{speaker}: {text}" for speaker, text, *_ in self.turns]
+            self._rendered = "\n".join(lines)
+        return self._rendered or None
+
+
+class ConversationStore:
+    def __init__(self, max_context_tokens: int = 320, summary_tokens: int = 80, idle_ttl_s: float = 1800.0,
+                 max_threads: int = 10_000, sweep_every_s: float = 30.0):
+        if summary_tokens >= max_context_tokens:
+            raise ValueError("summary_tokens must be < max_context_tokens")
+        self.max_context_tokens = max_context_tokens
+        self.summary_tokens     = summary_tokens
+        self.idle_ttl_s         = idle_ttl_s
+        self.max_threads        = max_threads
+        self.sweep_every_s      = sweep_every_s
+        self.threads            = OrderedDict()   # id -> ConversationThread, least recently used first
+        self._lock              = threading.Lock()
+        self._last_sweep        = time.monotonic()
+        self.evicted            = 0
+
+    def context(self, thread_id: str) -> str | None:
+        """Summary + recent turns to show with the thread's next message."""
+        with self._lock:
+            self._sweep()
+            thread = self.threads.get(thread_id)
+            if thread is None:
+                return None
+            self._touch(thread_id, thread)
+            return thread.render(self.summary_tokens)
+
+    def record(self, thread_id: str, speaker: str | None, content: str, result: dict) -> ConversationThread:
+        """Append an analyzed message; turns that no longer fit are folded into the summary."""
+        text   = clip(content, MAX_TURN_TOKENS)
+        tokens = estimate_tokens(text)
+        with self._lock:
+            thread = self.threads.get(thread_id)
+            if thread is None:
+                thread = self.threads[thread_id] = ConversationThread()
+                while len(self.threads) > self.max_threads:
+                    self.threads.popitem(last=False)
+                    self.evicted += 1
+            self._touch(thread_id, thread)
+            thread.turns.append((speaker or "user", text, tokens, result["classification"], result["is_sarcasm"]))
+            thread.window += tokens
+            thread.total_turns += 1
+            budget = self.max_context_tokens - self.summary_tokens
+            while thread.window > budget and len(thread.turns) > 1:
+                self._fold(thread, thread.turns.popleft())
+            thread._rendered = None
+            return thread
+
+    @staticmethod
+    def _fold(thread: ConversationThread, turn: tuple) -> None:
+        speaker, text, tokens, label, sarcasm = turn
+        thread.window -= tokens
+        thread.folded += 1
+        thread.labels[label] += 1
+        thread.sarcastic += sarcasm == "sarcastic"
+        if label == "TOXIC" or sarcasm == "sarcastic":
+            thread.notable.append(f"{speaker}: {clip(text, NOTABLE_TOKENS)} ({label})")
+            if len(thread.notable) > 8:   # the summary never quotes more than fit its budget anyway
+                thread.notable.popleft()
+
+    def _touch(self, thread_id: str, thread: ConversationThread) -> None:
+        thread.last_seen = time.monotonic()
+        self.threads.move_to_end(thread_id)
+
+    def _sweep(self) -> None:
+        # caller holds the lock; the dict is in last-use order, so idle threads are at the front
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_every_s:
+            return
+        self._last_sweep = now
+        while self.threads:
+            thread_id, thread = next(iter(self.threads.items()))
+            if now - thread.last_seen < self.idle_ttl_s:
+                break
+            del self.threads[thread_id]
+            self.evicted += 1
+            log.debug("Evicted idle thread %s (%d turns)", thread_id, thread.total_turns)
+
+    def evict_idle(self) -> int:
+        """Sweep now; returns how many threads were evicted."""
+        with self._lock:
+            before, self._last_sweep = self.evicted, float("-inf")
+            self._sweep()
+            return self.evicted - before
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"threads": len(self.threads), "evicted": self.evicted,
+                    "turns": sum(t.total_turns for t in self.threads.values())}
@@ -0,0 +1,162 @@
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
+from instrumentation import DEADLINE_DEGRADATIONS
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Per-message latency budgets for the staged pipeline.
+#
+# A caller sets a deadline — detect_and_respond(..., deadline_s=…) or the
+# pipeline_deadline() context manager — and it travels in a ContextVar like
+# the LLM priority, so it also reaches semantic-cache misses and the chunks
+# of a long document. Before each stage the run re-plans against the time
+# left, using per-stage latency estimates (an EWMA of completed calls):
+# while the planned stages do not fit, the next stage in DEGRADATION_ORDER
+# is dropped. The order holds for the whole run: once a stage is dropped or
+# times out, every stage before it in the order is dropped too, even if
+# time frees up later. The classifier is never dropped. A stage that runs
+# gets what the budget leaves after reserving the later planned stages, and
+# is cut off at that timeout:
+#
+#   async   asyncio.wait_for cancels the call
+#   sync    the call runs on a pool thread and is abandoned when late (a
+#           thread cannot be interrupted); its result is discarded
+#
+# A skipped or timed-out stage degrades like the pipeline's other
+# fallbacks: responder → template, translator → the original text, sarcasm
+# → face value ("unchecked"), classifier → the sarcasm stage's TOXICITY
+# verdict (NEUTRAL / UNKNOWN without one). The result's "deadline" dict
+# records what was skipped or timed out.
+# ---------------------------------------------------------------------------
+
+DEGRADATION_ORDER = ("responder", "translator", "sarcasm")   # dropped first → last
+STAGE_ESTIMATES_S = {"translator": 0.8, "sarcasm": 0.8, "classifier": 0.5, "responder": 1.2}
+EWMA_ALPHA        = 0.2
+
+DEADLINE = ContextVar("pipeline_deadline", default=None)   # time.monotonic() when the verdict is due
+
+
+@contextmanager
+def pipeline_deadline(seconds: float):
+    """Give the enclosed pipeline runs `seconds`; a nested deadline never extends an outer one."""
+    if seconds <= 0:
+        raise ValueError("deadline must be > 0 seconds")
+    end     = time.monotonic() + seconds
+    current = DEADLINE.get()
+    token   = DEADLINE.set(end if current is None else min(end, current))
+    try:
+        yield
+    finally:
+        DEADLINE.reset(token)
+
+
+class StageEstimates:
+    """Expected seconds per stage: STAGE_ESTIMATES_S, then an EWMA of calls that finished."""
+
+    def __init__(self, initial: dict | None = None):
+        self._estimates = {**STAGE_ESTIMATES_S, **(initial or {})}
+        self._lock      = threading.Lock()
+
+    def get(self, stage: str) -> float:
+        return self._estimates[stage]
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._estimates[stage] += EWMA_ALPHA * (seconds - self._estimates[stage])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {stage: round(s, 3) for stage, s in self._estimates.items()}
+
+
+class DeadlineRun:
+    """Budget bookkeeping for one pipeline run under the current deadline."""
+
+    def __init__(self, end: float, estimates: StageEstimates):
+        self.end       = end
+        self.estimates = estimates
+        self.start     = time.monotonic()
+        self.skipped   = []
+        self.timed_out = []
+        self._dropped  = 0   # DEGRADATION_ORDER[:_dropped] no longer run
+
+    def remaining(self) -> float:
+        return self.end - time.monotonic()
+
+    def plan(self, stages: list[str]) -> list[str]:
+        """`stages` minus what must be dropped, in DEGRADATION_ORDER, to fit the time left."""
+        dropped = DEGRADATION_ORDER[:self._dropped]
+        planned, remaining = [s for s in stages if s not in dropped], self.remaining()
+        for stage in DEGRADATION_ORDER:
+            if sum(self.estimates.get(s) for s in planned) <= remaining:
+                break
+            if stage in planned:
+                planned.remove(stage)
+        return planned
+
+    def admit(self, stage: str, later: list[str]) -> float | None:
+        """Timeout for running `stage` now, or None when it is skipped.
+        `later` are the stages that would still follow it."""
+        planned = self.plan([stage, *later])
+        timeout = self.remaining() - sum(self.estimates.get(s) for s in planned if s != stage)
+        if stage not in planned or timeout <= 0:
+            self._degrade(stage, "skipped")
+            return None
+        return timeout
+
+    def call(self, stage: str, later: list[str], pool, fn, *args) -> tuple[object, bool]:
+        """Run `fn(*args)` on `pool` within the stage's timeout; `(result, True)`
+        if it finished, else `(None, False)`."""
+        timeout = self.admit(stage, later)
+        if timeout is None:
+            return None, False
+        start  = time.monotonic()
+        # copy_context: the pool thread keeps the caller's LLM priority
+        future = pool.submit(contextvars.copy_context().run, fn, *args)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()   # only helps if it never started
+            self._degrade(stage, "timed_out", timeout)
+            return None, False
+        self.estimates.observe(stage, time.monotonic() - start)
+        return result, True
+
+    async def acall(self, stage: str, later: list[str], afn, *args) -> tuple[object, bool]:
+        timeout = self.admit(stage, later)
+        if timeout is None:
+            return None, False
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(afn(*args), timeout)
+        except asyncio.TimeoutError:
+            self._degrade(stage, "timed_out", timeout)
+            return None, False
+        self.estimates.observe(stage, time.monotonic() - start)
+        return result, True
+
+    def _degrade(self, stage: str, reason: str, timeout: float | None = None) -> None:
+        (self.skipped if reason == "skipped" else self.timed_out).append(stage)
+        if stage in DEGRADATION_ORDER:
+            self._dropped = max(self._dropped, DEGRADATION_ORDER.index(stage) + 1)
+        DEADLINE_DEGRADATIONS.inc(stage=stage, reason=reason)
+        if reason == "skipped":
+            log.info("     Deadline: %s skipped (%.2fs left)", stage, self.remaining())
+        else:
+            log.warning("     Deadline: %s timed out after %.2fs", stage, timeout)
+
+    def report(self) -> dict:
+        return {
+            "budget_s":  round(self.end - self.start, 3),
+            "elapsed_s": round(time.monotonic() - self.start, 3),
+            "skipped":   self.skipped,
+            "timed_out": self.timed_out,
+            "degraded":  bool(self.skipped or self.timed_out),
+        }
@@ -0,0 +1,141 @@
+from instrumentation import PARSES, timed_stage
+from rag_setup import ToxicityRAG
+from result_cache import make_key, normalize_text
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+# Responsibility: do the work of all four staged agents in ONE LLM call —
+# language detection + translation, sarcasm, toxicity / sub-label and the
+# explanation — and parse it back into the exact dict shape that
+# ToxicityAgent.detect_and_respond returns.
+#
+# Results are cached under their own "fused" stage key, so fused and staged
+# runs never serve each other's answers. The fused call always goes to the
+# LLM: it has no local language fast path and no pre-classifier tier.
+class FusedAgent:
+    PROMPT_VERSION = 2   # bump whenever _build_prompt changes (invalidates cached results)
+
+    def __init__(self, rag: ToxicityRAG):
+        self.rag = rag
+        log.info("   FusedAgent ready")
+
+    def _build_prompt(self, content: str) -> str:
+        return f"""You are a multilingual content moderation engine. Analyze the text in one pass.
+
+STEPS:
+1. Detect the language. If it is NOT English, translate it to English naturally, keeping slang, insults and tone.
+2. Sarcasm — YES: the literal words mean the OPPOSITE of the true intent; NO: it means what it says; UNKNOWN: impossible to judge.
+3. Classify the TRUE meaning (not the literal words if sarcastic):
+   - TOXIC   : hate speech, threats, harassment, discrimination, personal attacks, obscene language
+   - NEUTRAL : factual statements, disagreements without hostility, questions, constructive criticism
+   - GOOD    : supportive, encouraging, appreciative, respectful, constructive communication
+   Give the label and a short sub-label, e.g. TOXIC - HATE SPEECH, NEUTRAL - FACTUAL STATEMENTS, GOOD - SUPPORTIVE
+4. Explain in 3 sentences WHY, referencing specific words or tone. Mention sarcasm or ambiguity if present.
+
+TEXT:
+\"\"\"{content}\"\"\"
+
+Reply in EXACTLY this format, one field per line, no extra text:
+DETECTED_LANGUAGE: <language name>
+IS_ENGLISH: <YES or NO>
+TRANSLATED: <translated text or original if already English>
+IS_SARCASTIC: <YES/NO/UNKNOWN>
+TRUE_MEANING: <true meaning if YES, otherwise repeat the text>
+CLASSIFICATION: <TOXIC/NEUTRAL/GOOD> - <SUB-LABEL>
+EXPLANATION: <your explanation>"""
+
+    def _parse_response(self, raw_response, content: str) -> tuple[dict, bool]:
+        """Return (result, parsed). `parsed` is False when the CLASSIFICATION
+        line or the EXPLANATION was missing and fallbacks were used."""
+        raw = raw_response.content if hasattr(raw_response, "content") else raw_response
+        raw = raw.strip()
+
+        # strip <think> block if present (Qwen3 reasoning model)
+        if "<think>" in raw:
+            raw = raw.split("</think>")[-1].strip()
+
+        fields = {}
+        current = None
+        for line in raw.splitlines():
+            match = re.match(r'^\s*([A-Z_]+):\s*(.*)$', line)
+            if match and match.group(1) in (
+                "DETECTED_LANGUAGE", "IS_ENGLISH", "TRANSLATED", "IS_SARCASTIC",
+                "TRUE_MEANING", "CLASSIFICATION", "EXPLANATION",
+            ):
+                current = match.group(1)
+                fields[current] = match.group(2).strip()
+            elif current == "EXPLANATION" and line.strip():
+                # the explanation is the only field allowed to wrap
+                fields[current] += " " + line.strip()
+
+        is_english = fields.get("IS_ENGLISH", "YES").upper() == "YES"
+        translated = fields.get("TRANSLATED") or content
+
+        is_sarcasm = {"YES": "sarcastic", "UNKNOWN": "ambiguous"}.get(
+            fields.get("IS_SARCASTIC", "").upper(), "no"
+        )
+        meaning = fields.get("TRUE_MEANING") or translated
+
+        toxicity, sub_label = None, None
+        label = re.match(r'^(TOXIC|NEUTRAL|GOOD)\s*-\s*([A-Z][A-Z\s]+?)$', fields.get("CLASSIFICATION", "").upper())
+        if label:
+            toxicity  = label.group(1).strip()
+            sub_label = label.group(2).strip()
+        else:
+            fallback  = re.search(r'\b(TOXIC|NEUTRAL|GOOD)\b', fields.get("CLASSIFICATION", raw).upper())
+            toxicity  = fallback.group(1) if fallback else "NEUTRAL"
+            sub_label = "UNKNOWN"
+
+        explanation = fields.get("EXPLANATION") or raw
+
+        log.info("     FusedAgent: [%s] %s - %s (sarcasm: %s)",
+                 fields.get("DETECTED_LANGUAGE", "unknown"), toxicity, sub_label.lower(), is_sarcasm)
+        parsed = label is not None and bool(fields.get("EXPLANATION"))
+        PARSES.inc(stage="fused", outcome="ok" if parsed else "fallback")
+        return {
+            "classification":     toxicity,
+            "sub_label":          sub_label,
+            "explanation":        explanation,
+            "explanation_source": "llm",
+            "is_sarcasm":         is_sarcasm,
+            "meaning":            meaning,
+            "original":           content,
+            "detected_language":  fields.get("DETECTED_LANGUAGE", "unknown"),
+            "translated":         translated if not is_english else None,
+            "translation_path":   "fused",
+            "tier":               "llm",
+        }, parsed
+
+    def _cache_key(self, content: str) -> str:
+        # the raw text, not normalized: the result echoes it back as `original`
+        return make_key("fused", self.rag.model_for("fused"), self.PROMPT_VERSION, content)
+
+    @timed_stage("fused")
+    def analyze(self, content: str) -> dict:
+        key = self._cache_key(content)
+        cached = self.rag.cache.get("fused", key)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(content)
+        raw_response = self.rag.llm_for("fused").invoke(prompt)
+        result, parsed = self._parse_response(raw_response, content)
+        if parsed:   # never cache a fallback result
+            self.rag.cache.set("fused", key, result)
+        return result
+
+    @timed_stage("fused")
+    async def aanalyze(self, content: str) -> dict:
+        key = self._cache_key(content)
+        cached = await self.rag.cache.aget("fused", key)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(content)
+        raw_response = await self.rag.llm_for("fused").ainvoke(prompt)
+        result, parsed = self._parse_response(raw_response, content)
+        if parsed:
+            await self.rag.cache.aset("fused", key, result)
+        return result
@@ -0,0 +1,100 @@
+import re
+import unicodedata
+
+# Responsibility: decide in microseconds, on CPU and offline, whether a text
+# is confidently English, so TranslatorAgent can skip its LLM call.
+#
+# It is deliberately one-sided: it only ever says "English, skip the LLM"
+# or "not sure / not English, ask the LLM". Anything in a non-Latin script,
+# with non-English diacritics, or containing function words from another
+# language (code-switching) goes to the LLM translator.
+
+ENGLISH_WORDS = set("""
+the be to of and in that have it for not on with he as you do at this but his by from they we say her
+she or an will my one all would there their what so up out if about who get which go me when make can
+like time no just him know take people into year your good some could them see other than then now
+look only come its over think also back after use two how our work first well way even new want because
+any these give day most us is are was were been has had did does doing done am i im i'm it's that's
+don't dont can't cant won't wont isn't aren't wasn't didn't doesn't you're youre we're they're i've
+i'll i'd what's there's let's very really much more many too here where why should must might shall
+never always again still already yet please thanks thank sorry yes yeah yep nope okay ok lol lmao
+omg idk tbh btw imo smh wtf rofl haha hahaha u ur r ya gonna wanna gotta kinda sorta nice great cool
+awesome bad stupid dumb idiot hate love hope help job everyone someone nobody anyone nothing something
+everything thing things guy guys man dude bro stuff wow oh hey hi hello bye sure totally literally
+actually seriously honestly basically again another those being through before while same down off
+each few own both under between during without against every since until though although whether
+""".split())
+
+# common function words that are NOT English. Words shared with the English
+# list are removed below so they can never count for both sides.
+OTHER_WORDS = {
+    "Spanish":    "el la los las del que y en un una es por con para como pero más muy está estoy eres "
+                  "soy tu su sus al lo le se mi qué porque cuando también todo nada gracias hola bueno "
+                  "tengo tiene hay eso esto esta este usted ustedes nosotros ellos pues vale",
+    "French":     "le la les des du et est une un pour pas que qui dans ce cette sur avec sont tu vous "
+                  "nous il elle je suis mais très bien merci bonjour oui non avoir être fait c'est j'ai",
+    "German":     "der die das und ist nicht ein eine zu den mit sich des auf für im dem ich du er sie "
+                  "wir ihr sind auch aber wie noch nur schon sehr danke ja nein gut bitte",
+    "Portuguese": "o os as um uma é não que de do da dos das em para com por mais muito está você eu "
+                  "ele ela nós obrigado obrigada olá também isso isto mas então",
+    "Italian":    "il lo gli di che è non un una per con sono sei ma molto anche questo questa grazie "
+                  "ciao sì perché come cosa tutto niente",
+    "Tagalog":    "ang ng mga sa na ay at ko mo ka siya ako ikaw tayo kami kayo sila hindi oo po opo "
+                  "naman lang talaga ba yung yan ito iyan dito diyan kasi pero sige salamat galing "
+                  "ganda pangit bobo tanga gago putang puta ina sobra grabe wala meron may",
+    "Indonesian": "dan yang di ini itu dengan untuk tidak dari dalam akan pada juga saya kamu aku kita "
+                  "mereka ada bisa sudah belum sangat terima kasih apa",
+    "Dutch":      "de het een en van ik je niet dat is op te zijn er maar met voor ook wat hij zij "
+                  "dank bedankt goed",
+}
+OTHER_WORDS = {lang: set(words.split()) - ENGLISH_WORDS for lang, words in OTHER_WORDS.items()}
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?", re.UNICODE)
+
+
+class LanguageDetector:
+    def __init__(self, min_confidence: float = 0.8, min_coverage: float = 0.25):
+        # min_confidence: share of recognised words that must be English
+        # min_coverage:   share of ALL words that must be recognised English
+        self.min_confidence = min_confidence
+        self.min_coverage   = min_coverage
+
+    def detect(self, text: str) -> dict:
+        """Return {"language", "is_english", "confident", "confidence"}.
+
+        `confident` is True only when the text can skip the LLM translator.
+        """
+        letters = [ch for ch in text if ch.isalpha()]
+        if not letters:
+            # emoji / punctuation / numbers only — nothing to translate
+            return {"language": "unknown", "is_english": True, "confident": True, "confidence": 1.0}
+
+        non_ascii = [ch for ch in letters if not ch.isascii()]
+        if non_ascii:
+            non_latin = sum(1 for ch in non_ascii if "LATIN" not in unicodedata.name(ch, ""))
+            if non_latin / len(letters) > 0.3:
+                return {"language": "non-Latin script", "is_english": False, "confident": False, "confidence": 0.0}
+            if len(non_ascii) / len(letters) > 0.02:
+                # accented Latin letters (ñ, ç, ã, ß, é …) are rare in English chat
+                return {"language": "unknown", "is_english": False, "confident": False, "confidence": 0.0}
+
+        words = [w.lower() for w in WORD_RE.findall(text)]
+        english_hits = sum(1 for w in words if w in ENGLISH_WORDS)
+        other_hits   = {lang: sum(1 for w in words if w in vocab) for lang, vocab in OTHER_WORDS.items()}
+        top_lang, top_other = max(other_hits.items(), key=lambda kv: kv[1])
+
+        recognised = english_hits + top_other
+        confidence = english_hits / recognised if recognised else 0.0
+        coverage   = english_hits / len(words) if words else 0.0
+
+        confident_english = (
+            confidence >= self.min_confidence
+            and coverage >= self.min_coverage
+            and top_other == 0   # any foreign word → possible code-switched insult ("stupid gago")
+        )
+        if confident_english:
+            return {"language": "English", "is_english": True, "confident": True, "confidence": round(confidence, 3)}
+
+        language = top_lang if top_other > english_hits else ("English" if english_hits else "unknown")
+        return {"language": language, "is_english": language == "English", "confident": False,
+                "confidence": round(confidence, 3)}
@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import logging
+import re
+import threading
+
+log = logging.getLogger(__name__)
+
+# Responsibility: keep long inputs (forum posts, transcripts) out of single
+# prompts. A text over `max_tokens` is split on paragraph / sentence
+# boundaries into token-budgeted chunks that overlap by up to
+# `overlap_tokens`, every chunk runs through the normal pipeline
+# concurrently, and the chunk results are folded into one result:
+#
+#   classification   the worst label over all chunks (TOXIC > NEUTRAL > GOOD)
+#   explanation, …   taken from the first chunk with that label
+#   spans            merged [start, end) character ranges of every chunk with
+#                    the worst label (empty when the worst label is GOOD)
+#   chunks           per-chunk [start, end), label, sub-label and sarcasm
+#
+# Tokens are estimated at CHARS_PER_TOKEN characters each, the same
+# estimate ScheduledLLM budgets with, so a chunk never exceeds max_tokens
+# (a single over-long "word", e.g. a pasted blob, is cut by characters).
+
+CHARS_PER_TOKEN = 4
+SEVERITY        = {"GOOD": 0, "NEUTRAL": 1, "TOXIC": 2}
+
+# a unit ends after sentence punctuation (plus closing quotes / brackets)
+# followed by whitespace, or at a blank line
+BOUNDARY_RE = re.compile(r'(?<=[.!?…])["\'”’)\]]*\s+|\n\s*\n')
+WORD_RE     = re.compile(r"\S+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _units(text: str, max_chars: int) -> list[tuple[int, int]]:
+    """Sentence spans of `text`, each at most `max_chars` long (long
+    sentences fall back to words, long words to fixed-size pieces)."""
+    units, start = [], 0
+    for boundary in BOUNDARY_RE.finditer(text):
+        units.append((start, boundary.start()))
+        start = boundary.end()
+    units.append((start, len(text)))
+
+    bounded = []
+    for start, end in units:
+        piece = text[start:end]
+        offset = len(piece) - len(piece.lstrip())
+        start, end = start + offset, start + len(piece.rstrip())
+        if start >= end:
+            continue
+        if end - start <= max_chars:
+            bounded.append((start, end))
+            continue
+        for word in WORD_RE.finditer(text, start, end):
+            for cut in range(word.start(), word.end(), max_chars):
+                bounded.append((cut, min(cut + max_chars, word.end())))
+    return bounded
+
+
+def split_text(text: str, max_tokens: int = 400, overlap_tokens: int = 40) -> list[tuple[int, int]]:
+    """[start, end) character spans covering `text`, each at most
+    `max_tokens`, consecutive spans sharing up to `overlap_tokens` of whole
+    sentences (or words, inside a sentence that was itself too long)."""
+    if max_tokens < 1 or not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("need max_tokens >= 1 and 0 <= overlap_tokens < max_tokens")
+    max_chars, overlap_chars = max_tokens * CHARS_PER_TOKEN, overlap_tokens * CHARS_PER_TOKEN
+
+    chunks, current = [], []
+    for unit in _units(text, max_chars):
+        if current and unit[1] - current[0][0] > max_chars:
+            chunks.append((current[0][0], current[-1][1]))
+            # carry the trailing units that fit the overlap budget and still
+            # leave room for `unit`
+            carried = []
+            for prev in reversed(current):
+                if current[-1][1] - prev[0] > overlap_chars or unit[1] - prev[0] > max_chars:
+                    break
+                carried.insert(0, prev)
+            current = carried
+        current.append(unit)
+    if current:
+        chunks.append((current[0][0], current[-1][1]))
+    return chunks
+
+
+def _merge_spans(spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def merge_results(content: str, spans: list[tuple[int, int]], results: list[dict]) -> dict:
+    """Fold per-chunk results into one result dict for `content`."""
+    worst_i = max(range(len(results)), key=lambda i: (SEVERITY.get(results[i]["classification"], 1), -i))
+    worst   = results[worst_i]
+    label   = worst["classification"]
+    flagged = [] if label == "GOOD" else _merge_spans(
+        [span for span, r in zip(spans, results) if r["classification"] == label])
+    return {
+        **worst,
+        "original": content,
+        "tier":     "llm" if any(r.get("tier", "llm") == "llm" for r in results) else "local",
+        "spans":    [{"start": s, "end": e, "text": content[s:e]} for s, e in flagged],
+        "chunks":   [
+            {"start": s, "end": e, "classification": r["classification"], "sub_label": r["sub_label"],
+             "is_sarcasm": r["is_sarcasm"]}
+            for (s, e), r in zip(spans, results)
+        ],
+    }
+
+
+class LongDocumentAnalyzer:
+    def __init__(self, agent, max_tokens: int = 400, overlap_tokens: int = 40, max_concurrency: int = 8):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        split_text("", max_tokens, overlap_tokens)   # validate the budget up front
+        self.agent           = agent
+        self.max_tokens      = max_tokens
+        self.overlap_tokens  = overlap_tokens
+        self.max_concurrency = max_concurrency
+        self._pool           = None
+        self._pool_lock      = threading.Lock()
+
+    def needs_split(self, content: str) -> bool:
+        return estimate_tokens(content) > self.max_tokens
+
+    def split(self, content: str) -> list[tuple[int, int]]:
+        spans = split_text(content, self.max_tokens, self.overlap_tokens)
+        log.info("  Long input (~%d tokens) → %d chunks", estimate_tokens(content), len(spans))
+        return spans
+
+    def analyze(self, content: str) -> dict:
+        """Sync path: chunks run on a thread pool through the agent's pipeline
+        (agent._analyze: only the merged result is stored, not each chunk)."""
+        spans = self.split(content)
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="long-document")
+        # copy_context: pool threads keep the caller's LLM priority
+        futures = [self._pool.submit(contextvars.copy_context().run, self.agent._analyze, content[s:e])
+                   for s, e in spans]
+        return merge_results(content, spans, [f.result() for f in futures])
+
+    async def aanalyze(self, content: str) -> dict:
+        spans = self.split(content)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(span):
+            async with semaphore:
+                return await self.agent._aanalyze(content[span[0]:span[1]])
+
+        return merge_results(content, spans, await asyncio.gather(*(run(span) for span in spans)))
@@ -0,0 +1,113 @@
+from instrumentation import BATCH_ITEMS
+import asyncio
+import re
+from typing import Awaitable, Callable
+
+# Responsibility: coalesce concurrent single-item LLM calls (one stage, many
+# in-flight pipelines) into one numbered prompt. A batch is sent when
+# `max_batch` items are waiting or `max_wait_ms` after the first one
+# arrived, whichever comes first. Items the batched reply did not answer
+# cleanly are re-run one at a time, so callers always get the same result
+# shape as the unbatched path.
+#
+# Async only: batching needs many callers in flight at once (PipelineRunner,
+# BatchJob). The sync pipeline keeps calling the LLM once per message.
+
+BLOCK_RE = re.compile(r"^\s*\[(\d+)\]\s*$", re.MULTILINE)
+
+
+def split_numbered_blocks(raw: str, count: int) -> list[str | None]:
+    """Split a reply made of `[1]` … `[count]` header lines into per-item
+    text blocks; items the reply skipped (or numbered twice) come back None."""
+    if "<think>" in raw:
+        raw = raw.split("</think>")[-1]
+    blocks = [None] * count
+    seen   = set()
+    markers = list(BLOCK_RE.finditer(raw))
+    for marker, following in zip(markers, markers[1:] + [None]):
+        n = int(marker.group(1)) - 1
+        end = following.start() if following else len(raw)
+        if 0 <= n < count:
+            if n in seen:
+                blocks[n] = None   # ambiguous — let the item re-run alone
+                continue
+            seen.add(n)
+            blocks[n] = raw[marker.end():end].strip()
+    return blocks
+
+
+class MicroBatcher:
+    def __init__(self, run_batch: Callable[[list], Awaitable[list]], run_one: Callable[[object], Awaitable],
+                 max_batch: int = 16, max_wait_ms: float = 20.0, name: str = "batch"):
+        """`run_batch(items)` returns one result per item, None where the
+        batched reply could not be used; `run_one(item)` is the fallback.
+        `name` labels the batcher's metrics."""
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.run_batch   = run_batch
+        self.run_one     = run_one
+        self.max_batch   = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.name        = name
+        self.stats       = {"items": 0, "batches": 0, "singles": 0, "fallbacks": 0}
+        self._pending    = []      # (item, future) waiting for the next flush
+        self._timer      = None
+        self._tasks      = set()   # running flushes (strong refs so they aren't GC'd)
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self.stats["items"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list) -> None:
+        items = [item for item, _ in batch]
+        if len(items) == 1:
+            # a one-item numbered prompt is only worse than the normal one
+            self.stats["singles"] += 1
+            results = [None]
+        else:
+            self.stats["batches"] += 1
+            try:
+                results = await self.run_batch(items)
+            except Exception:
+                results = [None] * len(items)   # e.g. reply over the token limit: retry one by one
+
+        async def _settle(item, future, result):
+            try:
+                if result is None:
+                    if len(items) > 1:
+                        self.stats["fallbacks"] += 1
+                    BATCH_ITEMS.inc(stage=self.name, outcome="fallback" if len(items) > 1 else "single")
+                    result = await self.run_one(item)
+                else:
+                    BATCH_ITEMS.inc(stage=self.name, outcome="batch")
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():   # the caller may have been cancelled
+                future.set_result(result)
+
+        await asyncio.gather(*(_settle(item, future, result) for (item, future), result in zip(batch, results)))
+
+    def summary(self) -> dict:
+        batched = self.stats["items"] - self.stats["singles"]
+        return {
+            **self.stats,
+            "mean_batch_size": round(batched / self.stats["batches"], 2) if self.stats["batches"] else 0.0,
+        }
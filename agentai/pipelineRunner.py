@@ -0,0 +1,94 @@
+from .deadline import pipeline_deadline
+import asyncio
+import contextlib
+from typing import AsyncIterator, Callable, Hashable, Iterable
+
+# Responsibility: keep many messages in flight through
+# ToxicityAgent.adetect_and_respond without ever exceeding
+# `max_concurrency` concurrent pipelines (and therefore LLM calls
+# per stage) against Groq / Ollama.
+#
+# `deadline_s` gives every message that long from the moment it is
+# submitted, waiting for a free slot included (see deadline.py).
+class PipelineRunner:
+    def __init__(self, agent, max_concurrency: int = 16, deadline_s: float | None = None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.agent           = agent
+        self.max_concurrency = max_concurrency
+        self.deadline_s      = deadline_s
+        self._semaphore      = None
+        self._loop           = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # a Semaphore is bound to the event loop that first waits on it,
+        # so rebuild it if the runner is reused under a new asyncio.run()
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop      = loop
+        return self._semaphore
+
+    def _deadline(self):
+        return pipeline_deadline(self.deadline_s) if self.deadline_s is not None else contextlib.nullcontext()
+
+    async def run(self, content: str) -> dict:
+        with self._deadline():
+            async with self.semaphore:
+                return await self.agent.adetect_and_respond(content)
+
+    async def run_in_thread(self, thread_id: str, content: str, speaker: str | None = None) -> dict:
+        """`content` as the next message of conversation `thread_id` (see conversation.py)."""
+        with self._deadline():
+            async with self.semaphore:
+                return await self.agent.adetect_in_thread(thread_id, content, speaker)
+
+    async def run_many(self, contents: Iterable[str]) -> list[dict]:
+        """Analyze every message and return the results in input order."""
+        return await asyncio.gather(*(self.run(c) for c in contents))
+
+    async def iter_completed(
+        self, items: Iterable[tuple[Hashable, str]], admit: Callable[[], bool] | None = None,
+    ) -> AsyncIterator[tuple[Hashable, dict | None, Exception | None]]:
+        """Yield `(key, result, error)` as each `(key, content)` pair finishes.
+
+        `items` is consumed lazily and at most `max_concurrency` tasks exist
+        at any time, so arbitrarily large (streamed) inputs use flat memory.
+        A failing message is yielded with its exception instead of
+        cancelling the rest of the run.
+
+        `admit` is optional backpressure from the consumer: while it returns
+        False no new items are pulled (unless nothing is in flight).
+        """
+        async def _run_one(key, content):
+            try:
+                with self._deadline():
+                    return key, await self.agent.adetect_and_respond(content), None
+            except Exception as e:
+                return key, None, e
+
+        iterator = iter(items)
+        pending  = set()
+        try:
+            while True:
+                while len(pending) < self.max_concurrency:
+                    if pending and admit is not None and not admit():
+                        break
+                    try:
+                        key, content = next(iterator)
+                    except StopIteration:
+                        break
+                    pending.add(asyncio.ensure_future(_run_one(key, content)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def run_all(self, contents: Iterable[str]) -> list[dict]:
+        """Blocking wrapper around `run_many` for synchronous callers."""
+        return asyncio.run(self.run_many(contents))
@@ -0,0 +1,138 @@
+from instrumentation import timed_stage
+from rag_setup import ToxicityRAG, EXAMPLES_PATH
+from collections import Counter
+import asyncio
+import json
+import logging
+import re
+import threading
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Responsibility: first tier of the cascade. Embed the message on CPU and
+# take a similarity-weighted k-NN vote over the labeled example corpus.
+# Clearly GOOD or clearly TOXIC messages are settled here; anything else
+# (NEUTRAL, low similarity, split vote) is escalated to the LLM pipeline.
+#
+# The k-NN only sees surface similarity, so sarcastic praise ("great work,
+# you really nailed it… not") looks GOOD. Texts with sarcasm markers are
+# therefore never settled as GOOD locally — they always reach the
+# SarcasmDetector.
+
+DEFAULT_THRESHOLDS = {
+    "GOOD":  0.92,   # weighted vote share needed to settle without the LLM
+    "TOXIC": 0.90,
+}
+
+SARCASM_MARKERS = re.compile(
+    r"(/s\b|\bnot\s*[!.…]*\s*$|\byeah,? right\b|\boh,? (great|sure|wow|joy)\b|\bwow\b|\btotally\b|"
+    r"\bobviously\b|\bclearly\b|\bsure+,|\bgenius\b|\bthanks a lot\b|\bjust what i needed\b|"
+    r"\bso-called\b|\bbrilliant\b|\bslow clap\b|[🙄🙃😒😏]|\.\.\.|…|!{2,}|\?!|!\?)",
+    re.IGNORECASE,
+)
+
+
+def has_sarcasm_markers(text: str) -> bool:
+    return SARCASM_MARKERS.search(text) is not None
+
+
+class PreClassifier:
+    def __init__(self, rag: ToxicityRAG, examples_path: str = EXAMPLES_PATH, k: int = 7,
+                 thresholds: dict | None = None, min_similarity: float = 0.55):
+        self.rag            = rag
+        self.examples_path  = examples_path
+        self.k              = k
+        self.thresholds     = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.min_similarity = min_similarity   # nearest example must be at least this close
+
+        self._examples   = None
+        self._embeddings = None
+        self._load_lock  = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats       = {"total": 0, "escalated": 0, "settled": {label: 0 for label in self.thresholds}}
+        log.info("   PreClassifier ready")
+
+    def load(self) -> None:
+        """Embed the example corpus once; safe to call from several threads."""
+        with self._load_lock:
+            if self._examples is not None:
+                return
+            with open(self.examples_path, encoding="utf-8") as f:
+                examples = [json.loads(line) for line in f if line.strip()]
+            self._embeddings = self.rag.embed([e["text"] for e in examples])
+            self._examples   = examples
+
+    def neighbours(self, embedding: np.ndarray) -> list[tuple[float, dict]]:
+        self.load()
+        scores = self._embeddings @ embedding
+        top = np.argsort(-scores)[: self.k]
+        return [(float(scores[i]), self._examples[i]) for i in top]
+
+    def _decide(self, content: str, embedding: np.ndarray) -> dict:
+        neighbours = self.neighbours(embedding)
+
+        votes = Counter()
+        for score, example in neighbours:
+            votes[example["label"]] += max(score, 0.0)
+        total = sum(votes.values())
+
+        if not total:
+            # nothing in the corpus is even remotely similar
+            label, sub_label, confidence, settled = "NEUTRAL", "UNKNOWN", 0.0, False
+        else:
+            label, weight = votes.most_common(1)[0]
+            confidence = weight / total
+            sub_label = Counter(e["sub_label"] for _, e in neighbours if e["label"] == label).most_common(1)[0][0]
+            settled = (
+                label in self.thresholds
+                and confidence >= self.thresholds[label]
+                and neighbours[0][0] >= self.min_similarity
+                and not (label == "GOOD" and has_sarcasm_markers(content))
+            )
+
+        with self._stats_lock:
+            self.stats["total"] += 1
+            if settled:
+                self.stats["settled"][label] += 1
+            else:
+                self.stats["escalated"] += 1
+
+        if settled:
+            log.info("     PreClassifier: settled %s - %s (confidence %.2f)", label, sub_label.lower(), confidence)
+        else:
+            log.info("     PreClassifier: escalate (best %s %.2f, nearest sim %.2f)", label, confidence, neighbours[0][0])
+
+        return {
+            "label":       label,
+            "sub_label":   sub_label,
+            "confidence":  round(confidence, 4),
+            "similarity":  round(neighbours[0][0], 4),
+            "settled":     settled,
+        }
+
+    @timed_stage("pre_classifier")
+    def classify(self, content: str) -> dict:
+        return self._decide(content, self.rag.embed([content])[0])
+
+    @timed_stage("pre_classifier")
+    async def aclassify(self, content: str) -> dict:
+        # corpus + query encoding are CPU-bound — keep them off the event loop
+        if self._examples is None:
+            await asyncio.to_thread(self.load)
+        embedding = (await asyncio.to_thread(self.rag.embed, [content]))[0]
+        return self._decide(content, embedding)
+
+    def summary(self) -> dict:
+        """Counters plus the share of traffic that never reached the LLM."""
+        with self._stats_lock:
+            settled_by_label = dict(self.stats["settled"])
+            total     = self.stats["total"]
+            escalated = self.stats["escalated"]
+        settled = sum(settled_by_label.values())
+        return {
+            "total":                total,
+            "escalated":            escalated,
+            "settled":              settled_by_label,
+            "skipped_llm_fraction": round(settled / total, 4) if total else 0.0,
+        }
@@ -1,13 +1,89 @@
+from instrumentation import PARSES, timed_stage
 from rag_setup import ToxicityRAG
+from result_cache import make_key, normalize_text
+from typing import AsyncIterator, Iterator
+import logging
 import re
 
+log = logging.getLogger(__name__)
+
 # Responsibility: Given the text + confirmed classification,
 # produce a human-readable explanation AND a message to the
 # author (only for TOXIC content).
+#
+# `template` is the free alternative: a fixed-form explanation for results
+# nobody reads closely (GOOD / NEUTRAL under ToxicityAgent(explain="toxic")).
+
+TEMPLATES = {
+    "GOOD":    "Classified as GOOD ({sub_label}): the message reads as {sub_label} and contains no hostile, "
+               "insulting or abusive language.",
+    "NEUTRAL": "Classified as NEUTRAL ({sub_label}): the message is {sub_label} in tone, without "
+               "hostility, insults or threats.",
+    "TOXIC":   "Classified as TOXIC ({sub_label}). A detailed explanation of the offending words and "
+               "tone is available on request.",
+}
+
+SARCASM_NOTES = {
+    "sarcastic": " It was read as sarcastic, so the label reflects its intended meaning rather than the literal words.",
+    "ambiguous": " It may be sarcastic; without more context it was classified at face value.",
+}
+
+
+class ExplanationStream:
+    """Incrementally strips a `<think>` block and the `Explanation:` prefix
+    from streamed completion text, so callers only ever see the explanation.
+    """
+    PREFIX = "explanation:"
+
+    def __init__(self):
+        self.raw     = ""   # everything received, for the final parse
+        self._buffer = ""
+        self._state  = "start"   # start → (think) → prefix → body
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        if self._state == "body":
+            return chunk
+        self._buffer += chunk
+
+        if self._state == "start":
+            head = self._buffer.lstrip()
+            if "<think>".startswith(head):
+                return ""   # empty or a partial "<think>" — can't tell yet
+            self._state = "think" if head.startswith("<think>") else "prefix"
+        if self._state == "think":
+            if "</think>" not in self._buffer:
+                return ""
+            self._buffer = self._buffer.split("</think>", 1)[1]
+            self._state  = "prefix"
+        if self._state == "prefix":
+            head = self._buffer.lstrip()
+            if head.lower().startswith(self.PREFIX):
+                body = head[len(self.PREFIX):].lstrip()
+                if not body:
+                    return ""   # wait for the first real character
+            elif self.PREFIX.startswith(head.lower()):
+                return ""       # still a possible prefix
+            else:
+                body = head     # the model skipped the prefix
+            self._state, self._buffer = "body", ""
+            return body
+        return ""
+
+    def finish(self) -> str:
+        # a reply that never got past the prefix / think check
+        if self._state == "body":
+            return ""
+        rest = self._buffer.split("</think>")[-1].strip()
+        return rest[len(self.PREFIX):].lstrip() if rest.lower().startswith(self.PREFIX) else rest
+
+
 class ResponderAgent:
+    PROMPT_VERSION = 1   # bump whenever _build_prompt changes (invalidates cached results)
+
     def __init__(self, rag: ToxicityRAG):
         self.rag = rag 
-        print("   Responder ready")
+        log.info("   Responder ready")
 
     def _build_prompt(self, content: str, classification: str, sub_label:str, sarcasm_result: dict) -> str:
         is_sarcasm = sarcasm_result["is_sarcasm"]
@@ -38,9 +114,9 @@ Reference specific words or tone from the text.
 Respond in EXACTLY this format — no extra lines:
 Explanation: [your explanation]"""
 
-    def respond(self, content: str, classification: str, sub_label: str, sarcasm_result: dict) -> str:
-        prompt = self._build_prompt(content, classification, sub_label, sarcasm_result)
-        raw_response = self.rag.llm_responder.invoke(prompt)
+    def _parse_response(self, raw_response) -> tuple[str, bool]:
+        """Return (explanation, parsed). `parsed` is False when the reply had
+        no `Explanation:` prefix and the raw text is passed through."""
         raw = raw_response.content if hasattr(raw_response, "content") else raw_response
 
         if "<think>" in raw:
@@ -51,5 +127,94 @@ Explanation: [your explanation]"""
         else:
             explanation = raw.strip()
 
-        print(f"     Responder: {explanation[:180]}{'…' if len(explanation) > 80 else ''}")
-        return explanation
\ No newline at end of file
+        log.info("     Responder: %.180s%s", explanation, "…" if len(explanation) > 180 else "")
+        PARSES.inc(stage="responder", outcome="ok" if match else "fallback")
+        return explanation, match is not None
+
+    def _cache_key(self, content: str, classification: str, sub_label: str, sarcasm_result: dict) -> str:
+        return make_key(
+            "responder", self.rag.model_for("responder"), self.PROMPT_VERSION,
+            normalize_text(content), classification, sub_label,
+            sarcasm_result["is_sarcasm"], normalize_text(sarcasm_result["meaning"]),
+        )
+
+    def template(self, classification: str, sub_label: str, sarcasm_result: dict) -> str:
+        """Templated explanation — no LLM call."""
+        text = TEMPLATES.get(classification, TEMPLATES["NEUTRAL"]).format(sub_label=sub_label.lower())
+        return text + SARCASM_NOTES.get(sarcasm_result["is_sarcasm"], "")
+
+    @timed_stage("responder")
+    def respond(self, content: str, classification: str, sub_label: str, sarcasm_result: dict) -> str:
+        key = self._cache_key(content, classification, sub_label, sarcasm_result)
+        cached = self.rag.cache.get("responder", key)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(content, classification, sub_label, sarcasm_result)
+        raw_response = self.rag.llm_responder.invoke(prompt)
+        explanation, parsed = self._parse_response(raw_response)
+        if parsed:   # don't cache a reply that ignored the format
+            self.rag.cache.set("responder", key, explanation)
+        return explanation
+
+    @timed_stage("responder")
+    def stream(self, content: str, classification: str, sub_label: str, sarcasm_result: dict) -> Iterator[str]:
+        """Like `respond`, but yield the explanation as the LLM produces it.
+
+        A cache hit yields the whole explanation at once.
+        """
+        key = self._cache_key(content, classification, sub_label, sarcasm_result)
+        cached = self.rag.cache.get("responder", key)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt = self._build_prompt(content, classification, sub_label, sarcasm_result)
+        stream = ExplanationStream()
+        for chunk in self.rag.llm_responder.stream(prompt):
+            text = stream.feed(chunk.content if hasattr(chunk, "content") else chunk)
+            if text:
+                yield text
+        tail = stream.finish()
+        if tail:
+            yield tail
+
+        explanation, parsed = self._parse_response(stream.raw)
+        if parsed:
+            self.rag.cache.set("responder", key, explanation)
+
+    @timed_stage("responder")
+    async def astream(self, content: str, classification: str, sub_label: str, sarcasm_result: dict) -> AsyncIterator[str]:
+        key = self._cache_key(content, classification, sub_label, sarcasm_result)
+        cached = await self.rag.cache.aget("responder", key)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt = self._build_prompt(content, classification, sub_label, sarcasm_result)
+        stream = ExplanationStream()
+        async for chunk in self.rag.llm_responder.astream(prompt):
+            text = stream.feed(chunk.content if hasattr(chunk, "content") else chunk)
+            if text:
+                yield text
+        tail = stream.finish()
+        if tail:
+            yield tail
+
+        explanation, parsed = self._parse_response(stream.raw)
+        if parsed:
+            await self.rag.cache.aset("responder", key, explanation)
+
+    @timed_stage("responder")
+    async def arespond(self, content: str, classification: str, sub_label: str, sarcasm_result: dict) -> str:
+        key = self._cache_key(content, classification, sub_label, sarcasm_result)
+        cached = await self.rag.cache.aget("responder", key)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(content, classification, sub_label, sarcasm_result)
+        raw_response = await self.rag.llm_responder.ainvoke(prompt)
+        explanation, parsed = self._parse_response(raw_response)
+        if parsed:
+            await self.rag.cache.aset("responder", key, explanation)
+        return explanation
@@ -1,9 +1,22 @@
+from instrumentation import PARSES, timed_stage
 from rag_setup import ToxicityRAG
+from result_cache import make_key, normalize_text
+from .conversation import current_context
+from .microBatcher import MicroBatcher, split_numbered_blocks
+import logging
+
+log = logging.getLogger(__name__)
 
 class SarcasmDetector:
+    PROMPT_VERSION = 1   # bump whenever _build_prompt changes (invalidates cached results)
+
     def __init__(self, rag: ToxicityRAG):
         self.rag = rag
-        print("   SarcasmDetector ready")
+        self.batcher = None   # MicroBatcher once enable_batching() is called (async path only)
+        log.info("   SarcasmDetector ready")
+
+    def enable_batching(self, max_batch: int = 16, max_wait_ms: float = 20.0) -> None:
+        self.batcher = MicroBatcher(self._adetect_batch, self._adetect_one, max_batch, max_wait_ms, name="sarcasm")
 
     def _build_prompt(self, content: str) -> str:
         text_length = len(content.split())
@@ -24,6 +37,15 @@ class SarcasmDetector:
                 "- Detect irony through exaggeration, contradictions, or inconsistent emotional tone"
             )
 
+        context = current_context()
+        context_block = ""
+        if context:
+            # earlier turns only inform the reading of TEXT; they are not analyzed themselves
+            context_block = (
+                "\n\n    CONVERSATION SO FAR (context only — judge the TEXT, not these messages):\n"
+                + "\n".join(f"    {line}" for line in context.splitlines())
+            )
+
         return f"""You are a sarcasm detection engine.
 
     DEFINITIONS:
@@ -36,7 +58,7 @@ class SarcasmDetector:
     - TOXIC    : hateful, harmful, or offensive
 
     ANALYSIS APPROACH:
-    {analysis_instruction}
+    {analysis_instruction}{context_block}
 
     TEXT:
     \"\"\"{content}\"\"\"
@@ -46,9 +68,38 @@ class SarcasmDetector:
     TOXICITY: [GOOD/NEUTRAL/TOXIC]
     TRUE_MEANING: [true meaning if YES, otherwise repeat the original text]"""
 
-    def detect(self, content: str) -> dict:
-        prompt = self._build_prompt(content)
-        raw_response = self.rag.llm_sarcasm.invoke(prompt)
+    def _build_batch_prompt(self, contents: list[str]) -> str:
+        texts = "\n".join(f'[{i}] """{content}"""' for i, content in enumerate(contents, 1))
+        return f"""You are a sarcasm detection engine. Analyze each numbered text independently.
+
+    DEFINITIONS:
+    - YES      : the literal words mean the OPPOSITE of the true intent
+    - NO       : the text means exactly what it says
+
+    TOXICITY (based on TRUE meaning, not literal words):
+    - GOOD     : positive, kind, or constructive
+    - NEUTRAL  : no harmful or positive intent
+    - TOXIC    : hateful, harmful, or offensive
+
+    ANALYSIS APPROACH:
+    - Short texts: look at word choice, punctuation, emojis, derogatory slang and sentiment mismatch
+    - Longer texts: look at tone shifts, a conclusion that contradicts the setup, exaggeration
+    - If truly impossible to judge, use UNKNOWN
+
+    TEXTS:
+    {texts}
+
+    Reply with one block per text, in order, in EXACTLY this format with no extra text:
+    [1]
+    IS_SARCASTIC: [YES/NO/UNKNOWN]
+    TOXICITY: [GOOD/NEUTRAL/TOXIC]
+    TRUE_MEANING: [true meaning if YES, otherwise repeat the original text]
+    [2]
+    …"""
+
+    def _parse_response(self, raw_response, content: str) -> tuple[dict, bool]:
+        """Return (result, parsed). `parsed` is False when the reply had no
+        IS_SARCASTIC / TOXICITY lines and the result is only the defaults."""
         raw = raw_response.content if hasattr(raw_response, "content") else raw_response
         raw = raw.strip().upper()
 
@@ -59,39 +110,87 @@ class SarcasmDetector:
         is_sarcasm = "no"
         toxicity   = "NEUTRAL"
         meaning    = content
+        seen       = set()
 
         for line in raw.split("\n"):
             line = line.strip()
             if line.startswith("IS_SARCASTIC:"):
+                seen.add("IS_SARCASTIC")
                 val = line.replace("IS_SARCASTIC:", "").strip().upper()
                 if val == "YES":
                     is_sarcasm = "sarcastic"
                 elif val == "UNKNOWN":
                     is_sarcasm = "ambiguous"
             elif line.startswith("TOXICITY:"):
+                seen.add("TOXICITY")
                 toxicity = line.replace("TOXICITY:", "").strip().upper()
             elif line.startswith("TRUE_MEANING:"):
                 meaning = line.replace("TRUE_MEANING:", "").strip() or content
 
         match is_sarcasm:
             case "sarcastic":
-                print("\n" + "-"*60)
-                print(f"     SarcasmDetector: SARCASTIC ({toxicity})")
-                print(f"     Original: {content[:300]}")
-                print(f"     Meaning:  {meaning[:280]}")
-                print("-"*60)
+                log.info("     SarcasmDetector: SARCASTIC (%s)\n     Original: %.300s\n     Meaning:  %.280s",
+                         toxicity, content, meaning)
             case "ambiguous":
-                print("\n" + "-"*60)
-                print(f"     SarcasmDetector: AMBIGUOUS ({toxicity})")
-                print(f"     Original: {content[:300]}")
-                print("-"*60)
+                log.info("     SarcasmDetector: AMBIGUOUS (%s)\n     Original: %.300s", toxicity, content)
             case _:
-                print("\n" + "-"*60)
-                print(f"     SarcasmDetector: no sarcasm ({toxicity})")
-                print("-"*60)
+                log.info("     SarcasmDetector: no sarcasm (%s)", toxicity)
 
+        parsed = seen == {"IS_SARCASTIC", "TOXICITY"}
+        PARSES.inc(stage="sarcasm", outcome="ok" if parsed else "fallback")
         return {
             "is_sarcasm": is_sarcasm,
             "toxicity":   toxicity,
             "meaning":    meaning,
-        }
\ No newline at end of file
+        }, parsed
+
+    def _cache_key(self, content: str) -> str:
+        parts = (normalize_text(content),)
+        if current_context():   # the same text reads differently in another conversation
+            parts += (current_context(),)
+        return make_key("sarcasm", self.rag.model_for("sarcasm"), self.PROMPT_VERSION, *parts)
+
+    @timed_stage("sarcasm")
+    def detect(self, content: str) -> dict:
+        key = self._cache_key(content)
+        cached = self.rag.cache.get("sarcasm", key)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(content)
+        raw_response = self.rag.llm_sarcasm.invoke(prompt)
+        result, parsed = self._parse_response(raw_response, content)
+        if parsed:   # never cache the defaults from a malformed reply
+            self.rag.cache.set("sarcasm", key, result)
+        return result
+
+    @timed_stage("sarcasm")
+    async def adetect(self, content: str) -> dict:
+        key = self._cache_key(content)
+        cached = await self.rag.cache.aget("sarcasm", key)
+        if cached is not None:
+            return cached
+        if self.batcher is not None and current_context() is None:   # a batch prompt has no per-item context
+            return await self.batcher.submit(content)
+        return await self._adetect_one(content)
+
+    async def _adetect_batch(self, contents: list[str]) -> list[dict | None]:
+        # batched answers are cached under the same keys: same question, same label set
+        raw_response = await self.rag.llm_for("sarcasm_batch").ainvoke(self._build_batch_prompt(contents))
+        raw = raw_response.content if hasattr(raw_response, "content") else raw_response
+        results = []
+        for content, block in zip(contents, split_numbered_blocks(raw, len(contents))):
+            result, parsed = self._parse_response(block, content) if block else (None, False)
+            if parsed:
+                await self.rag.cache.aset("sarcasm", self._cache_key(content), result)
+            results.append(result if parsed else None)
+        return results
+
+    async def _adetect_one(self, content: str) -> dict:
+        key = self._cache_key(content)
+        prompt = self._build_prompt(content)
+        raw_response = await self.rag.llm_sarcasm.ainvoke(prompt)
+        result, parsed = self._parse_response(raw_response, content)
+        if parsed:
+            await self.rag.cache.aset("sarcasm", key, result)
+        return result
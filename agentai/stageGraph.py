@@ -0,0 +1,242 @@
+from instrumentation import LLM_CALLS_SAVED, PIPELINE_PATHS
+from typing import TypedDict
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# The staged pipeline as a langgraph StateGraph with conditional edges:
+#
+#   translate ─▶ [pre_classify ─▶ local] ─▶ sarcasm ─┬▶ classify ─┬▶ respond ──▶ finish
+#                                                   └▶ settle ───┴▶ template ─┘
+#
+# The SarcasmDetector already answers TOXICITY: next to IS_SARCASTIC. After
+# it runs, the early-exit rules are checked in order; the first one whose
+# conditions hold can "settle" the label from that verdict (no
+# ClassifierAgent call) and / or replace the responder's LLM explanation with
+# a template. Every result counts its path — the rule's name, "local"
+# (pre-classifier) or "full" — and every LLM call a rule skipped.
+#
+# Nodes have a sync and an async body, so invoke() and ainvoke() both run
+# the agents' own sync / async calls (no thread hop on the async path).
+# ---------------------------------------------------------------------------
+
+# name -> {"is_sarcasm": allowed values, "toxicity": allowed values (the
+# sarcasm stage's verdict), "skip": stages, "sub_label": reported when the
+# classifier is skipped — the sarcasm stage gives only the top-level label}
+EARLY_EXIT_RULES = {
+    # sincere and benign: the classifier and responder would only restate GOOD
+    "sincere_good": {"is_sarcasm": ("no",), "toxicity": ("GOOD",), "sub_label": "SINCERE",
+                     "skip": ("classifier", "responder")},
+}
+SKIPPABLE_STAGES = ("classifier", "responder")
+LABELS           = ("TOXIC", "NEUTRAL", "GOOD")
+
+
+class PipelineState(TypedDict, total=False):
+    content:     str
+    translation: dict
+    working:     str
+    tier1:       dict
+    sarcasm:     dict
+    rule:        str | None
+    toxicity:    str
+    sub_label:   str
+    explanation: str
+    source:      str
+    result:      dict
+
+
+def validate_rules(rules: dict) -> None:
+    for name, rule in rules.items():
+        unknown = set(rule) - {"is_sarcasm", "toxicity", "sub_label", "skip"}
+        if unknown:
+            raise ValueError(f"Early-exit rule '{name}' has unknown keys {sorted(unknown)}")
+        skip = rule.get("skip", ())
+        if not skip or not set(skip) <= set(SKIPPABLE_STAGES):
+            raise ValueError(f"Early-exit rule '{name}' must skip some of {SKIPPABLE_STAGES}")
+        if "classifier" in skip and (not rule.get("toxicity") or not set(rule["toxicity"]) <= set(LABELS)
+                                     or not rule.get("sub_label")):
+            raise ValueError(f"Early-exit rule '{name}' skips the classifier, so it needs "
+                             f"'toxicity' labels from {LABELS} and a 'sub_label'")
+
+
+class StageGraph:
+    def __init__(self, agent, rules: dict | None = None):
+        """`rules` replaces EARLY_EXIT_RULES; {} runs every stage but still counts paths."""
+        self.agent  = agent
+        self.rules  = dict(EARLY_EXIT_RULES if rules is None else rules)
+        validate_rules(self.rules)
+        self.counts = {"paths": {}, "calls_saved": {name: {} for name in self.rules}}
+        self._lock  = threading.Lock()
+        self._graph = None   # compiled on first use: importing langgraph takes ~1 s
+
+    # ------------------------------------------------------------------
+    # rules (also used by the agent's streaming paths)
+    # ------------------------------------------------------------------
+
+    def match(self, sarcasm_result: dict) -> str | None:
+        """Name of the first rule the sarcasm result satisfies."""
+        for name, rule in self.rules.items():
+            if all(sarcasm_result.get(field) in rule[field] for field in ("is_sarcasm", "toxicity") if field in rule):
+                return name
+        return None
+
+    def skips(self, rule: str | None, stage: str) -> bool:
+        return rule is not None and stage in self.rules[rule]["skip"]
+
+    def settle(self, rule: str, sarcasm_result: dict) -> tuple[str, str]:
+        log.info("     Early exit (%s): %s from the sarcasm stage, classifier skipped", rule, sarcasm_result["toxicity"])
+        return sarcasm_result["toxicity"], self.rules[rule]["sub_label"]
+
+    def wants_llm_explanation(self, rule: str | None, toxicity: str) -> bool:
+        return not self.skips(rule, "responder") and self.agent._wants_llm_explanation(toxicity)
+
+    def record(self, path: str, toxicity: str | None = None) -> None:
+        """Count a finished result: `path` is a rule name, "local" or "full"."""
+        saved = []
+        if path in self.rules:
+            if self.skips(path, "classifier"):
+                saved.append("classifier")
+            # only a call the explain policy would have made is saved
+            if self.skips(path, "responder") and self.agent._wants_llm_explanation(toxicity):
+                saved.append("responder")
+        with self._lock:
+            self.counts["paths"][path] = self.counts["paths"].get(path, 0) + 1
+            for stage in saved:
+                by_stage = self.counts["calls_saved"][path]
+                by_stage[stage] = by_stage.get(stage, 0) + 1
+        PIPELINE_PATHS.inc(path=path)
+        for stage in saved:
+            LLM_CALLS_SAVED.inc(rule=path, stage=stage)
+
+    def summary(self) -> dict:
+        """Results per path and, per rule, the LLM calls it skipped."""
+        with self._lock:
+            paths = dict(self.counts["paths"])
+            saved = {name: dict(by_stage) for name, by_stage in self.counts["calls_saved"].items()}
+        total = sum(paths.values())
+        return {
+            "results":           total,
+            "paths":             paths,
+            "early_exit_rate":   round(sum(n for p, n in paths.items() if p in self.rules) / total, 4) if total else 0.0,
+            "calls_saved":       {name: sum(by_stage.values()) for name, by_stage in saved.items()},
+            "calls_saved_stage": saved,
+        }
+
+    # ------------------------------------------------------------------
+    # the graph
+    # ------------------------------------------------------------------
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = self._build()
+        return self._graph
+
+    def run(self, content: str) -> dict:
+        return self.graph.invoke({"content": content})["result"]
+
+    async def arun(self, content: str) -> dict:
+        return (await self.graph.ainvoke({"content": content}))["result"]
+
+    def _build(self):
+        from langchain_core.runnables import RunnableLambda
+        from langgraph.graph import END, START, StateGraph
+
+        def node(fn, afn=None):
+            async def inline(state):
+                return fn(state)
+            return RunnableLambda(fn, afunc=afn or inline)
+
+        agent = self.agent
+        graph = StateGraph(PipelineState)
+        graph.add_node("translate", node(self._translate, self._atranslate))
+        graph.add_node("sarcasm",   node(self._sarcasm, self._asarcasm))
+        graph.add_node("classify",  node(self._classify, self._aclassify))
+        graph.add_node("settle",    node(self._settle))
+        graph.add_node("respond",   node(self._respond, self._arespond))
+        graph.add_node("template",  node(self._template))
+        graph.add_node("finish",    node(self._finish))
+
+        graph.add_edge(START, "translate")
+        if agent.pre_classifier is not None:
+            graph.add_node("pre_classify", node(self._pre_classify, self._apre_classify))
+            graph.add_node("local",        node(self._local))
+            graph.add_edge("translate", "pre_classify")
+            graph.add_conditional_edges("pre_classify", lambda s: "local" if s["tier1"]["settled"] else "sarcasm",
+                                        ["local", "sarcasm"])
+            graph.add_edge("local", END)
+        else:
+            graph.add_edge("translate", "sarcasm")
+        graph.add_conditional_edges("sarcasm", lambda s: "settle" if self.skips(s["rule"], "classifier") else "classify",
+                                    ["settle", "classify"])
+        def explain(state):
+            return "respond" if self.wants_llm_explanation(state["rule"], state["toxicity"]) else "template"
+
+        graph.add_conditional_edges("classify", explain, ["respond", "template"])
+        graph.add_conditional_edges("settle",   explain, ["respond", "template"])
+        graph.add_edge("respond",  "finish")
+        graph.add_edge("template", "finish")
+        graph.add_edge("finish",   END)
+        return graph.compile()
+
+    # node bodies: each returns the state fields it sets
+
+    def _translate(self, state):
+        translation = self.agent.translator.translate(state["content"])
+        return {"translation": translation, "working": translation["translated"]}
+
+    async def _atranslate(self, state):
+        translation = await self.agent.translator.atranslate(state["content"])
+        return {"translation": translation, "working": translation["translated"]}
+
+    def _pre_classify(self, state):
+        return {"tier1": self.agent.pre_classifier.classify(state["working"])}
+
+    async def _apre_classify(self, state):
+        return {"tier1": await self.agent.pre_classifier.aclassify(state["working"])}
+
+    def _local(self, state):
+        self.record("local")
+        return {"result": self.agent._build_local_result(state["content"], state["translation"], state["tier1"])}
+
+    def _sarcasm(self, state):
+        sarcasm_result = self.agent.sarcasm.detect(state["working"])
+        return {"sarcasm": sarcasm_result, "rule": self.match(sarcasm_result)}
+
+    async def _asarcasm(self, state):
+        sarcasm_result = await self.agent.sarcasm.adetect(state["working"])
+        return {"sarcasm": sarcasm_result, "rule": self.match(sarcasm_result)}
+
+    def _classify(self, state):
+        toxicity, sub_label = self.agent.classifier.classify(state["working"], state["sarcasm"])
+        return {"toxicity": toxicity, "sub_label": sub_label}
+
+    async def _aclassify(self, state):
+        toxicity, sub_label = await self.agent.classifier.aclassify(state["working"], state["sarcasm"])
+        return {"toxicity": toxicity, "sub_label": sub_label}
+
+    def _settle(self, state):
+        toxicity, sub_label = self.settle(state["rule"], state["sarcasm"])
+        return {"toxicity": toxicity, "sub_label": sub_label}
+
+    def _respond(self, state):
+        explanation = self.agent.responder.respond(state["working"], state["toxicity"], state["sub_label"], state["sarcasm"])
+        return {"explanation": explanation, "source": "llm"}
+
+    async def _arespond(self, state):
+        explanation = await self.agent.responder.arespond(state["working"], state["toxicity"], state["sub_label"],
+                                                          state["sarcasm"])
+        return {"explanation": explanation, "source": "llm"}
+
+    def _template(self, state):
+        return {"explanation": self.agent.responder.template(state["toxicity"], state["sub_label"], state["sarcasm"]),
+                "source": "template"}
+
+    def _finish(self, state):
+        self.record(state["rule"] or "full", state["toxicity"])
+        return {"result": self.agent._build_result(state["content"], state["translation"], state["sarcasm"],
+                                                   state["toxicity"], state["sub_label"], state["explanation"],
+                                                   explanation_source=state["source"])}
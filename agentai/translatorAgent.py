@@ -1,9 +1,20 @@
+from instrumentation import PARSES, timed_stage
 from rag_setup import ToxicityRAG
+from result_cache import make_key
+from .languageDetector import LanguageDetector
+import logging
+
+log = logging.getLogger(__name__)
 
 class TranslatorAgent:
-    def __init__(self, rag: ToxicityRAG):
+    PROMPT_VERSION = 1   # bump whenever _build_prompt changes (invalidates cached results)
+
+    def __init__(self, rag: ToxicityRAG, local_detection: bool = True):
         self.rag = rag
-        print("   Translator ready (Qwen3)")
+        # offline fast path: confidently-English text never reaches the LLM
+        self.detector = LanguageDetector() if local_detection else None
+        self.stats    = {"local": 0, "cache": 0, "llm": 0}
+        log.info("   Translator ready")
 
     def _build_prompt(self, content: str) -> str:
         return f"""You are a multilingual language detection and translation engine.
@@ -27,9 +38,9 @@ TRANSLATED: <translated text or original if already English>
 Input text:
 \"\"\"{content}\"\"\""""
 
-    def translate(self, content: str) -> dict:
-        prompt = self._build_prompt(content)
-        raw_response = self.rag.llm_sarcasm.invoke(prompt)
+    def _parse_response(self, raw_response, content: str) -> tuple[dict, bool]:
+        """Return (result, parsed). `parsed` is False when the reply was
+        malformed and the result is only the fallback."""
         raw = raw_response.content if hasattr(raw_response, "content") else raw_response
         raw = raw.strip()
 
@@ -43,15 +54,99 @@ Input text:
             "translated":        content,   # fallback to original
         }
 
+        seen = set()
         for line in raw.splitlines():
             line = line.strip()
             if line.upper().startswith("DETECTED_LANGUAGE:"):
                 result["detected_language"] = line.split(":", 1)[1].strip()
+                seen.add("DETECTED_LANGUAGE")
             elif line.upper().startswith("IS_ENGLISH:"):
                 result["is_english"] = line.split(":", 1)[1].strip().upper() == "YES"
+                seen.add("IS_ENGLISH")
             elif line.upper().startswith("TRANSLATED:"):
                 result["translated"] = line.split(":", 1)[1].strip()
+                seen.add("TRANSLATED")
+
+        result["path"] = "llm"
+
+        if log.isEnabledFor(logging.INFO):
+            preview = "(English — no translation needed)" if result["is_english"] else f"→ {result['translated'][:80]}"
+            log.info("     Translator: [%s] %s", result["detected_language"], preview)
+        parsed = seen == {"DETECTED_LANGUAGE", "IS_ENGLISH", "TRANSLATED"}
+        PARSES.inc(stage="translator", outcome="ok" if parsed else "fallback")
+        return result, parsed
+
+    def local_result(self, content: str) -> dict | None:
+        """Return a translate() result without any LLM call, or None."""
+        if self.detector is None:
+            return None
+        detected = self.detector.detect(content)
+        if not detected["confident"]:
+            return None
+        self.stats["local"] += 1
+        log.info("     Translator: [%s] (local fast path — no LLM call)", detected["language"])
+        return {
+            "detected_language": detected["language"],
+            "is_english":        True,
+            "translated":        content,
+            "path":              "local",
+        }
+
+    @staticmethod
+    def untranslated(content: str) -> dict:
+        """A translate() result for analyzing `content` as-is, when the
+        translation was skipped (language unknown)."""
+        return {
+            "detected_language": "unknown",
+            "is_english":        True,    # i.e. no translation to report
+            "translated":        content,
+            "path":              "skipped",
+        }
+
+    def _mark_cached(self, cached: dict | None) -> dict | None:
+        if cached is not None:
+            cached["path"] = "cache"
+            self.stats["cache"] += 1
+        return cached
+
+    def _cache_key(self, content: str) -> str:
+        # keyed on the RAW text — normalizing could change what gets translated
+        return make_key("translator", self.rag.model_for("translator"), self.PROMPT_VERSION, content)
+
+    @timed_stage("translator")
+    def translate(self, content: str) -> dict:
+        local = self.local_result(content)
+        if local is not None:
+            return local
+
+        key = self._cache_key(content)
+        cached = self._mark_cached(self.rag.cache.get("translator", key))
+        if cached is not None:
+            return cached
 
-        translation_preview = "(English — no translation needed)" if result["is_english"] else f"→ {result['translated'][:80]}"
-        print(f"     Translator: [{result['detected_language']}] {translation_preview}")
-        return result
\ No newline at end of file
+        self.stats["llm"] += 1
+        prompt = self._build_prompt(content)
+        raw_response = self.rag.llm_translator.invoke(prompt)
+        result, parsed = self._parse_response(raw_response, content)
+        if parsed:   # never cache a fallback — one bad completion would stick for the whole TTL
+            self.rag.cache.set("translator", key, result)
+        return result
+
+    @timed_stage("translator")
+    async def atranslate(self, content: str) -> dict:
+        local = self.local_result(content)
+        if local is not None:
+            return local
+
+        key = self._cache_key(content)
+        cached = self._mark_cached(await self.rag.cache.aget("translator", key))
+        if cached is not None:
+            return cached
+
+        self.stats["llm"] += 1
+        prompt = self._build_prompt(content)
+        raw_response = await self.rag.llm_translator.ainvoke(prompt)
+        result, parsed = self._parse_response(raw_response, content)
+        if parsed:
+            await self.rag.cache.aset("translator", key, result)
+        return result
@@ -0,0 +1,176 @@
+from agentai.pipelineRunner import PipelineRunner
+from concurrent.futures import ThreadPoolExecutor
+from llm_scheduler import BATCH, llm_priority
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Background analysis for the Streamlit app.
+#
+# A Streamlit script reruns top to bottom on every interaction, so the
+# pipeline must not run inside it. JobPool owns a small thread pool shared by
+# every session; the script only submits jobs and renders their state on
+# each rerun / poll.
+#
+#   message   one text, run through stream_detect_and_respond in a worker;
+#             `partial` is replaced (never mutated) after every stage event,
+#             so a reader always sees a consistent snapshot
+#   file      an uploaded CSV / JSONL; the texts fan out through a
+#             PipelineRunner on the worker's own event loop at BATCH
+#             priority, so messages typed meanwhile are served first
+#
+# Per-item state is QUEUED → RUNNING → DONE | FAILED; a file job reports
+# only counts while running (RUNNING applies to the whole file).
+# ---------------------------------------------------------------------------
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def apply_event(partial: dict, event: str, payload) -> dict:
+    """Fold one stream_detect_and_respond event into a new partial result."""
+    partial = dict(partial)
+    if event == "translation":
+        partial["detected_language"] = payload["detected_language"]
+        partial["translated"] = payload["translated"] if not payload["is_english"] else None
+    elif event == "sarcasm":
+        partial["is_sarcasm"] = payload["is_sarcasm"]
+        partial["meaning"]    = payload["meaning"]
+    elif event == "classification":
+        partial.update(payload)
+    elif event == "explanation":
+        partial["explanation"] = partial.get("explanation", "") + payload
+    elif event == "result":
+        partial = payload
+    return partial
+
+
+class Job:
+    """One submission: a typed message or every record of an uploaded file."""
+
+    def __init__(self, job_id: int, kind: str, name: str, texts: list[str], record_ids: list | None = None):
+        self.id          = job_id
+        self.kind        = kind          # "message" | "file"
+        self.name        = name
+        self.texts       = texts
+        self.record_ids  = record_ids or [None] * len(texts)
+        self.status      = [QUEUED] * len(texts)
+        self.results     = [None] * len(texts)
+        self.errors      = {}            # index -> error message
+        self.partial     = {"original": texts[0]} if kind == "message" else None
+        self.submitted   = time.time()
+        self.finished_at = None
+        self.cancelled   = False
+        self._lock       = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.texts)
+
+    @property
+    def completed(self) -> int:
+        return sum(status in (DONE, FAILED) for status in self.status)
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    @property
+    def progress(self) -> float:
+        return self.completed / self.total if self.total else 1.0
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def cancel(self) -> None:
+        """Stop admitting new records; the ones in flight still finish."""
+        self.cancelled = True
+
+    def to_jsonl(self) -> bytes:
+        """Finished records in batch.py's output format, errors included."""
+        lines = []
+        for index, record_id in enumerate(self.record_ids):
+            if index in self.errors:
+                line = {"index": index, "id": record_id, "error": self.errors[index]}
+            elif self.results[index] is not None:
+                line = {"index": index, "id": record_id, **self.results[index]}
+            else:
+                continue
+            lines.append(json.dumps(line, ensure_ascii=False))
+        return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+    def _set(self, index: int, result: dict | None = None, error: Exception | None = None) -> None:
+        with self._lock:
+            if error is not None:
+                self.status[index] = FAILED
+                self.errors[index] = f"{type(error).__name__}: {error}"
+            else:
+                self.status[index]  = DONE
+                self.results[index] = result
+
+
+class JobPool:
+    def __init__(self, agent, max_workers: int = 4, concurrency: int = 16):
+        """`max_workers` jobs run at once; a file job keeps up to
+        `concurrency` of its records in the pipeline."""
+        self.agent       = agent
+        self.concurrency = concurrency
+        self._executor   = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._ids        = itertools.count(1)
+
+    def submit_message(self, text: str) -> Job:
+        job = Job(next(self._ids), "message", text[:72], [text])
+        self._executor.submit(self._run_message, job)
+        return job
+
+    def submit_file(self, name: str, texts: list[str], record_ids: list | None = None) -> Job:
+        job = Job(next(self._ids), "file", name, texts, record_ids)
+        self._executor.submit(self._run_file, job)
+        return job
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_message(self, job: Job) -> None:
+        job.status[0] = RUNNING
+        try:
+            partial = job.partial
+            for event, payload in self.agent.stream_detect_and_respond(job.texts[0]):
+                partial = job.partial = apply_event(partial, event, payload)
+            job._set(0, result=partial)
+        except Exception as e:
+            log.exception("Analysis of job %d failed", job.id)
+            job._set(0, error=e)
+        finally:
+            job.finished_at = time.time()
+
+    def _run_file(self, job: Job) -> None:
+        job.status = [RUNNING] * job.total
+        try:
+            with llm_priority(BATCH):
+                asyncio.run(self._arun_file(job))
+        except Exception:
+            log.exception("File job %d (%s) failed", job.id, job.name)
+        finally:
+            with job._lock:   # records never admitted (cancel / crash) stay queued
+                job.status = [QUEUED if status == RUNNING else status for status in job.status]
+            job.finished_at = time.time()
+            log.info("File job %d (%s): %d/%d done, %d failed", job.id, job.name,
+                     job.completed, job.total, job.failed)
+
+    async def _arun_file(self, job: Job) -> None:
+        def items():
+            for index, text in enumerate(job.texts):
+                if job.cancelled:
+                    return
+                yield index, text
+
+        runner = PipelineRunner(self.agent, self.concurrency)
+        async for index, result, error in runner.iter_completed(items()):
+            job._set(index, result=result, error=error)
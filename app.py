@@ -1,5 +1,9 @@
 import streamlit as st
+from analysis_jobs import FAILED, JobPool
+from collections import deque
 from pathlib import Path
+import io
+import itertools
 
 # ── Page config (must be first Streamlit call) ────────────────────────────────
 st.set_page_config(
@@ -19,9 +23,15 @@ load_css("styles.css")
 # ── Try importing real agent; fall back to mock ───────────────────────────────
 try:
     from agentai.agent import ToxicityAgent
+    from batch import read_records
+    from instrumentation import serve_metrics, setup_logging
+    import os
     @st.cache_resource
     def get_agent():
-        return ToxicityAgent()
+        setup_logging()
+        if os.environ.get("TOXICITY_METRICS_PORT"):   # Prometheus scrape endpoint, started once
+            serve_metrics(int(os.environ["TOXICITY_METRICS_PORT"]))
+        return ToxicityAgent(result_store=True)
     agent = get_agent()
     MOCK = False
 except Exception:
@@ -53,12 +63,47 @@ def mock_analyze(text: str) -> dict:
         "translated":        None,
     }
 
-def analyze(text: str) -> dict:
-    return mock_analyze(text) if MOCK else agent.detect_and_respond(text)
+class MockAgent:
+    """The two entry points JobPool uses, answered by mock_analyze."""
+
+    def stream_detect_and_respond(self, content: str):
+        yield "result", mock_analyze(content)
+
+    async def adetect_and_respond(self, content: str) -> dict:
+        return mock_analyze(content)
+
+# ── Background jobs ───────────────────────────────────────────────────────────
+# Analysis runs in JobPool workers shared by all sessions; the script only
+# submits jobs and polls them (the jobs panel reruns every POLL_S seconds
+# while anything is in flight).
+
+MAX_HISTORY    = 500    # oldest results are dropped past this
+PAGE_SIZE      = 20
+FINISHED_FILES = 5      # finished uploads kept for download
+POLL_S         = 0.5
+
+@st.cache_resource
+def get_pool() -> JobPool:
+    return JobPool(MockAgent() if MOCK else agent)
+
+pool = get_pool()
 
 # ── HTML builders ─────────────────────────────────────────────────────────────
+# Builders also render partial results while a pipeline is streaming: a
+# stage whose field is not there yet shows a pending bubble.
+
+PENDING_HTML = '<div class="pending-bubble">WORKING…</div>'
 
 def build_classifier_section(result: dict) -> str:
+    if "classification" not in result:
+        return f"""
+    <div class="agent-section">
+        <span class="agent-tag tag-classifier">Classifier</span>
+        <br>
+        {PENDING_HTML}
+    </div>
+    """
+
     cls      = result["classification"]          # TOXIC | NEUTRAL | GOOD
     sub      = result.get("sub_label", "—")      # sub-label from agent
     css_cls  = cls.lower()                        # maps to CSS class
@@ -75,6 +120,15 @@ def build_classifier_section(result: dict) -> str:
     """
 
 def build_sarcasm_section(result: dict) -> str:
+    if "is_sarcasm" not in result:
+        return f"""
+    <div class="agent-section">
+        <span class="agent-tag tag-sarcasm">Sarcasm Detector</span>
+        <br>
+        {PENDING_HTML}
+    </div>
+    """
+
     sarcasm  = result["is_sarcasm"]              # sarcastic | ambiguous | no
     meaning  = result.get("meaning", "")
     css_cls  = sarcasm.lower()
@@ -83,6 +137,7 @@ def build_sarcasm_section(result: dict) -> str:
         "sarcastic":  "SARCASM DETECTED",
         "ambiguous":  "AMBIGUOUS TONE",
         "no":         "NO SARCASM",
+        "unchecked":  "SARCASM NOT CHECKED",
     }
     label = label_map.get(css_cls, "UNKNOWN")
 
@@ -104,7 +159,7 @@ def build_sarcasm_section(result: dict) -> str:
     """
 
 def build_responder_section(result: dict) -> str:
-    explanation = result.get("explanation", "No response generated.")
+    explanation = result.get("explanation", "…")   # "…" until the first streamed token
 
     return f"""
     <div class="agent-section">
@@ -138,9 +193,64 @@ def build_mother_container(result: dict) -> str:
     </div>
     """
 
+def history_entry(result: dict) -> dict:
+    # HTML is built once, when the result lands, instead of on every rerun
+    return {"result": result, "html": build_mother_container(result)}
+
+def finish_job(job) -> None:
+    if job.kind == "message":
+        if job.status[0] == FAILED:
+            st.session_state.notices.append(f"ANALYSIS FAILED — {job.errors[0]}")
+        else:
+            st.session_state.history.appendleft(history_entry(job.results[0]))
+        return
+    for result in job.results[-MAX_HISTORY:]:
+        if result is not None:
+            st.session_state.history.appendleft(history_entry(result))
+    st.session_state.files.appendleft(job)
+    st.session_state.page = 0
+
+@st.fragment(run_every=POLL_S)
+def render_jobs() -> None:
+    finished = [job for job in st.session_state.jobs if job.finished]
+    if finished:
+        for job in finished:
+            finish_job(job)
+        st.session_state.jobs = [job for job in st.session_state.jobs if not job.finished]
+        st.rerun()   # the whole page, so the history shows the new results
+
+    for job in st.session_state.jobs:
+        if job.kind == "message":
+            st.markdown(build_mother_container(job.partial), unsafe_allow_html=True)
+            continue
+        label = f"{job.name} — {job.completed}/{job.total} analyzed"
+        if job.failed:
+            label += f", {job.failed} failed"
+        st.progress(job.progress, text=label)
+        if not job.cancelled and st.button("CANCEL", key=f"cancel-{job.id}"):
+            job.cancel()
+
+def submit_upload(upload, text_field: str) -> None:
+    stream = io.TextIOWrapper(upload, encoding="utf-8", newline="")
+    texts, record_ids, skipped = [], [], 0
+    for _, record_id, text, error in read_records(stream, Path(upload.name).suffix, text_field):
+        if error is not None:
+            skipped += 1
+            continue
+        texts.append(text)
+        record_ids.append(record_id)
+    if skipped:
+        st.session_state.notices.append(f"{upload.name}: SKIPPED {skipped} UNREADABLE RECORDS")
+    if texts:
+        st.session_state.jobs.append(pool.submit_file(upload.name, texts, record_ids))
+
 # ── Session state ─────────────────────────────────────────────────────────────
 if "history" not in st.session_state:
-    st.session_state.history = []   # list of result dicts, newest first
+    st.session_state.history = deque(maxlen=MAX_HISTORY)   # history entries, newest first
+    st.session_state.jobs    = []                          # in flight, oldest first
+    st.session_state.files   = deque(maxlen=FINISHED_FILES)
+    st.session_state.notices = []
+    st.session_state.page    = 0
 
 # ── Layout ────────────────────────────────────────────────────────────────────
 st.markdown("""
@@ -168,18 +278,51 @@ with st.form(key="analyze_form", clear_on_submit=False):
     submitted = st.form_submit_button("ANALYZE")
 
 if submitted and user_input.strip():
-    with st.spinner("Running pipeline…"):
-        result = analyze(user_input.strip())
-    st.session_state.history.insert(0, result)
+    st.session_state.jobs.append(pool.submit_message(user_input.strip()))
+
+# Bulk upload (needs batch.py's record reader, i.e. the real agent)
+if not MOCK:
+    with st.expander("BULK UPLOAD (CSV / JSONL)"):
+        with st.form(key="upload_form", clear_on_submit=True):
+            upload     = st.file_uploader("FILE", type=["csv", "jsonl"])
+            text_field = st.text_input("TEXT FIELD", value="text")
+            uploaded   = st.form_submit_button("ANALYZE FILE")
+        if uploaded and upload is not None:
+            submit_upload(upload, text_field)
+        for job in st.session_state.files:
+            st.download_button(f"DOWNLOAD {job.name} ({job.completed}/{job.total})", job.to_jsonl(),
+                               file_name=f"{Path(job.name).stem}.results.jsonl", key=f"download-{job.id}")
 
 # Divider
 st.markdown('<div class="pixel-divider"></div>', unsafe_allow_html=True)
 
-# Render history
-if st.session_state.history:
-    for result in st.session_state.history:
-        st.markdown(build_mother_container(result), unsafe_allow_html=True)
-else:
+for notice in st.session_state.notices:
+    st.warning(notice)
+st.session_state.notices = []
+
+# Jobs in flight render (and re-render) above the history
+if st.session_state.jobs:
+    render_jobs()
+
+# Render history, one page at a time
+history = st.session_state.history
+if history:
+    pages = (len(history) - 1) // PAGE_SIZE + 1
+    page  = st.session_state.page = min(st.session_state.page, pages - 1)
+    start = page * PAGE_SIZE
+    for entry in itertools.islice(history, start, start + PAGE_SIZE):
+        st.markdown(entry["html"], unsafe_allow_html=True)
+
+    if pages > 1:
+        prev_col, label_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("◀ NEWER", disabled=page == 0):
+            st.session_state.page -= 1
+            st.rerun()
+        label_col.markdown(f'<div class="page-subtitle">PAGE {page + 1} / {pages}</div>', unsafe_allow_html=True)
+        if next_col.button("OLDER ▶", disabled=page == pages - 1):
+            st.session_state.page += 1
+            st.rerun()
+elif not st.session_state.jobs:
     st.markdown("""
     <div class="empty-state">
         <span class="empty-state-icon">[]</span>
@@ -188,4 +331,4 @@ else:
             ENTER TEXT ABOVE AND HIT ANALYZE
         </p>
     </div>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    """, unsafe_allow_html=True)
@@ -0,0 +1,391 @@
+from agentai.agent import EXPLAIN_POLICIES, PIPELINE_MODES, ToxicityAgent
+from agentai.pipelineRunner import PipelineRunner
+from instrumentation import REGISTRY, serve_metrics, setup_logging
+from llm_scheduler import BATCH, llm_priority
+from pathlib import Path
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+# Responsibility: stream a JSONL / CSV backlog through ToxicityAgent with
+# bounded concurrency, append each result to a JSONL file as soon as it
+# finishes, and checkpoint progress so a crashed run resumes without
+# re-paying for messages that were already analyzed.
+#
+# Memory stays flat: the input is read lazily, at most `concurrency`
+# messages are in flight, and intake pauses while more than `max_ahead`
+# finished messages are waiting behind a slow one, so the checkpoint's
+# set of finished indices above its low-water mark stays bounded.
+#
+# Pipeline failures (e.g. a Groq 429) go to <output>.errors.jsonl instead
+# of the results, and are re-attempted on the next run.
+
+CHECKPOINT_SUFFIX = ".ckpt"
+ERRORS_SUFFIX     = ".errors.jsonl"
+
+
+def iter_records(path: str, text_field: str = "text", id_field: str = "id"):
+    """Yield `(index, record_id, text, error)` for every input record, lazily."""
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from read_records(f, Path(path).suffix, text_field, id_field)
+
+
+def read_records(f, suffix: str, text_field: str = "text", id_field: str = "id"):
+    """`iter_records` over an open text stream (e.g. an uploaded file);
+    `suffix` ('.csv', anything else is JSONL) picks the format."""
+    if suffix.lower() == ".csv":
+        for i, row in enumerate(csv.DictReader(f)):
+            text = row.get(text_field)
+            if text is None:
+                yield i, row.get(id_field), None, f"missing field '{text_field}'"
+            else:
+                yield i, row.get(id_field), text, None
+        return
+
+    for i, line in enumerate(f):
+        line = line.strip()
+        if not line:
+            continue   # blank lines are not records
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield i, None, None, f"invalid JSON: {e}"
+            continue
+        if isinstance(record, str):
+            yield i, None, record, None
+        elif isinstance(record, dict) and isinstance(record.get(text_field), str):
+            yield i, record.get(id_field), record[text_field], None
+        else:
+            yield i, None, None, f"missing field '{text_field}'"
+
+
+class Checkpoint:
+    """Tracks which input indices are finished.
+
+    Every index below `watermark` is done; `done_above` holds the finished
+    indices past it (BatchJob keeps it under `max_ahead` by pausing intake).
+    `output_offset` is the byte length of the output file the state was
+    saved against.
+    """
+
+    def __init__(self, path: str):
+        self.path          = path
+        self.watermark     = 0
+        self.done_above    = set()
+        self.output_offset = 0
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        self.watermark     = state["watermark"]
+        self.done_above    = set(state["done_above"])
+        self.output_offset = state["output_offset"]
+        return True
+
+    def save(self, output_offset: int) -> None:
+        self.output_offset = output_offset
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "watermark":     self.watermark,
+                "done_above":    sorted(self.done_above),
+                "output_offset": output_offset,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def is_done(self, index: int) -> bool:
+        return index < self.watermark or index in self.done_above
+
+    def mark_done(self, index: int) -> None:
+        if index < self.watermark:
+            return
+        self.done_above.add(index)
+        while self.watermark in self.done_above:
+            self.done_above.remove(self.watermark)
+            self.watermark += 1
+
+
+class BatchJob:
+    def __init__(self, agent: ToxicityAgent, input_path: str, output_path: str,
+                 concurrency: int = 16, text_field: str = "text", id_field: str = "id",
+                 checkpoint_every: int = 50, fresh: bool = False, retry_errors: bool = True,
+                 max_ahead: int = 1000, deadline_s: float | None = None):
+        self.agent            = agent
+        self.input_path       = input_path
+        self.output_path      = output_path
+        self.errors_path      = output_path + ERRORS_SUFFIX
+        self.concurrency      = concurrency
+        self.text_field       = text_field
+        self.id_field         = id_field
+        self.checkpoint_every = checkpoint_every
+        self.fresh            = fresh
+        self.retry_errors     = retry_errors
+        self.max_ahead        = max_ahead
+        self.deadline_s       = deadline_s   # per message; degraded results are still written
+        self.checkpoint       = Checkpoint(output_path + CHECKPOINT_SUFFIX)
+        self.stats            = {"processed": 0, "skipped": 0, "errors": 0, "retried": 0, "degraded": 0,
+                                 "elapsed_s": 0.0}
+        self._out             = None
+        self._errors          = None
+        self._retry           = set()
+        self._failed          = []
+
+    def _recover_output(self) -> None:
+        """Re-sync the checkpoint with lines written after it was last saved.
+
+        Complete lines past `output_offset` are marked done (their LLM calls
+        were already paid for); a torn trailing line from a crash is cut off.
+        """
+        if not os.path.exists(self.output_path):
+            self.checkpoint.output_offset = 0
+            return
+        with open(self.output_path, "r+b") as f:
+            f.seek(self.checkpoint.output_offset)
+            good_end = self.checkpoint.output_offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    index = json.loads(line)["index"]
+                except (ValueError, KeyError):
+                    break
+                self.checkpoint.mark_done(index)
+                good_end += len(line)
+            f.truncate(good_end)
+        self.checkpoint.output_offset = good_end
+
+    def _load_retries(self) -> None:
+        """Collect indices whose pipeline failed on a previous run.
+
+        An index is dropped again if a later run already wrote its result
+        (the errors file is append-only until a run completes).
+        """
+        if not self.retry_errors or not os.path.exists(self.errors_path):
+            return
+        with open(self.errors_path, "rb") as f:
+            for line in f:
+                try:
+                    self._retry.add(json.loads(line)["index"])
+                except (ValueError, KeyError):
+                    continue
+        if self._retry and os.path.exists(self.output_path):
+            with open(self.output_path, "rb") as f:
+                for line in f:
+                    try:
+                        self._retry.discard(json.loads(line)["index"])
+                    except (ValueError, KeyError):
+                        continue
+
+    def _write(self, index: int, record_id, payload: dict) -> None:
+        line = {"index": index, "id": record_id, **payload}
+        self._out.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._out.flush()
+        self.checkpoint.mark_done(index)
+
+    def _write_error(self, index: int, record_id, error: Exception) -> None:
+        line = {"index": index, "id": record_id, "error": f"{type(error).__name__}: {error}"}
+        self._errors.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._errors.flush()
+        self._failed.append(line)
+        # finished for this run (so the watermark can move on); retried next run
+        self.checkpoint.mark_done(index)
+
+    def _pending_items(self):
+        for index, record_id, text, error in iter_records(self.input_path, self.text_field, self.id_field):
+            if index in self._retry:
+                self._retry.discard(index)
+                self.stats["retried"] += 1
+            elif self.checkpoint.is_done(index):
+                self.stats["skipped"] += 1
+                continue
+            if error is not None:
+                # unreadable records never reach the LLM; record them and move on
+                self._write(index, record_id, {"error": error})
+                self.stats["errors"] += 1
+            else:
+                yield (index, record_id), text
+
+    def _admit(self) -> bool:
+        return len(self.checkpoint.done_above) < self.max_ahead
+
+    async def arun(self) -> dict:
+        if self.fresh:
+            for path in (self.output_path, self.checkpoint.path, self.errors_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        elif self.checkpoint.load():
+            print(f"  Resuming from checkpoint ({self.checkpoint.watermark} records done)")
+        self._recover_output()
+        self._load_retries()
+        if self._retry:
+            print(f"  Retrying {len(self._retry)} records that failed on a previous run")
+
+        runner = PipelineRunner(self.agent, self.concurrency, deadline_s=self.deadline_s)
+        start  = time.perf_counter()
+
+        # bulk traffic yields to interactive calls sharing the LLM scheduler
+        with llm_priority(BATCH), \
+             open(self.output_path, "ab") as self._out, open(self.errors_path, "ab") as self._errors:
+            since_checkpoint = 0
+            items = runner.iter_completed(self._pending_items(), admit=self._admit)
+            async for (index, record_id), result, error in items:
+                if error is not None:
+                    self._write_error(index, record_id, error)
+                    self.stats["errors"] += 1
+                else:
+                    self._write(index, record_id, result)
+                    self.stats["processed"] += 1
+                    self.stats["degraded"] += result.get("deadline", {}).get("degraded", False)
+
+                since_checkpoint += 1
+                if since_checkpoint >= self.checkpoint_every:
+                    self.checkpoint.save(self._out.tell())
+                    since_checkpoint = 0
+
+            self.checkpoint.save(self._out.tell())
+
+        # the run completed: the errors file now only needs this run's failures
+        tmp = self.errors_path + ".tmp"
+        with open(tmp, "wb") as f:
+            for line in self._failed:
+                f.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+        os.replace(tmp, self.errors_path)
+
+        self.stats["elapsed_s"] = round(time.perf_counter() - start, 3)
+        return self.stats
+
+    def run(self) -> dict:
+        return asyncio.run(self.arun())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a JSONL / CSV file of messages in bulk.")
+    parser.add_argument("input", help="input .jsonl (objects or strings) or .csv file")
+    parser.add_argument("output", help="output .jsonl file; a <output>.ckpt checkpoint is kept next to it")
+    parser.add_argument("--concurrency", type=int, default=16, help="messages in flight at once (default: 16)")
+    parser.add_argument("--text-field", default="text", help="field holding the message text (default: text)")
+    parser.add_argument("--id-field", default="id", help="field copied to the output as `id` (default: id)")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="results between checkpoints (default: 50)")
+    parser.add_argument("--mode", choices=PIPELINE_MODES, default="staged", help="pipeline mode (default: staged); fused makes one LLM call per message "
+                             "and skips the local language fast path and --cascade")
+    parser.add_argument("--cascade", action="store_true", help="settle clear GOOD / TOXIC messages with the local pre-classifier (staged mode only)")
+    parser.add_argument("--speculative", action="store_true",
+                        help="classify at face value while sarcasm detection runs; re-classify only "
+                             "sarcastic / ambiguous texts (staged mode only)")
+    parser.add_argument("--explain", choices=EXPLAIN_POLICIES, default="always",
+                        help="when to generate LLM explanations: always, toxic (GOOD / NEUTRAL get a "
+                             "template) or on_demand (templates only) (default: always; staged mode only)")
+    parser.add_argument("--long-document", type=int, metavar="TOKENS",
+                        help="split messages longer than TOKENS (~4 chars each) into overlapping chunks, "
+                             "analyze them concurrently and report the worst label with its spans")
+    parser.add_argument("--early-exit", action="store_true",
+                        help="skip the classifier and responder when the sarcasm stage already says sincere "
+                             "and GOOD (staged mode only)")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="give each message SECONDS, dropping the responder, then translation, then "
+                             "sarcasm detection as needed (staged mode only)")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="reuse the result of a near-duplicate message analyzed before (embedding "
+                             "similarity; kept across runs in .cache/semantic)")
+    parser.add_argument("--no-retry-errors", dest="retry_errors", action="store_false",
+                        help="do not re-attempt records whose pipeline failed on a previous run")
+    parser.add_argument("--fresh", action="store_true", help="discard any previous output and checkpoint")
+    parser.add_argument("--metrics-file", help="write Prometheus metrics to this file when the run ends")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics during the run")
+    parser.add_argument("--store-results", action="store_true",
+                        help="append every result to the result store (data/results.sqlite3; query it with "
+                             "python result_store.py)")
+    parser.add_argument("--log-level", default="WARNING", help="pipeline log level, e.g. INFO for per-stage progress (default: WARNING)")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    agent = ToxicityAgent(mode=args.mode, cascade=args.cascade, explain=args.explain,
+                          speculative=args.speculative,
+                          long_document={"max_tokens": args.long_document} if args.long_document else None,
+                          semantic_cache=args.semantic_cache, early_exit=args.early_exit,
+                          result_store=args.store_results)
+    job = BatchJob(
+        agent, args.input, args.output,
+        concurrency=args.concurrency,
+        text_field=args.text_field,
+        id_field=args.id_field,
+        checkpoint_every=args.checkpoint_every,
+        fresh=args.fresh,
+        retry_errors=args.retry_errors,
+        deadline_s=args.deadline,
+    )
+    try:
+        stats = job.run()
+    finally:
+        if agent.semantic_cache is not None:
+            agent.semantic_cache.save()
+        if agent.result_store is not None:
+            agent.result_store.close()
+        if args.metrics_file:
+            REGISTRY.write(args.metrics_file)
+
+    rate = stats["processed"] / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+    print("\n" + "="*60)
+    print(f"  Processed: {stats['processed']}  Skipped (already done): {stats['skipped']}  "
+          f"Retried: {stats['retried']}  Errors: {stats['errors']}")
+    print(f"  Elapsed:   {stats['elapsed_s']}s  ({rate:.2f} msg/s)")
+    if args.deadline:
+        print(f"  Deadline:  {stats['degraded']} of {stats['processed']} results degraded to fit {args.deadline}s")
+    if agent.pre_classifier is not None:
+        cascade = agent.pre_classifier.summary()
+        settled = ", ".join(f"{n} {label}" for label, n in cascade["settled"].items())
+        print(f"  Cascade:   {cascade['skipped_llm_fraction']:.1%} settled locally "
+              f"({settled}, {cascade['escalated']} escalated)")
+    if agent.speculative:
+        spec = agent.speculation_summary()
+        print(f"  Speculation: {spec['hit_rate']:.1%} hits over {spec['runs']} messages, "
+              f"{spec['time_saved_s']}s LLM wait saved, {spec['wasted_classifier_calls']} classifier calls re-run")
+    if agent.graph is not None:
+        graph = agent.graph.summary()
+        saved = ", ".join(f"{rule} {n}" for rule, n in graph["calls_saved"].items())
+        print(f"  Early exit: {graph['early_exit_rate']:.1%} of {graph['results']} results "
+              f"(LLM calls saved: {saved or 'none'})")
+    if agent.semantic_cache is not None:
+        semantic = agent.semantic_cache.stats()
+        false_reuse = f"{semantic['false_reuse_rate']:.1%}" if semantic["false_reuse_rate"] is not None else "n/a"
+        print(f"  Semantic:  {semantic['hit_rate']:.1%} near-duplicate hits, false reuse {false_reuse} "
+              f"({semantic['verified']} verified), {semantic['entries']} entries")
+    sched = agent.rag.scheduler.stats()
+    print(f"  Scheduler: {sched['retries']} retries ({sched['rate_limited']} rate-limited), "
+          f"mean wait {sched['mean_wait_s']['batch']}s, max queue {sched['max_queue_depth']}")
+    routing = agent.rag.routing_stats()
+    if routing:
+        print(f"  Routing:   {routing['hedges']} hedged ({routing['hedge_wins']} won by the hedge), "
+              f"{routing['failovers']} failovers")
+        for name, backend in routing["backends"].items():
+            calls = sum(s["calls"] for s in backend["stages"].values())
+            state = "up" if backend["available"] else "DOWN"
+            print(f"             {name}: {calls} calls, {state}")
+    print(f"  Output:    {args.output}")
+    if agent.result_store is not None:
+        store = agent.result_store.stats()
+        print(f"  Stored:    {store['written']} results ({store['failed']} failed) in {agent.result_store.path}")
+    if args.metrics_file:
+        print(f"  Metrics:   {args.metrics_file}")
+    if stats["errors"]:
+        print(f"  Failures:  {job.errors_path} (rerun the same command to retry them)")
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n  Interrupted — rerun the same command to resume from the checkpoint.")
+        sys.exit(130)
@@ -0,0 +1,84 @@
+from agentai.agent import ToxicityAgent
+from agentai.pipelineRunner import PipelineRunner
+from benchmarks.bench_fused import SAMPLES, instrument
+import argparse
+import contextlib
+import io
+import json
+import time
+
+# One-at-a-time vs micro-batched sarcasm / classifier calls, both through
+# PipelineRunner at the same concurrency (real LLM calls — this costs
+# tokens). Explanations are left on_demand so only the batched stages run.
+#
+#   python -m benchmarks.bench_batching --copies 8 --max-batch 16 --max-wait-ms 20
+
+
+def run(samples: list[str], concurrency: int, micro_batch: dict | None) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = ToxicityAgent(cache=False, explain="on_demand", micro_batch=micro_batch)
+    recorders = instrument(agent)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = PipelineRunner(agent, concurrency).run_all(samples)
+    elapsed = time.perf_counter() - start
+
+    n = len(samples)
+    summary = {
+        "batched":                bool(micro_batch),
+        "messages":               n,
+        "elapsed_s":              round(elapsed, 3),
+        "msgs_per_s":             round(n / elapsed, 2),
+        "llm_calls_per_msg":      round(sum(r.calls for r in recorders) / n, 2),
+        "prompt_tokens_per_msg":  round(sum(r.prompt_tokens for r in recorders) / n, 1),
+        "completion_tokens_per_msg": round(sum(r.completion_tokens for r in recorders) / n, 1),
+        "tokens_estimated":       any(r.estimated for r in recorders),
+        "labels":                 [r["classification"] for r in results],
+    }
+    if micro_batch:
+        summary["sarcasm_batcher"]    = agent.sarcasm.batcher.summary()
+        summary["classifier_batcher"] = agent.classifier.batcher.summary()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-batched vs one-at-a-time stage calls.")
+    parser.add_argument("--input", help="JSONL file with {\"text\": ...} objects (default: built-in samples)")
+    parser.add_argument("--copies", type=int, default=4, help="how many times to repeat the samples (default: 4)")
+    parser.add_argument("--concurrency", type=int, default=16, help="pipelines in flight (default: 16)")
+    parser.add_argument("--max-batch", type=int, default=16, help="items per batched call (default: 16)")
+    parser.add_argument("--max-wait-ms", type=float, default=20.0, help="flush deadline (default: 20)")
+    parser.add_argument("--json", action="store_true", help="print raw JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    samples = SAMPLES
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            samples = [json.loads(line)["text"] for line in f if line.strip()]
+    # distinct texts, so nothing is shared between copies
+    samples = [f"{text} ({i})" if i else text for i in range(args.copies) for text in samples]
+
+    single  = run(samples, args.concurrency, None)
+    batched = run(samples, args.concurrency, {"max_batch": args.max_batch, "max_wait_ms": args.max_wait_ms})
+
+    if args.json:
+        print(json.dumps([single, batched], indent=2))
+        return
+
+    print("\n" + "="*60)
+    print(f"  {'':28}{'single':>14}{'batched':>14}")
+    for key in ("elapsed_s", "msgs_per_s", "llm_calls_per_msg", "prompt_tokens_per_msg", "completion_tokens_per_msg"):
+        print(f"  {key:28}{single[key]:>14}{batched[key]:>14}")
+    agree = sum(a == b for a, b in zip(single["labels"], batched["labels"]))
+    print(f"  {'label agreement':28}{agree}/{len(samples):<}")
+    for stage in ("sarcasm_batcher", "classifier_batcher"):
+        s = batched[stage]
+        print(f"  {stage:28}{s['batches']} batches, mean size {s['mean_batch_size']}, {s['fallbacks']} fallbacks")
+    if single["tokens_estimated"] or batched["tokens_estimated"]:
+        print("  (token counts estimated at ~4 chars/token — provider did not report usage)")
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
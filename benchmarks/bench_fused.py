@@ -0,0 +1,146 @@
+from agentai.agent import ToxicityAgent
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+
+# Compares the staged 4-call pipeline against the fused single-call mode
+# on the configured provider (real LLM calls — this costs tokens).
+#
+#   python -m benchmarks.bench_fused --repeat 3
+#   python -m benchmarks.bench_fused --input samples.jsonl
+
+SAMPLES = [
+    "Thanks so much for the help yesterday, you really saved my project!",
+    "The meeting has been moved to 3pm on Thursday.",
+    "Oh great, another Monday. Just what I needed.",
+    "You are a worthless idiot and everyone here hates you.",
+    "Ang galing mo talaga, salamat sa tulong!",
+    "No estoy de acuerdo con tu opinión, pero la respeto.",
+    "Wow, nice job breaking the build again, genius.",
+    "lol ok",
+]
+
+
+class UsageRecorder:
+    """Proxy around a LangChain LLM that counts calls and tokens.
+
+    Chat models (Groq) report exact `usage_metadata`; plain-string LLMs
+    (Ollama) are estimated at ~4 characters per token.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.reset()
+
+    def reset(self):
+        self.calls             = 0
+        self.prompt_tokens     = 0
+        self.completion_tokens = 0
+        self.estimated         = False
+
+    def _record(self, prompt, response):
+        self.calls += 1
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.prompt_tokens     += usage.get("input_tokens", 0)
+            self.completion_tokens += usage.get("output_tokens", 0)
+        else:
+            text = response.content if hasattr(response, "content") else str(response)
+            self.prompt_tokens     += len(str(prompt)) // 4
+            self.completion_tokens += len(text) // 4
+            self.estimated = True
+        return response
+
+    def invoke(self, prompt, *args, **kwargs):
+        return self._record(prompt, self.llm.invoke(prompt, *args, **kwargs))
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        return self._record(prompt, await self.llm.ainvoke(prompt, *args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+def instrument(agent: ToxicityAgent) -> list:
+    """Wrap every LLM client the agent's ToxicityRAG creates."""
+    recorders = []
+    connect = agent.rag._connect_llm
+
+    def _connect_and_record(*args, **kwargs):
+        recorder = UsageRecorder(connect(*args, **kwargs))
+        recorders.append(recorder)
+        return recorder
+
+    agent.rag._connect_llm = _connect_and_record
+    return recorders
+
+
+def run_mode(mode: str, samples: list[str], repeat: int) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        # no stage cache: repeats would measure cache hits, not LLM cost
+        agent = ToxicityAgent(mode=mode, cache=False)
+    recorders = instrument(agent)
+
+    latencies = []
+    results   = []
+    for _ in range(repeat):
+        for text in samples:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append(agent.detect_and_respond(text))
+            latencies.append(time.perf_counter() - start)
+
+    n = len(latencies)
+    calls      = sum(r.calls for r in recorders)
+    prompt     = sum(r.prompt_tokens for r in recorders)
+    completion = sum(r.completion_tokens for r in recorders)
+    return {
+        "mode":                   mode,
+        "messages":               n,
+        "latency_mean_s":         round(statistics.mean(latencies), 3),
+        "latency_p50_s":          round(statistics.median(latencies), 3),
+        "latency_max_s":          round(max(latencies), 3),
+        "llm_calls_per_msg":      round(calls / n, 2),
+        "prompt_tokens_per_msg":  round(prompt / n, 1),
+        "completion_tokens_per_msg": round(completion / n, 1),
+        "tokens_estimated":       any(r.estimated for r in recorders),
+        "labels":                 [r["classification"] for r in results[:len(samples)]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Staged vs fused pipeline: latency and token cost.")
+    parser.add_argument("--input", help="JSONL file with {\"text\": ...} objects (default: built-in samples)")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the samples per mode")
+    parser.add_argument("--json", action="store_true", help="print raw JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    samples = SAMPLES
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            samples = [json.loads(line)["text"] for line in f if line.strip()]
+
+    staged = run_mode("staged", samples, args.repeat)
+    fused  = run_mode("fused", samples, args.repeat)
+
+    if args.json:
+        print(json.dumps([staged, fused], indent=2))
+        return
+
+    print("\n" + "="*60)
+    print(f"  {'':28}{'staged':>14}{'fused':>14}")
+    for key in ("latency_mean_s", "latency_p50_s", "latency_max_s", "llm_calls_per_msg",
+                "prompt_tokens_per_msg", "completion_tokens_per_msg"):
+        print(f"  {key:28}{staged[key]:>14}{fused[key]:>14}")
+    agree = sum(a == b for a, b in zip(staged["labels"], fused["labels"]))
+    print(f"  {'label agreement':28}{agree}/{len(samples):<}")
+    if staged["tokens_estimated"] or fused["tokens_estimated"]:
+        print("  (token counts estimated at ~4 chars/token — provider did not report usage)")
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
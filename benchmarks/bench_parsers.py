@@ -0,0 +1,93 @@
+from agentai.classifierAgent import ClassifierAgent
+from agentai.sarcasmDetector import SarcasmDetector
+from agentai.translatorAgent import TranslatorAgent
+from instrumentation import REGISTRY
+from langchain_core.messages import AIMessage
+from rag_setup import ToxicityRAG
+import argparse
+import json
+import timeit
+
+# Micro-benchmarks for the reply parsers (_parse_response) of the
+# classifier, sarcasm detector and translator — the CPU work the pipeline
+# does per LLM call. Each case is timed on clean replies, replies wrapped in
+# a <think> block (reasoning models), and malformed replies that fall back.
+#
+#   python -m benchmarks.bench_parsers --number 20000
+#
+# Logging and metrics are left at their defaults (INFO off, registry on), as
+# in a batch run.
+
+THINK = "<think>\nThe user wants a label. The text looks friendly, so the label is GOOD.\n</think>\n"
+CONTENT = "thanks for fixing the build, you saved my whole afternoon"
+
+CASES = {
+    "classifier": {
+        "clean":     "GOOD - SUPPORTIVE",
+        "think":     THINK + "GOOD - SUPPORTIVE",
+        "chatty":    "Sure! Here is the label.\nLabel: the text is good.\n\nGOOD - SUPPORTIVE",
+        "fallback":  "I think this message is probably good overall.",
+    },
+    "sarcasm": {
+        "clean":     f"IS_SARCASTIC: NO\nTOXICITY: GOOD\nTRUE_MEANING: {CONTENT}",
+        "think":     THINK + f"IS_SARCASTIC: NO\nTOXICITY: GOOD\nTRUE_MEANING: {CONTENT}",
+        "fallback":  "No sarcasm here, the writer is grateful.",
+    },
+    "translator": {
+        "clean":     f"DETECTED_LANGUAGE: English\nIS_ENGLISH: YES\nTRANSLATED: {CONTENT}",
+        "think":     THINK + f"DETECTED_LANGUAGE: English\nIS_ENGLISH: YES\nTRANSLATED: {CONTENT}",
+        "fallback":  "This is English.",
+    },
+}
+
+
+def parsers() -> dict:
+    rag = ToxicityRAG(cache=False)
+    classifier, sarcasm, translator = ClassifierAgent(rag), SarcasmDetector(rag), TranslatorAgent(rag)
+    return {
+        "classifier": lambda reply: classifier._parse_response(reply),
+        "sarcasm":    lambda reply: sarcasm._parse_response(reply, CONTENT),
+        "translator": lambda reply: translator._parse_response(reply, CONTENT),
+    }
+
+
+def run(number: int, repeat: int) -> list[dict]:
+    results = []
+    for stage, parse in parsers().items():
+        for case, text in CASES[stage].items():
+            reply = AIMessage(content=text)
+            best = min(timeit.repeat(lambda: parse(reply), number=number, repeat=repeat))
+            results.append({
+                "parser": stage,
+                "case":   case,
+                "parsed": parse(reply)[1],
+                "us_per_call": round(best / number * 1e6, 2),
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark the LLM reply parsers.")
+    parser.add_argument("--number", type=int, default=10000, help="calls per timing (default: 10000)")
+    parser.add_argument("--repeat", type=int, default=5, help="timings per case; the best is reported (default: 5)")
+    parser.add_argument("--no-metrics", action="store_true", help="disable the metrics registry (PARSES counter)")
+    parser.add_argument("--json", action="store_true", help="print raw JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    if args.no_metrics:
+        REGISTRY.enabled = False
+    results = run(args.number, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("\n" + "="*52)
+    print(f"  {'parser':12}{'case':12}{'parsed':>10}{'µs/call':>16}")
+    for r in results:
+        print(f"  {r['parser']:12}{r['case']:12}{str(r['parsed']):>10}{r['us_per_call']:>16}")
+    print("="*52 + "\n")
+
+
+if __name__ == "__main__":
+    main()
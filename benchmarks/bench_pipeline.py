@@ -0,0 +1,158 @@
+from agentai.agent import ToxicityAgent
+from agentai.pipelineRunner import PipelineRunner
+from benchmarks.bench_fused import SAMPLES
+from benchmarks.fake_llm import DEFAULT_LATENCY, FakeLLM, install
+from instrumentation import REGISTRY, timed_stage
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import statistics
+import time
+import tracemalloc
+
+# End-to-end pipeline throughput against the offline FakeLLM — no provider,
+# no tokens spent, same numbers every run (latencies are seeded per prompt).
+#
+#   sequential  detect_and_respond, one message at a time
+#   concurrent  PipelineRunner (async) with --concurrency pipelines in flight
+#   batched     concurrent + micro-batched sarcasm / classifier calls
+#
+#   python -m benchmarks.bench_pipeline --messages 200 --time-scale 0.1
+#   python -m benchmarks.bench_pipeline --latency classifier=constant:0.05 --json
+#
+# Per-stage p50 / p99 are exact (raw samples, not histogram buckets); memory
+# is tracemalloc's peak of Python allocations during the run, which slows
+# CPU-bound work a little (--no-memory turns it off).
+
+MODES = ("sequential", "concurrent", "batched")
+STAGE_METHODS = {
+    "translator": ("translator", ("translate", "atranslate")),
+    "sarcasm":    ("sarcasm",    ("detect", "adetect")),
+    "classifier": ("classifier", ("classify", "aclassify")),
+    "responder":  ("responder",  ("respond", "arespond")),
+}
+
+
+def messages(count: int) -> list[str]:
+    """`count` distinct messages cycling through SAMPLES, so nothing is a cache hit."""
+    return [f"{SAMPLES[i % len(SAMPLES)]} (#{i})" for i in range(count)]
+
+
+def quantile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def record_stages(agent: ToxicityAgent) -> dict:
+    """Wrap the stage methods on `agent` so each call's wall time is kept."""
+    samples = {stage: [] for stage in STAGE_METHODS}
+    for stage, (attr, methods) in STAGE_METHODS.items():
+        component = getattr(agent, attr)
+        for name in methods:
+            setattr(component, name, timed_stage(stage, samples[stage].append)(getattr(component, name)))
+    return samples
+
+
+def run(mode: str, texts: list[str], fake: FakeLLM, concurrency: int, max_batch: int,
+        max_wait_ms: float, memory: bool) -> dict:
+    micro_batch = {"max_batch": max_batch, "max_wait_ms": max_wait_ms} if mode == "batched" else None
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = ToxicityAgent(cache=False, micro_batch=micro_batch)
+    install(agent, fake)
+    samples = record_stages(agent)
+    calls_before = sum(fake.calls.values())
+
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "sequential":
+        results = [agent.detect_and_respond(text) for text in texts]
+    else:
+        results = asyncio.run(PipelineRunner(agent, concurrency).run_many(texts))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    if memory:
+        tracemalloc.stop()
+
+    n = len(texts)
+    summary = {
+        "mode":          mode,
+        "messages":      n,
+        "elapsed_s":     round(elapsed, 3),
+        "msgs_per_s":    round(n / elapsed, 2),
+        "llm_calls_per_msg": round((sum(fake.calls.values()) - calls_before) / n, 2),
+        "peak_alloc_mb": round(peak / 2**20, 2) if peak is not None else None,
+        "stages": {
+            stage: {
+                "calls":  len(values),
+                "p50_ms": round(quantile(values, 0.5) * 1000, 1),
+                "p99_ms": round(quantile(values, 0.99) * 1000, 1),
+            }
+            for stage, values in samples.items() if values
+        },
+        "labels": [r["classification"] for r in results],
+    }
+    if micro_batch:
+        summary["batchers"] = {"sarcasm": agent.sarcasm.batcher.summary(),
+                               "classifier": agent.classifier.batcher.summary()}
+    return summary
+
+
+def parse_stage_latency(values: list[str]) -> dict:
+    latency = {}
+    for value in values:
+        stage, _, spec = value.partition("=")
+        if stage not in DEFAULT_LATENCY or not spec:
+            raise SystemExit(f"--latency expects STAGE=SPEC with STAGE in {tuple(DEFAULT_LATENCY)}, got '{value}'")
+        latency[stage] = spec
+    return latency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline pipeline throughput against a deterministic fake LLM.")
+    parser.add_argument("--messages", type=int, default=64, help="messages per mode (default: 64)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="modes to run (default: all)")
+    parser.add_argument("--concurrency", type=int, default=16, help="pipelines in flight, async modes (default: 16)")
+    parser.add_argument("--max-batch", type=int, default=16, help="micro-batch size (default: 16)")
+    parser.add_argument("--max-wait-ms", type=float, default=20.0, help="micro-batch flush deadline (default: 20)")
+    parser.add_argument("--latency", action="append", default=[], metavar="STAGE=SPEC",
+                        help="per-stage latency, e.g. classifier=constant:0.05, sarcasm=lognormal:0.2,0.5 "
+                             "or responder=normal:0.6,0.1 (seconds; default: small-model stages faster)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply every simulated latency (default: 1.0)")
+    parser.add_argument("--seed", type=int, default=0, help="latency seed (default: 0)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip tracemalloc")
+    parser.add_argument("--json", action="store_true", help="print raw JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    REGISTRY.enabled = False   # measure the pipeline, not the metrics it would export
+    texts = messages(args.messages)
+    results = [
+        run(mode, texts, FakeLLM(parse_stage_latency(args.latency), args.seed, args.time_scale),
+            args.concurrency, args.max_batch, args.max_wait_ms, args.memory)
+        for mode in args.modes
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("\n" + "="*72)
+    print(f"  {'':22}" + "".join(f"{r['mode']:>16}" for r in results))
+    for key in ("elapsed_s", "msgs_per_s", "llm_calls_per_msg", "peak_alloc_mb"):
+        print(f"  {key:22}" + "".join(f"{str(r[key]):>16}" for r in results))
+    for stage in STAGE_METHODS:
+        cells = [r["stages"].get(stage) for r in results]
+        if any(cells):
+            print(f"  {stage + ' p50/p99 ms':22}" + "".join(
+                f"{(str(c['p50_ms']) + '/' + str(c['p99_ms'])) if c else '—':>16}" for c in cells))
+    labels = [r["labels"] for r in results]
+    if len(labels) > 1:
+        agree = statistics.mean(all(run[i] == labels[0][i] for run in labels) for i in range(len(texts)))
+        print(f"  {'label agreement':22}{agree:>16.0%}")
+    print("="*72 + "\n")
+
+
+if __name__ == "__main__":
+    main()
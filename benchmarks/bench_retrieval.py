@@ -0,0 +1,73 @@
+from example_index import ExampleIndex
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+# Measures the few-shot retrieval path without the embedding model: load
+# time of the memory-mapped index and per-query search latency (FAISS
+# search + metadata lookup) over a synthetic corpus of the requested size.
+# The query embedding itself (~5 ms for MiniLM on CPU) is not included.
+#
+#   python -m benchmarks.bench_retrieval --size 100000 --k 4
+
+
+def run(size: int, dim: int, k: int, queries: int) -> dict:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((size, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    examples = [{"text": f"example {i}", "label": "NEUTRAL", "sub_label": "SYNTHETIC"} for i in range(size)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        ExampleIndex.build(directory, examples, vectors, "synthetic")
+
+        start = time.perf_counter()
+        index = ExampleIndex.load(directory)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        for q in vectors[rng.integers(0, size, queries)]:
+            start = time.perf_counter()
+            index.search(q, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        index_mb = os.path.getsize(os.path.join(directory, "examples.faiss")) / 2**20
+
+    latencies.sort()
+    return {
+        "size":          size,
+        "dim":           dim,
+        "k":             k,
+        "index_mb":      round(index_mb, 1),
+        "load_ms":       round(load_ms, 2),
+        "search_p50_ms": round(statistics.median(latencies), 3),
+        "search_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark memory-mapped few-shot retrieval.")
+    parser.add_argument("--size", type=int, nargs="+", default=[64, 10_000, 100_000], help="corpus sizes")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension (MiniLM: 384)")
+    parser.add_argument("--k", type=int, default=4, help="examples per query (default: 4)")
+    parser.add_argument("--queries", type=int, default=500, help="queries per size (default: 500)")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args(argv)
+
+    results = [run(size, args.dim, args.k, args.queries) for size in args.size]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("\n" + "="*60)
+    print(f"  {'size':>10}{'index MB':>10}{'load ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"  {r['size']:>10}{r['index_mb']:>10}{r['load_ms']:>10}{r['search_p50_ms']:>10}{r['search_p99_ms']:>10}")
+    print("="*60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold-start cost of the entry points, each measured in a fresh interpreter
+# (so nothing is already in sys.modules), plus the heaviest imports behind
+# it from `python -X importtime`. Exits non-zero when the median import of
+# any target exceeds --budget-ms, so CI can hold the line.
+#
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --budget-ms 300 --runs 7 --json
+#
+# Provider SDKs (langchain_groq / langchain_ollama) and the embedding model
+# are not part of the import: they load on first use or in warmup().
+
+ROOT    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ("agentai", "agentai.agent", "batch", "service")
+PROBE   = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+LAZY    = ("langchain_ollama", "langchain_groq", "sentence_transformers", "torch", "faiss")
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_seconds(module: str, runs: int) -> list[float]:
+    return [float(_python("-c", PROBE.format(module=module)).stdout) for _ in range(runs)]
+
+
+def heaviest_imports(module: str, top: int) -> list[tuple[str, float]]:
+    """(module, cumulative ms) of the target's slowest direct imports."""
+    # -X importtime prints each import after its children, indented two
+    # spaces per level; interpreter startup (site, encodings…) comes first
+    subtree = []
+    for line in _python("-X", "importtime", "-c", f"import {module}").stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = len(name) - len(name.lstrip()) - 1
+        if depth == 0:
+            if name.strip() == module:
+                break
+            subtree = []   # some other top-level import (interpreter startup)
+        else:
+            subtree.append((name.strip(), depth, int(cumulative) / 1000))
+    children = [(name, ms) for name, depth, ms in subtree if depth == 2]
+    return sorted(children, key=lambda row: -row[1])[:top]
+
+
+def loaded_lazily(module: str) -> dict:
+    probe = f"import sys, {module}; print(','.join(m for m in {LAZY!r} if m in sys.modules))"
+    eager = set(filter(None, _python("-c", probe).stdout.strip().split(",")))
+    return {name: name not in eager for name in LAZY}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time against a budget.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target (default: 5)")
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="max median import time per target (default: 300)")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports listed per target (default: 5)")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), help=f"modules to import (default: {' '.join(TARGETS)})")
+    parser.add_argument("--json", action="store_true", help="print raw JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.targets:
+        samples = import_seconds(module, args.runs)
+        median_ms = statistics.median(samples) * 1000
+        results.append({
+            "module":    module,
+            "median_ms": round(median_ms, 1),
+            "max_ms":    round(max(samples) * 1000, 1),
+            "in_budget": median_ms <= args.budget_ms,
+            "heaviest":  [{"module": name, "ms": round(ms, 1)} for name, ms in heaviest_imports(module, args.top)],
+            "lazy":      loaded_lazily(module),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("\n" + "="*60)
+        print(f"  Import budget: {args.budget_ms:.0f} ms (median of {args.runs} cold starts)")
+        for r in results:
+            verdict = "ok" if r["in_budget"] else "OVER BUDGET"
+            print(f"\n  {r['module']:16} {r['median_ms']:>8.1f} ms  (max {r['max_ms']:.1f})  {verdict}")
+            for row in r["heaviest"]:
+                print(f"      {row['module']:28} {row['ms']:>8.1f} ms")
+            eager = [name for name, lazy in r["lazy"].items() if not lazy]
+            if eager:
+                print(f"      loaded eagerly: {', '.join(eager)}")
+        print("="*60 + "\n")
+    sys.exit(0 if all(r["in_budget"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
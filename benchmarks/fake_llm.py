@@ -0,0 +1,187 @@
+from langchain_core.messages import AIMessage, AIMessageChunk
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+
+# A deterministic stand-in for the provider, so pipeline throughput can be
+# measured offline and compared run to run.
+#
+#   fake = FakeLLM(latency={"classifier": "lognormal:0.15,0.4"}, seed=0)
+#   install(agent, fake)      # every stage client of agent.rag now talks to it
+#
+# Replies are canned per stage, in the format each agent parses, and chosen
+# from the text itself (toxic words → TOXIC, ironic phrases → sarcastic,
+# Spanish / Tagalog → translated), so the pipeline takes realistic paths.
+# Latency is drawn from a per-stage distribution seeded by (seed, prompt):
+# the same prompt always costs the same time, whatever order calls run in.
+# Batched prompts cost the single-item latency scaled by BATCH_ITEM_COST per
+# extra item.
+
+DEFAULT_LATENCY = {
+    "translator": "lognormal:0.5,0.35",
+    "sarcasm":    "lognormal:0.15,0.35",   # small model, few tokens
+    "classifier": "lognormal:0.12,0.35",
+    "responder":  "lognormal:0.6,0.35",
+    "fused":      "lognormal:0.9,0.35",
+}
+BATCH_ITEM_COST = 0.15
+
+TOXIC_WORDS    = re.compile(r"\b(idiot|hate[sd]?|worthless|stupid|moron|shut up)\b", re.IGNORECASE)
+IRONY          = re.compile(r"\b(oh great|just what i needed|nice job|genius|yeah right|so fun)\b", re.IGNORECASE)
+GOOD_WORDS     = re.compile(r"\b(thanks?|thank you|great work|saved|appreciate|salamat|galing|gracias)\b", re.IGNORECASE)
+NON_ENGLISH    = re.compile(r"\b(ang|mo|talaga|salamat|estoy|acuerdo|pero|opinión|gracias|que)\b", re.IGNORECASE)
+TEXT_BLOCK     = re.compile(r'"""(.*?)"""', re.DOTALL)
+NUMBERED_BLOCK = re.compile(r'^\s*\[\d+\] """(.*?)"""', re.MULTILINE | re.DOTALL)
+
+
+def parse_latency(spec: str):
+    """`constant:S`, `normal:MEAN,SD` or `lognormal:MEDIAN,SIGMA` (seconds)
+    → a function of a random.Random returning a latency."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "constant" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"bad latency spec '{spec}' (constant:S | normal:MEAN,SD | lognormal:MEDIAN,SIGMA)")
+
+
+def stage_of(prompt: str) -> str:
+    if "Analyze each numbered text" in prompt:
+        return "sarcasm_batch"
+    if "Classify each numbered text" in prompt:
+        return "classifier_batch"
+    if "content moderation engine. Analyze the text in one pass" in prompt:
+        return "fused"
+    if "DETECTED_LANGUAGE" in prompt:
+        return "translator"
+    if "IS_SARCASTIC" in prompt:
+        return "sarcasm"
+    if "Explanation:" in prompt:
+        return "responder"
+    return "classifier"
+
+
+def _label(text: str) -> tuple[str, str]:
+    if TOXIC_WORDS.search(text):
+        return "TOXIC", "PERSONAL ATTACKS"
+    if GOOD_WORDS.search(text):
+        return "GOOD", "SUPPORTIVE"
+    return "NEUTRAL", "FACTUAL STATEMENTS"
+
+
+def reply_for(stage: str, text: str) -> str:
+    """The canned reply a well-behaved model would give for `text`."""
+    label, sub_label = _label(text)
+    sarcastic = bool(IRONY.search(text))
+    foreign   = bool(NON_ENGLISH.search(text))
+    if stage == "translator":
+        if foreign:
+            return f"DETECTED_LANGUAGE: Spanish\nIS_ENGLISH: NO\nTRANSLATED: (in English) {text}"
+        return f"DETECTED_LANGUAGE: English\nIS_ENGLISH: YES\nTRANSLATED: {text}"
+    if stage == "sarcasm":
+        meaning = f"The writer is annoyed: {text}" if sarcastic else text
+        return (f"IS_SARCASTIC: {'YES' if sarcastic else 'NO'}\n"
+                f"TOXICITY: {'NEUTRAL' if sarcastic and label == 'GOOD' else label}\nTRUE_MEANING: {meaning}")
+    if stage == "classifier":
+        return f"{label} - {sub_label}"
+    if stage == "responder":
+        return f"Explanation: The message reads as {label.lower()} ({sub_label.lower()}) based on its wording."
+    if stage == "fused":
+        return (f"DETECTED_LANGUAGE: {'Spanish' if foreign else 'English'}\nIS_ENGLISH: {'NO' if foreign else 'YES'}\n"
+                f"TRANSLATED: {text}\nIS_SARCASTIC: {'YES' if sarcastic else 'NO'}\nTRUE_MEANING: {text}\n"
+                f"CLASSIFICATION: {label} - {sub_label}\nEXPLANATION: Reads as {label.lower()}.")
+    raise ValueError(f"no canned reply for stage {stage}")
+
+
+class FakeLLM:
+    """The LangChain chat-model API (invoke / ainvoke / stream / astream)
+    with canned replies and simulated latency."""
+
+    def __init__(self, latency: dict | None = None, seed: int = 0, time_scale: float = 1.0,
+                 failure_rate: float = 0.0):
+        specs = {**DEFAULT_LATENCY, **(latency or {})}
+        self.latency      = {stage: parse_latency(spec) for stage, spec in specs.items()}
+        self.seed         = seed
+        self.time_scale   = time_scale
+        self.failure_rate = failure_rate
+        self.calls        = {}   # stage -> count
+        self._lock        = threading.Lock()
+
+    def _plan(self, prompt) -> tuple[str, float, bool]:
+        """(reply text, seconds to wait, fail?) for one call."""
+        prompt = str(prompt)
+        stage  = stage_of(prompt)
+        rng    = random.Random(f"{self.seed}:{prompt}")
+        with self._lock:
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+        if stage.endswith("_batch"):
+            single = stage.removesuffix("_batch")
+            texts  = NUMBERED_BLOCK.findall(prompt)
+            reply  = "\n".join(f"[{i}]\n{reply_for(single, t)}" for i, t in enumerate(texts, 1))
+            delay  = self.latency[single](rng) * (1 + BATCH_ITEM_COST * max(0, len(texts) - 1))
+        else:
+            match = TEXT_BLOCK.search(prompt)
+            reply = reply_for(stage, match.group(1) if match else prompt)
+            delay = self.latency[stage](rng)
+        return reply, delay * self.time_scale, rng.random() < self.failure_rate
+
+    @staticmethod
+    def _message(prompt, reply: str) -> AIMessage:
+        usage = {"input_tokens": len(str(prompt)) // 4, "output_tokens": len(reply) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(content=reply, usage_metadata=usage)
+
+    def invoke(self, prompt, *args, **kwargs):
+        reply, delay, fail = self._plan(prompt)
+        time.sleep(delay)
+        if fail:
+            raise ConnectionError("simulated provider failure")
+        return self._message(prompt, reply)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        reply, delay, fail = self._plan(prompt)
+        await asyncio.sleep(delay)
+        if fail:
+            raise ConnectionError("simulated provider failure")
+        return self._message(prompt, reply)
+
+    # streams: a third of the latency before the first token, the rest
+    # spread over 4-character chunks
+    def stream(self, prompt, *args, **kwargs):
+        reply, delay, fail = self._plan(prompt)
+        time.sleep(delay / 3)
+        if fail:
+            raise ConnectionError("simulated provider failure")
+        pieces = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+        for piece in pieces:
+            yield AIMessageChunk(content=piece)
+            time.sleep(2 * delay / 3 / len(pieces))
+
+    async def astream(self, prompt, *args, **kwargs):
+        reply, delay, fail = self._plan(prompt)
+        await asyncio.sleep(delay / 3)
+        if fail:
+            raise ConnectionError("simulated provider failure")
+        pieces = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+        for piece in pieces:
+            yield AIMessageChunk(content=piece)
+            await asyncio.sleep(2 * delay / 3 / len(pieces))
+
+
+def install(agent, fake: FakeLLM) -> None:
+    """Point every stage client of `agent.rag` at `fake`, keeping the real
+    ScheduledLLM wrapping but without provider rate limits."""
+    from llm_scheduler import LLMScheduler
+    agent.rag.scheduler = LLMScheduler()   # no rpm / tpm budget — measure the pipeline, not the quota
+    agent.rag.backends  = agent.rag.backends[:1]
+    agent.rag.pooled    = False
+    agent.rag._clients  = {}
+    agent.rag._connect_stage = lambda stage, provider, base_url: fake
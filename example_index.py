@@ -0,0 +1,135 @@
+import hashlib
+import json
+import mmap
+import os
+import time
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# On-disk few-shot example index.
+#
+#   <dir>/examples.faiss        FAISS inner-product index over L2-normalized
+#                               embeddings (exact IndexFlatIP for small corpora,
+#                               IndexIVFFlat from IVF_MIN_EXAMPLES up)
+#   <dir>/examples.meta.jsonl   one {"text", "label", "sub_label"} per vector id
+#   <dir>/examples.offsets.npy  byte offset of every metadata line (+ the end)
+#   <dir>/manifest.json         embedding model, dim, count, corpus digest
+#
+# Everything is memory-mapped on load: the FAISS vectors via IO_FLAG_MMAP,
+# the metadata via mmap + the offsets array, so startup cost does not grow
+# with the corpus and only the rows a search touches are paged in.
+# Built by preprocess_data.py.
+# ---------------------------------------------------------------------------
+
+INDEX_FILE    = "examples.faiss"
+META_FILE     = "examples.meta.jsonl"
+OFFSETS_FILE  = "examples.offsets.npy"
+MANIFEST_FILE = "manifest.json"
+
+# below this an exact scan is already sub-millisecond; above it an IVF index
+# keeps search at ~1 ms and — unlike IndexFlat — is truly mmapped by FAISS
+IVF_MIN_EXAMPLES = 10_000
+IVF_NPROBE       = 16
+
+
+def corpus_digest(examples: list[dict]) -> str:
+    payload = json.dumps(examples, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ExampleIndex:
+    def __init__(self, directory: str, index, meta: mmap.mmap, offsets: np.ndarray, manifest: dict):
+        self.directory = directory
+        self.index     = index
+        self.manifest  = manifest
+        self._meta     = meta
+        self._offsets  = offsets
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+    @classmethod
+    def build(cls, directory: str, examples: list[dict], embeddings: np.ndarray, embedding_model: str) -> dict:
+        """Write the index files for `examples` (row i ↔ embeddings[i]).
+
+        Files are written next to their final names and swapped in with
+        os.replace, manifest last, so a reader never sees a half-built index.
+        """
+        import faiss
+
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        if embeddings.ndim != 2 or len(embeddings) != len(examples):
+            raise ValueError(f"expected {len(examples)} embeddings, got array of shape {embeddings.shape}")
+        os.makedirs(directory, exist_ok=True)
+
+        dim = embeddings.shape[1]
+        if len(embeddings) >= IVF_MIN_EXAMPLES:
+            # ~4·√n lists, but never fewer than the 39 training points per centroid FAISS wants
+            nlist = min(int(4 * np.sqrt(len(embeddings))), len(embeddings) // 39)
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            sample = np.random.default_rng(0).choice(len(embeddings), min(len(embeddings), nlist * 40), replace=False)
+            index.train(embeddings[np.sort(sample)])
+        else:
+            index = faiss.IndexFlatIP(dim)
+        index.add(embeddings)
+        faiss.write_index(index, os.path.join(directory, INDEX_FILE + ".tmp"))
+
+        offsets = [0]
+        with open(os.path.join(directory, META_FILE + ".tmp"), "wb") as f:
+            for example in examples:
+                f.write(json.dumps(example, ensure_ascii=False).encode("utf-8") + b"\n")
+                offsets.append(f.tell())
+        with open(os.path.join(directory, OFFSETS_FILE + ".tmp"), "wb") as f:
+            np.save(f, np.asarray(offsets, dtype="int64"))
+
+        manifest = {
+            "embedding_model": embedding_model,
+            "dim":             int(dim),
+            "count":           len(examples),
+            "nprobe":          IVF_NPROBE if len(embeddings) >= IVF_MIN_EXAMPLES else None,
+            "corpus_digest":   corpus_digest(examples),
+            "built_at":        round(time.time(), 3),
+        }
+        with open(os.path.join(directory, MANIFEST_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        for name in (INDEX_FILE, META_FILE, OFFSETS_FILE, MANIFEST_FILE):
+            os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+        return manifest
+
+    @classmethod
+    def load(cls, directory: str) -> "ExampleIndex":
+        import faiss
+
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        index   = faiss.read_index(os.path.join(directory, INDEX_FILE), faiss.IO_FLAG_MMAP)
+        if manifest.get("nprobe"):
+            faiss.extract_index_ivf(index).nprobe = manifest["nprobe"]
+        offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, META_FILE), "rb") as f:
+            meta = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+
+        if index.ntotal != manifest["count"] or len(offsets) != manifest["count"] + 1:
+            raise ValueError(f"example index in {directory} is inconsistent — rebuild it with preprocess_data.py")
+        return cls(directory, index, meta, offsets, manifest)
+
+    @property
+    def version(self) -> str:
+        return self.manifest["corpus_digest"]
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    def example(self, i: int) -> dict:
+        return json.loads(self._meta[int(self._offsets[i]):int(self._offsets[i + 1])])
+
+    def search(self, embedding: np.ndarray, k: int) -> list[tuple[float, dict]]:
+        """The `k` nearest examples to one L2-normalized query embedding."""
+        if k <= 0 or not len(self):
+            return []
+        query = np.ascontiguousarray(embedding, dtype="float32").reshape(1, -1)
+        scores, ids = self.index.search(query, min(k, len(self)))
+        return [(float(s), self.example(i)) for s, i in zip(scores[0], ids[0]) if i >= 0]
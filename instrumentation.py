@@ -0,0 +1,296 @@
+from bisect import bisect_left
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+# Pipeline metrics, exported in the Prometheus text format.
+#
+# Counters and histograms live in a Registry; the module-level REGISTRY
+# holds the pipeline's own instruments (below). Recording is a dict update
+# under a lock — cheap enough for the hot path — and a no-op once the
+# registry is disabled (TOXICITY_METRICS=0).
+#
+# Export:  REGISTRY.write(path)           one-shot snapshot (batch runs)
+#          serve_metrics(port)            GET /metrics on a daemon thread
+#          REGISTRY.render()              the text, for an existing server
+# ---------------------------------------------------------------------------
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS   = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames: tuple, key: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: tuple = ()):
+        self.registry   = registry
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self.values     = {}
+        self._lock      = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        self.registry   = registry
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self.buckets    = tuple(sorted(buckets))
+        self.series     = {}   # label key -> [bucket counts..., +Inf count, sum]
+        self._lock      = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = _label_key(self.labelnames, labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self.series.get(_label_key(self.labelnames, labels))
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def reset(self) -> None:
+        for metric in self.metrics.values():
+            with metric._lock:
+                getattr(metric, "values", getattr(metric, "series", {})).clear()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Atomically write a snapshot (e.g. for node_exporter's textfile collector)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry(enabled=os.environ.get("TOXICITY_METRICS", "1") != "0")
+
+# ---------------------------------------------------------------------------
+# Pipeline instruments
+# ---------------------------------------------------------------------------
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "toxicity_stage_seconds", "Wall time of one pipeline stage call, cache hits included.", ("stage",))
+LLM_SECONDS = REGISTRY.histogram(
+    "toxicity_llm_call_seconds", "Wall time of one LLM call, including scheduler retries.", ("stage",))
+LLM_CALLS = REGISTRY.counter(
+    "toxicity_llm_calls_total", "LLM calls by stage and outcome.", ("stage", "outcome"))
+LLM_TOKENS = REGISTRY.histogram(
+    "toxicity_llm_tokens", "Provider-reported tokens per LLM call.", ("stage", "kind"), TOKEN_BUCKETS)
+QUEUE_WAIT = REGISTRY.histogram(
+    "toxicity_llm_queue_wait_seconds", "Time a request waited for rate-limit budget.", ("priority",))
+LLM_RETRIES = REGISTRY.counter(
+    "toxicity_llm_retries_total", "Retried LLM calls by reason.", ("reason",))
+PARSES = REGISTRY.counter(
+    "toxicity_parse_total", "LLM replies by stage; outcome=fallback when the format was not recognized.",
+    ("stage", "outcome"))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "toxicity_cache_lookups_total", "Stage cache lookups by result (memory, disk, miss; hit / miss for "
+    "stage=semantic).", ("stage", "result"))
+BATCH_ITEMS = REGISTRY.counter(
+    "toxicity_batch_items_total", "Micro-batched items by how they were answered (batch, single, fallback).",
+    ("stage", "outcome"))
+RESULTS = REGISTRY.counter(
+    "toxicity_results_total", "Pipeline results by label, tier and explanation source.",
+    ("classification", "tier", "explanation_source"))
+SEMANTIC_VERIFICATIONS = REGISTRY.counter(
+    "toxicity_semantic_cache_verifications_total", "Sampled semantic-cache hits re-analyzed: the label matched, "
+    "or the reuse was false.", ("outcome",))
+PIPELINE_PATHS = REGISTRY.counter(
+    "toxicity_pipeline_paths_total", "Stage-graph results by path: the early-exit rule that fired, local "
+    "(pre-classifier) or full.", ("path",))
+LLM_CALLS_SAVED = REGISTRY.counter(
+    "toxicity_llm_calls_saved_total", "LLM calls skipped by early-exit rules.", ("rule", "stage"))
+DEADLINE_DEGRADATIONS = REGISTRY.counter(
+    "toxicity_deadline_degradations_total", "Stages dropped to meet a deadline: skipped up front, or timed out.",
+    ("stage", "reason"))
+SERVICE_REQUESTS = REGISTRY.counter(
+    "toxicity_http_requests_total", "Moderation service requests by route and status code.", ("route", "status"))
+SERVICE_TEXTS = REGISTRY.counter(
+    "toxicity_http_texts_total", "Texts submitted to the service: analyzed, coalesced onto an in-flight "
+    "analysis, or rejected (overload).", ("outcome",))
+
+
+def record_result(result: dict) -> dict:
+    RESULTS.inc(classification=result["classification"], tier=result.get("tier", "llm"),
+                explanation_source=result.get("explanation_source", "llm"))
+    return result
+
+
+def record_usage(stage: str, response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+    if usage.get("input_tokens"):
+        LLM_TOKENS.observe(usage["input_tokens"], stage=stage, kind="prompt")
+    if usage.get("output_tokens"):
+        LLM_TOKENS.observe(usage["output_tokens"], stage=stage, kind="completion")
+
+
+def timed_stage(stage: str, observe=None):
+    """Decorator: observe STAGE_SECONDS for a sync/async function or
+    (async) generator. Generators are timed until they are exhausted.
+    `observe(seconds)` replaces the histogram (e.g. to keep raw samples)."""
+    if observe is None:
+        observe = lambda seconds: STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                finally:
+                    observe(time.perf_counter() - start)
+            return agen
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    yield from fn(*args, **kwargs)
+                finally:
+                    observe(time.perf_counter() - start)
+            return gen
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coro(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    observe(time.perf_counter() - start)
+            return coro
+
+        @functools.wraps(fn)
+        def sync(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - start)
+        return sync
+    return decorate
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+def serve_metrics(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> "ThreadingHTTPServer":
+    """Serve GET /metrics on a daemon thread; returns the server (call
+    .shutdown() to stop it)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer   # not needed unless serving
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass   # scrapes every few seconds would drown the log
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+# ---------------------------------------------------------------------------
+# Logging. Progress lines used to be print() calls; they are now INFO
+# records on the "agentai" / module loggers, formatted like the old output.
+# Disabled levels cost one isEnabledFor check — arguments are never formatted.
+# ---------------------------------------------------------------------------
+
+def setup_logging(default: str = "WARNING") -> None:
+    """Configure the root logger once; TOXICITY_LOG_LEVEL overrides `default`."""
+    level = os.environ.get("TOXICITY_LOG_LEVEL", default).upper()
+    logging.basicConfig(level=level, format="%(message)s")
@@ -0,0 +1,343 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+# Routing across several LLM backends (Groq, Ollama endpoints, test fakes).
+#
+#   pool.for_stage("classifier").ainvoke(prompt)
+#     → rank the available backends for that stage by observed p95 latency,
+#       inflated by their error rate (backends without enough samples keep
+#       their configured order)
+#     → call the best one; if it is still running after the hedge delay,
+#       send the same prompt to the runner-up and take whichever answers
+#       first
+#     → on error, fail over to the next backend
+#
+# A backend that fails CIRCUIT_FAILURES times in a row is taken out of
+# rotation for a cooldown that doubles on every re-trip, then gets one probe.
+# Streams fail over before their first chunk but are never hedged.
+# ---------------------------------------------------------------------------
+
+WINDOW          = 100    # recent calls kept per backend and stage
+MIN_SAMPLES     = 5      # below this a backend is ranked by configured order
+CIRCUIT_FAILURES = 3
+COOLDOWN_S      = 30.0
+MAX_COOLDOWN_S  = 300.0
+
+log = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    def __init__(self, size: int = WINDOW):
+        self.latencies = deque(maxlen=size)
+        self.outcomes  = deque(maxlen=size)   # True = success
+
+    def record(self, latency_s: float | None, ok: bool) -> None:
+        if latency_s is not None:
+            self.latencies.append(latency_s)
+        self.outcomes.append(ok)
+
+    def quantile(self, q: float) -> float | None:
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def summary(self) -> dict:
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        return {
+            "calls":      len(self.outcomes),
+            "p50_s":      round(p50, 4) if p50 is not None else None,
+            "p95_s":      round(p95, 4) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+        }
+
+
+class Backend:
+    def __init__(self, name: str, llm=None, connect=None):
+        """Either one `llm` for every stage, or `connect(stage)` building a
+        client per stage on first use (a failed connect counts as a failed call)."""
+        if (llm is None) == (connect is None):
+            raise ValueError("Backend needs exactly one of llm or connect")
+        self.name   = name
+        self.llm    = llm
+        self._connect = connect
+        self._clients = {}   # stage -> client built by connect
+        self.stages = {}     # stage -> LatencyWindow
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self._cooldown  = COOLDOWN_S
+        self._lock      = threading.Lock()
+
+    def client(self, stage: str):
+        if self._connect is None:
+            return self.llm
+        client = self._clients.get(stage)
+        if client is None:
+            client = self._clients[stage] = self._connect(stage)   # a lost race only builds it twice
+        return client
+
+    def window(self, stage: str) -> LatencyWindow:
+        with self._lock:
+            return self.stages.setdefault(stage, LatencyWindow())
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def record(self, stage: str, latency_s: float | None, ok: bool) -> None:
+        self.window(stage).record(latency_s, ok)
+        with self._lock:
+            if ok:
+                self.consecutive_failures, self._cooldown = 0, COOLDOWN_S
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= CIRCUIT_FAILURES:
+                # open the circuit; after the cooldown one probe call decides
+                self.down_until = time.monotonic() + self._cooldown
+                self._cooldown  = min(MAX_COOLDOWN_S, self._cooldown * 2)
+                self.consecutive_failures = CIRCUIT_FAILURES - 1
+                log.warning("   ✗ backend %s is failing — out of rotation for %.0fs",
+                            self.name, self.down_until - time.monotonic())
+
+    def score(self, stage: str) -> float | None:
+        """Expected latency for ranking; None until there are enough samples."""
+        window = self.window(stage)
+        p95 = window.quantile(0.95)
+        if p95 is None:
+            return None
+        return p95 / max(0.05, 1 - window.error_rate)
+
+
+class BackendPool:
+    def __init__(self, backends: list[Backend], hedge_after_s: float | str | None = "p95",
+                 max_workers: int = 16):
+        """`hedge_after_s`: seconds before a hedge, "p95" to use the primary's
+        observed p95 for the stage, or None to never hedge."""
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends      = backends
+        self.hedge_after_s = hedge_after_s
+        self.max_workers   = max_workers
+        self._executor     = None
+        self._lock         = threading.Lock()
+        self.counters      = {"calls": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+
+    def for_stage(self, stage: str) -> "StageRouter":
+        return StageRouter(self, stage)
+
+    # routing
+    def ranked(self, stage: str) -> list[Backend]:
+        order = {b: i for i, b in enumerate(self.backends)}
+
+        def key(backend):
+            score = backend.score(stage)
+            # sampled backends by score; unsampled ones after them, in configured
+            # order — except that nothing outranks the unsampled primary
+            if score is None:
+                return (0 if order[backend] == 0 else 2, order[backend], 0.0)
+            return (1, 0, score)
+
+        available = [b for b in self.backends if b.available]
+        if not available:
+            # everything is cooling down: try the one that comes back first
+            return sorted(self.backends, key=lambda b: b.down_until)
+        return sorted(available, key=key)
+
+    def _hedge_delay(self, backend: Backend, stage: str) -> float | None:
+        if self.hedge_after_s is None:
+            return None
+        if self.hedge_after_s == "p95":
+            return backend.window(stage).quantile(0.95)
+        return float(self.hedge_after_s)
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            self.counters[field] += 1
+
+    # calls
+    def _call(self, backend: Backend, stage: str, prompt, args, kwargs):
+        start = time.perf_counter()
+        try:
+            response = backend.client(stage).invoke(prompt, *args, **kwargs)
+        except Exception:
+            backend.record(stage, None, False)
+            raise
+        backend.record(stage, time.perf_counter() - start, True)
+        return response
+
+    async def _acall(self, backend: Backend, stage: str, prompt, args, kwargs):
+        start = time.perf_counter()
+        try:
+            response = await backend.client(stage).ainvoke(prompt, *args, **kwargs)
+        except asyncio.CancelledError:
+            # lost a hedge race: it took at least this long, which is what p95 should learn
+            backend.window(stage).latencies.append(time.perf_counter() - start)
+            raise
+        except Exception:
+            backend.record(stage, None, False)
+            raise
+        backend.record(stage, time.perf_counter() - start, True)
+        return response
+
+    def invoke(self, stage: str, prompt, *args, **kwargs):
+        self._count("calls")
+        candidates = self.ranked(stage)
+        delay = self._hedge_delay(candidates[0], stage)
+        if len(candidates) == 1 or delay is None:
+            return self._invoke_failover(candidates, stage, prompt, args, kwargs)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="llm-hedge")
+        # threads: the caller's context (LLM priority) must follow the call
+        submit = lambda b: self._executor.submit(contextvars.copy_context().run, self._call, b, stage, prompt, args, kwargs)
+        remaining = list(candidates[1:])
+        futures = {submit(candidates[0]): candidates[0]}
+        hedge, errors = None, []
+        while futures:
+            done, _ = wait(futures, timeout=delay if remaining else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedge = remaining.pop(0)
+                self._count("hedges")
+                futures[submit(hedge)] = hedge
+                delay = None   # one hedge per call; more backends only on failure
+                continue
+            for future in done:
+                backend = futures.pop(future)
+                if future.exception() is None:
+                    if backend is hedge:
+                        self._count("hedge_wins")
+                    return future.result()   # a losing call finishes in the background
+                errors.append(future.exception())
+            if not futures and remaining:
+                self._count("failovers")
+                backend = remaining.pop(0)
+                futures[submit(backend)] = backend
+        raise errors[-1]
+
+    def _invoke_failover(self, candidates, stage, prompt, args, kwargs):
+        for i, backend in enumerate(candidates):
+            try:
+                return self._call(backend, stage, prompt, args, kwargs)
+            except Exception:
+                if i == len(candidates) - 1:
+                    raise
+                self._count("failovers")
+
+    async def ainvoke(self, stage: str, prompt, *args, **kwargs):
+        self._count("calls")
+        candidates = self.ranked(stage)
+        delay = self._hedge_delay(candidates[0], stage)
+        remaining = list(candidates[1:])
+        start = lambda b: asyncio.ensure_future(self._acall(b, stage, prompt, args, kwargs))
+        tasks = {start(candidates[0]): candidates[0]}
+        hedge, errors = None, []
+        try:
+            while tasks:
+                timeout = delay if remaining else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._count("hedges")
+                    hedge = remaining.pop(0)
+                    tasks[start(hedge)] = hedge
+                    delay = None   # one hedge per call; more backends only on failure
+                    continue
+                for task in done:
+                    backend = tasks.pop(task)
+                    if task.exception() is None:
+                        if backend is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    errors.append(task.exception())
+                if not tasks and remaining:
+                    self._count("failovers")
+                    backend = remaining.pop(0)
+                    tasks[start(backend)] = backend
+            raise errors[-1]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stream(self, stage: str, prompt, *args, **kwargs):
+        self._count("calls")
+        candidates = self.ranked(stage)
+        for i, backend in enumerate(candidates):
+            try:
+                chunks = backend.client(stage).stream(prompt, *args, **kwargs)
+                first = next(chunks)
+            except StopIteration:
+                return
+            except Exception:
+                backend.record(stage, None, False)
+                if i == len(candidates) - 1:
+                    raise
+                self._count("failovers")
+                continue
+            yield first
+            yield from chunks
+            return
+
+    async def astream(self, stage: str, prompt, *args, **kwargs):
+        self._count("calls")
+        candidates = self.ranked(stage)
+        for i, backend in enumerate(candidates):
+            try:
+                chunks = backend.client(stage).astream(prompt, *args, **kwargs)
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception:
+                backend.record(stage, None, False)
+                if i == len(candidates) - 1:
+                    raise
+                self._count("failovers")
+                continue
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            return
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "backends": {
+                b.name: {
+                    "available": b.available,
+                    "consecutive_failures": b.consecutive_failures,
+                    "stages": {stage: w.summary() for stage, w in list(b.stages.items())},
+                }
+                for b in self.backends
+            },
+        }
+
+
+class StageRouter:
+    """The LangChain LLM API for one pipeline stage of a BackendPool."""
+
+    def __init__(self, pool: BackendPool, stage: str):
+        self.pool  = pool
+        self.stage = stage
+
+    def invoke(self, prompt, *args, **kwargs):
+        return self.pool.invoke(self.stage, prompt, *args, **kwargs)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        return await self.pool.ainvoke(self.stage, prompt, *args, **kwargs)
+
+    def stream(self, prompt, *args, **kwargs):
+        return self.pool.stream(self.stage, prompt, *args, **kwargs)
+
+    def astream(self, prompt, *args, **kwargs):
+        return self.pool.astream(self.stage, prompt, *args, **kwargs)
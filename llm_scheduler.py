@@ -0,0 +1,376 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from instrumentation import LLM_CALLS, LLM_RETRIES, LLM_SECONDS, QUEUE_WAIT, record_usage
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# ---------------------------------------------------------------------------
+# Central admission control for every LLM call.
+#
+#   ScheduledLLM.invoke(prompt)
+#     → LLMScheduler.acquire   wait in a priority queue until the request
+#                              and token buckets both have budget
+#     → llm.invoke             the actual provider call
+#     → retry                  429 / 5xx / connection errors: jittered
+#                              exponential backoff (or Retry-After), re-queued
+#
+# Budgets are per API key, so one scheduler is shared process-wide (see
+# rag_setup.shared_scheduler). Token cost is reserved up front from a
+# chars/4 estimate and reconciled with the provider's usage_metadata.
+#
+# Priority travels in a ContextVar: interactive callers (UI, CLI) are the
+# default; BatchJob marks its traffic BATCH so a bulk run never starves the
+# UI. Within a priority, requests are admitted first come, first served.
+# ---------------------------------------------------------------------------
+
+INTERACTIVE = 0
+BATCH       = 1
+
+PRIORITY = ContextVar("llm_priority", default=INTERACTIVE)
+
+ASYNC_POLL_S = 0.005   # how often a queued coroutine re-checks its turn
+SYNC_POLL_S  = 0.05    # upper bound on a thread's wait between checks
+
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectError", "ConnectTimeout",
+                    "ReadTimeout", "RemoteProtocolError", "TimeoutError", "ConnectionError"}
+
+
+@contextmanager
+def llm_priority(level: int):
+    """Run the enclosed LLM calls (and tasks created inside) at `level`."""
+    token = PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        PRIORITY.reset(token)
+
+
+def status_of(error: Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_of(error: Exception) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = status_of(error)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to `capacity`. Not
+    thread-safe on its own — LLMScheduler holds its lock around it."""
+
+    def __init__(self, per_minute: float, capacity: float | None = None, clock=time.monotonic):
+        self.rate     = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.clock    = clock
+        self.level    = self.capacity
+        self.updated  = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level   = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        amount = min(amount, self.capacity)   # an oversized request must still get through eventually
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount   # may go negative: the debt delays later requests
+
+    def adjust(self, delta: float) -> None:
+        """Charge (`delta` > 0) or refund (`delta` < 0) after the fact."""
+        self.level = min(self.capacity, self.level - delta)
+
+
+class LLMScheduler:
+    def __init__(self, rpm: float | None = None, tpm: float | None = None, burst: float | None = None,
+                 max_retries: int = 5, base_delay_s: float = 0.5, max_delay_s: float = 20.0,
+                 completion_tokens: int = 128, clock=time.monotonic):
+        self.requests          = TokenBucket(rpm, burst, clock) if rpm else None
+        self.tokens            = TokenBucket(tpm, None, clock) if tpm else None
+        self.max_retries       = max_retries
+        self.base_delay_s      = base_delay_s
+        self.max_delay_s       = max_delay_s
+        self.completion_tokens = completion_tokens   # reserved per call until usage is known
+        self.clock             = clock
+
+        self._lock    = threading.Lock()
+        self._cond    = threading.Condition(self._lock)
+        self._waiters = []   # heap of (priority, seq) tickets
+        self._seq     = itertools.count()
+        self._stats   = {
+            "admitted": 0, "retries": 0, "rate_limited": 0, "failed": 0,
+            "queue_depth": 0, "max_queue_depth": 0,
+            "wait_s": {INTERACTIVE: 0.0, BATCH: 0.0}, "max_wait_s": 0.0,
+            "by_priority": {INTERACTIVE: 0, BATCH: 0},
+        }
+
+    # admission
+    def _enqueue(self):
+        ticket = (PRIORITY.get(), next(self._seq))
+        with self._lock:
+            heapq.heappush(self._waiters, ticket)
+            self._stats["queue_depth"] = len(self._waiters)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._waiters))
+        return ticket, self.clock()
+
+    def _try_admit(self, ticket, tokens: int, enqueued_at: float) -> float | None:
+        """Caller holds the lock. None → admitted and budget taken;
+        otherwise the number of seconds worth waiting before retrying."""
+        if self._waiters[0] != ticket:
+            return SYNC_POLL_S   # someone ahead of us (higher priority or earlier)
+        wait = max(
+            self.requests.wait_time(1) if self.requests else 0.0,
+            self.tokens.wait_time(tokens) if self.tokens else 0.0,
+        )
+        if wait > 0:
+            return wait
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        heapq.heappop(self._waiters)
+
+        waited = self.clock() - enqueued_at
+        priority = ticket[0]
+        self._stats["admitted"] += 1
+        self._stats["queue_depth"] = len(self._waiters)
+        self._stats["wait_s"][priority] = self._stats["wait_s"].get(priority, 0.0) + waited
+        self._stats["by_priority"][priority] = self._stats["by_priority"].get(priority, 0) + 1
+        self._stats["max_wait_s"] = max(self._stats["max_wait_s"], waited)
+        QUEUE_WAIT.observe(waited, priority="interactive" if priority == INTERACTIVE else "batch")
+        return None
+
+    def _abandon(self, ticket) -> None:
+        with self._cond:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._stats["queue_depth"] = len(self._waiters)
+            self._cond.notify_all()
+
+    def acquire(self, tokens: int) -> None:
+        ticket, enqueued_at = self._enqueue()
+        admitted = False
+        try:
+            with self._cond:
+                while True:
+                    wait = self._try_admit(ticket, tokens, enqueued_at)
+                    if wait is None:
+                        admitted = True
+                        self._cond.notify_all()   # the next ticket may now be head
+                        return
+                    self._cond.wait(timeout=min(wait, SYNC_POLL_S))
+        finally:
+            if not admitted:
+                self._abandon(ticket)
+
+    async def aacquire(self, tokens: int) -> None:
+        ticket, enqueued_at = self._enqueue()
+        admitted = False
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(ticket, tokens, enqueued_at)
+                    if wait is None:
+                        admitted = True
+                        self._cond.notify_all()
+                        return
+                    at_head = self._waiters[0] == ticket
+                # at the head we are only waiting for budget; otherwise poll for our turn
+                await asyncio.sleep(wait if at_head else ASYNC_POLL_S)
+        finally:
+            if not admitted:   # cancelled while queued
+                self._abandon(ticket)
+
+    def reconcile(self, reserved: int, response) -> None:
+        """Replace the token estimate with the provider-reported usage."""
+        usage = getattr(response, "usage_metadata", None)
+        if not self.tokens or not usage or not usage.get("total_tokens"):
+            return
+        with self._lock:
+            self.tokens.adjust(usage["total_tokens"] - reserved)
+
+    # retries
+    def _retry_delay(self, error: Exception, attempt: int) -> float | None:
+        """Backoff before the next attempt, or None to give up."""
+        if not is_retryable(error) or attempt >= self.max_retries:
+            with self._lock:
+                self._stats["failed"] += 1
+            return None
+        status = status_of(error)
+        with self._lock:
+            self._stats["retries"] += 1
+            if status == 429:
+                self._stats["rate_limited"] += 1
+        LLM_RETRIES.inc(reason="rate_limited" if status == 429 else "server_error" if status else "connection")
+        backoff = random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))   # full jitter
+        hint = retry_after_of(error)
+        return min(self.max_delay_s, hint + random.uniform(0, self.base_delay_s)) if hint is not None else backoff
+
+    def call(self, fn, tokens: int):
+        for attempt in itertools.count():
+            self.acquire(tokens)
+            try:
+                response = fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.reconcile(tokens, response)
+            return response
+
+    async def acall(self, fn, tokens: int):
+        for attempt in itertools.count():
+            await self.aacquire(tokens)
+            try:
+                response = await fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.reconcile(tokens, response)
+            return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items()}
+        admitted = stats["by_priority"]
+        stats["mean_wait_s"] = {
+            ("interactive" if p == INTERACTIVE else "batch"): round(stats["wait_s"][p] / n, 4) if n else 0.0
+            for p, n in admitted.items()
+        }
+        stats["max_wait_s"] = round(stats["max_wait_s"], 4)
+        del stats["wait_s"]
+        return stats
+
+
+class ScheduledLLM:
+    """Drop-in wrapper: the LangChain LLM API, with every call admitted and
+    retried by an LLMScheduler. `stage` labels the call in the metrics."""
+
+    def __init__(self, llm, scheduler: LLMScheduler, stage: str = "llm"):
+        self.llm       = llm
+        self.scheduler = scheduler
+        self.stage     = stage
+
+    def _estimate(self, prompt) -> int:
+        return len(str(prompt)) // 4 + self.scheduler.completion_tokens
+
+    def _record(self, start: float, response=None, ok: bool = True) -> None:
+        LLM_SECONDS.observe(time.perf_counter() - start, stage=self.stage)
+        LLM_CALLS.inc(stage=self.stage, outcome="ok" if ok else "error")
+        if response is not None:
+            record_usage(self.stage, response)
+
+    def invoke(self, prompt, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.scheduler.call(lambda: self.llm.invoke(prompt, *args, **kwargs), self._estimate(prompt))
+        except Exception:
+            self._record(start, ok=False)
+            raise
+        self._record(start, response)
+        return response
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.scheduler.acall(lambda: self.llm.ainvoke(prompt, *args, **kwargs), self._estimate(prompt))
+        except Exception:
+            self._record(start, ok=False)
+            raise
+        self._record(start, response)
+        return response
+
+    # streams are timed until the last chunk; usage, if the provider sends
+    # it, arrives on one of the chunks
+    def stream(self, prompt, *args, **kwargs):
+        start, ok = time.perf_counter(), False
+        try:
+            for chunk in self._stream(prompt, *args, **kwargs):
+                if getattr(chunk, "usage_metadata", None):
+                    record_usage(self.stage, chunk)
+                yield chunk
+            ok = True
+        finally:
+            self._record(start, ok=ok)
+
+    async def astream(self, prompt, *args, **kwargs):
+        start, ok = time.perf_counter(), False
+        try:
+            async for chunk in self._astream(prompt, *args, **kwargs):
+                if getattr(chunk, "usage_metadata", None):
+                    record_usage(self.stage, chunk)
+                yield chunk
+            ok = True
+        finally:
+            self._record(start, ok=ok)
+
+    # streams are retried only until the first chunk arrives — after that
+    # the caller has already shown part of the answer
+    def _stream(self, prompt, *args, **kwargs):
+        tokens = self._estimate(prompt)
+        for attempt in itertools.count():
+            self.scheduler.acquire(tokens)
+            chunks = self.llm.stream(prompt, *args, **kwargs)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                return
+            except Exception as e:
+                delay = self.scheduler._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            yield first
+            yield from chunks
+            return
+
+    async def _astream(self, prompt, *args, **kwargs):
+        tokens = self._estimate(prompt)
+        for attempt in itertools.count():
+            await self.scheduler.aacquire(tokens)
+            chunks = self.llm.astream(prompt, *args, **kwargs)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                delay = self.scheduler._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            return
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
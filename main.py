@@ -1,7 +1,12 @@
 from agentai.agent import ToxicityAgent
+from batch import BatchJob
+from example_index import ExampleIndex
+from instrumentation import setup_logging
+from rag_setup import INDEX_DIR
 import sys
 
 def main():
+    setup_logging("INFO")   # per-stage progress, as the CLI always showed
     print("\n" + "="*60)
     print("🛡️  TOXICITY DETECTION SYSTEM")
     print("="*60)
@@ -11,12 +16,7 @@ def main():
     
     # Initialize agent
     try:
-        agent = ToxicityAgent()
-    except FileNotFoundError:
-        print(" Error: Toxicity examples not found!")
-        print("\nPlease run the preprocessing step first:")
-        print("  python preprocess_data.py")
-        return
+        agent = ToxicityAgent(result_store=True)   # every verdict is kept; see result_store.py
     except RuntimeError as e:
         print(f"  {e}")
         return
@@ -24,15 +24,20 @@ def main():
         print(f"  Unexpected error: {e}")
         return
     
+    if not ExampleIndex.exists(INDEX_DIR):
+        print(" Note: few-shot example index not built — the classifier runs zero-shot.")
+        print("  Build it once with: python preprocess_data.py")
+
     # Main loop
     while True:
         print("\n" + "-"*60)
         print("OPTIONS:")
         print("1. Analyze single content")
-        print("2. Exit")
+        print("2. Analyze a file (JSONL / CSV batch)")
+        print("3. Exit")
         print("-"*60)
         
-        choice = input("\nEnter your choice (1-2): ").strip()
+        choice = input("\nEnter your choice (1-3): ").strip()
         
         if choice == '1':
             # Single analysis
@@ -53,6 +58,17 @@ def main():
                 print("  No content entered.")
             
         elif choice == '2':
+            input_path  = input("\nInput file (.jsonl or .csv): ").strip()
+            output_path = input("Output file (.jsonl): ").strip() or input_path + ".results.jsonl"
+            try:
+                stats = BatchJob(agent, input_path, output_path).run()
+            except FileNotFoundError as e:
+                print(f"  File not found: {e.filename}")
+                continue
+            print(f"\n  Processed: {stats['processed']}  Skipped: {stats['skipped']}  Errors: {stats['errors']}")
+            print(f"  Results written to {output_path}")
+
+        elif choice == '3':
             print("\n Thank you for using the Toxicity Detection System!")
             print("="*60 + "\n")
             break
@@ -0,0 +1,60 @@
+from example_index import ExampleIndex
+from rag_setup import EMBEDDING_MODEL, EXAMPLES_PATH, INDEX_DIR, ToxicityRAG
+import argparse
+import json
+import sys
+import time
+
+# Responsibility: embed the labeled example corpus once and persist it as
+# the FAISS few-shot index that ClassifierAgent retrieves from. Rerun it
+# whenever data/toxicity_examples.jsonl changes; cached classifier results
+# are keyed on the corpus digest, so they are invalidated automatically.
+
+REQUIRED_FIELDS = ("text", "label", "sub_label")
+LABELS          = ("TOXIC", "NEUTRAL", "GOOD")
+
+
+def load_examples(path: str) -> list[dict]:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON: {e}") from e
+            missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+            if missing:
+                raise ValueError(f"{path}:{line_no}: missing {', '.join(missing)}")
+            if record["label"] not in LABELS:
+                raise ValueError(f"{path}:{line_no}: unknown label '{record['label']}', expected one of {LABELS}")
+            examples.append({field: record[field] for field in REQUIRED_FIELDS})
+    if not examples:
+        raise ValueError(f"{path}: no examples")
+    return examples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the FAISS few-shot example index.")
+    parser.add_argument("--examples", default=EXAMPLES_PATH, help=f"labeled JSONL corpus (default: {EXAMPLES_PATH})")
+    parser.add_argument("--out", default=INDEX_DIR, help=f"index directory (default: {INDEX_DIR})")
+    args = parser.parse_args(argv)
+
+    examples = load_examples(args.examples)
+    print(f"  Embedding {len(examples)} examples with {EMBEDDING_MODEL} …")
+    start = time.perf_counter()
+    embeddings = ToxicityRAG(cache=False).embed([e["text"] for e in examples])
+    manifest = ExampleIndex.build(args.out, examples, embeddings, EMBEDDING_MODEL)
+
+    print(f"  ✓ Index written to {args.out}")
+    print(f"    {manifest['count']} examples × {manifest['dim']} dims, "
+          f"corpus {manifest['corpus_digest']}, {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"  Error: {e}")
+        sys.exit(1)
@@ -1,9 +1,38 @@
-from langchain_ollama import OllamaLLM
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from example_index import ExampleIndex
+from llm_router import Backend, BackendPool, StageRouter
+from llm_scheduler import LLMScheduler, ScheduledLLM
+from result_cache import StageCache
 import os
 from enum import Enum
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
 
-load_dotenv()
+log = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Provider SDKs (langchain_groq, langchain_ollama — ~1 s of imports) load in
+# _connect_llm, on first use; python-dotenv only when there is a .env file
+# (searched upward from this directory, like its find_dotenv()).
+def _load_dotenv() -> None:
+    directory = BASE_DIR
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+_load_dotenv()
 
 # ---------------------------------------------------------------------------
 # Provider config
@@ -29,29 +58,50 @@ MODELS = {
     LLMProvider.LOCAL: {
         "qwen":  "qwen2.5:7b",
         "llama": "llama3.1:8b",
+        "small": "qwen2.5:3b",
     },
     LLMProvider.GROQ: {
         "qwen":  "qwen/qwen3-32b",
         "llama": "llama-3.3-70b-versatile",
+        "small": "llama-3.1-8b-instant",
     },
 }
 
+# model-specific client kwargs; the stage profile below adds temperature,
+# max_tokens and stop
 MODEL_CONFIGS = {
     LLMProvider.GROQ: {
         "qwen": {
-            "temperature":      0.3,
             "reasoning_effort": "none",   # disables <think> blocks entirely — structured output is more reliable
-            "model_kwargs": {
-                "max_completion_tokens": 512,   # classifier/responder never need 4096
-                "top_p":                 0.9,
-            },
+            "model_kwargs": {"top_p": 0.9},
         },
+        "llama": {},
+        "small": {},
     },
     LLMProvider.LOCAL: {
-        "qwen":  {"temperature": LLM_TEMPERATURE},
+        "qwen":  {},
+        "llama": {},
+        "small": {},
     },
 }
 
+# ---------------------------------------------------------------------------
+# Per-stage generation profiles: which model answers and how much it may
+# say. Label stages run on the small model with a few output tokens; only
+# the responder (and fused mode, which writes the explanation too) gets the
+# large one. The *_batch profiles answer up to 16 micro-batched items.
+# ---------------------------------------------------------------------------
+
+GENERATION_PROFILES = {
+    "translator":       {"model": "qwen",  "temperature": 0.0, "max_tokens": 512},
+    "sarcasm":          {"model": "small", "temperature": 0.0, "max_tokens": 256},   # TRUE_MEANING may echo the text
+    "sarcasm_batch":    {"model": "small", "temperature": 0.0, "max_tokens": 4096},
+    "classifier":       {"model": "small", "temperature": 0.0, "max_tokens": 16, "stop": ["\n\n"]},
+    "classifier_batch": {"model": "small", "temperature": 0.0, "max_tokens": 320},
+    "responder":        {"model": "qwen",  "temperature": 0.3, "max_tokens": 256},
+    "fused":            {"model": "qwen",  "temperature": LLM_TEMPERATURE, "max_tokens": 512},
+}
+
 # ---------------------------------------------------------------------------
 # Resolved model names
 # ---------------------------------------------------------------------------
@@ -59,54 +109,329 @@ MODEL_CONFIGS = {
 LLM_QWEN  = MODELS[ACTIVE_PROVIDER]["qwen"]
 
 AGENT_MODELS = {
-    "sarcasm":    LLM_QWEN,
-    "classifier": LLM_QWEN,
-    "responder":  LLM_QWEN,
+    stage: MODELS[ACTIVE_PROVIDER][profile["model"]] for stage, profile in GENERATION_PROFILES.items()
 }
 
+# Ollama context sizes (batched prompts with few-shot examples need the room)
 CTX_WINDOWS = {
-    LLM_QWEN:  2048,
+    MODELS[LLMProvider.LOCAL]["qwen"]:  4096,
+    MODELS[LLMProvider.LOCAL]["llama"]: 4096,
+    MODELS[LLMProvider.LOCAL]["small"]: 4096,
+}
+
+# ---------------------------------------------------------------------------
+# Local embeddings (CPU) + labeled example corpus
+# ---------------------------------------------------------------------------
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EXAMPLES_PATH   = os.path.join(BASE_DIR, "data", "toxicity_examples.jsonl")
+INDEX_DIR       = os.environ.get("TOXICITY_INDEX_DIR", os.path.join(BASE_DIR, "data", "index"))   # preprocess_data.py
+
+# ---------------------------------------------------------------------------
+# Stage result cache (memory LRU in front of SQLite)
+# ---------------------------------------------------------------------------
+
+CACHE_CONFIG = {
+    "path":           os.environ.get("TOXICITY_CACHE_PATH", os.path.join(BASE_DIR, ".cache", "stage_cache.sqlite3")),
+    "memory_entries": 10_000,
+    "disk_entries":   500_000,
+    "ttl_s":          7 * 24 * 3600,
+}
+
+# near-duplicate whole-result cache, ToxicityAgent(semantic_cache=True) — see semantic_cache.py
+SEMANTIC_CACHE_CONFIG = {
+    "path":        os.environ.get("TOXICITY_SEMANTIC_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "semantic")),
+    "threshold":   0.93,     # MiniLM cosine; raids / misspellings land above, paraphrases mostly below
+    "max_entries": 50_000,
+    "verify_rate": 0.02,     # share of hits re-analyzed to measure false reuse
+}
+
+# append-only log of every result, ToxicityAgent(result_store=True) — see result_store.py
+RESULT_STORE_CONFIG = {
+    "path":       os.environ.get("TOXICITY_RESULT_STORE_PATH", os.path.join(BASE_DIR, "data", "results.sqlite3")),
+    "batch_size": 500,       # rows per insert transaction, at most
+}
+
+# ---------------------------------------------------------------------------
+# Request scheduling (rate budgets + retries), shared by every ToxicityRAG
+# in the process because provider quotas are per API key.
+# GROQ_API_BASE (read by ChatGroq) points the client at a proxy or a local
+# fake server.
+# ---------------------------------------------------------------------------
+
+SCHEDULER_CONFIG = {
+    LLMProvider.GROQ: {
+        "rpm":         float(os.environ.get("GROQ_RPM", 60)),
+        "tpm":         float(os.environ.get("GROQ_TPM", 6_000)),
+        "max_retries": 5,
+    },
+    LLMProvider.LOCAL: {
+        "rpm":         None,   # no quota on a local Ollama — only retries apply
+        "tpm":         None,
+        "max_retries": 3,
+    },
 }
 
+# ---------------------------------------------------------------------------
+# Backend routing. The default is one backend, ACTIVE_PROVIDER. List several
+# in TOXICITY_BACKENDS (provider[@base_url], comma-separated), e.g.
+#   TOXICITY_BACKENDS=groq,local,local@http://gpu-box:11434
+# and each stage is routed across them by observed latency and error rate,
+# with hedged requests and failover (llm_router.BackendPool).
+# TOXICITY_HEDGE_AFTER_S: seconds, "p95" (the primary's observed p95) or "off".
+# ---------------------------------------------------------------------------
+
+def _parse_backends(spec: str) -> list[tuple[LLMProvider, str | None]]:
+    backends = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        provider, _, base_url = entry.partition("@")
+        backends.append((LLMProvider(provider), base_url or None))
+    return backends
+
+
+def _parse_hedge(value: str) -> float | str | None:
+    value = value.strip().lower()
+    if value in ("", "off", "none"):
+        return None
+    return value if value == "p95" else float(value)
+
+
+ROUTING_CONFIG = {
+    "backends":      _parse_backends(os.environ.get("TOXICITY_BACKENDS", ACTIVE_PROVIDER.value)),
+    "hedge_after_s": _parse_hedge(os.environ.get("TOXICITY_HEDGE_AFTER_S", "p95")),
+    "max_retries":   1,   # per backend inside a pool: fail over rather than back off
+}
+
+_schedulers     = {}
+_scheduler_lock = threading.Lock()
+
+
+def shared_scheduler(provider: LLMProvider = ACTIVE_PROVIDER, pooled: bool = False) -> LLMScheduler:
+    """The process-wide scheduler for `provider`. `pooled` schedulers serve
+    one backend of a BackendPool and retry less, so failover kicks in sooner."""
+    with _scheduler_lock:
+        if (provider, pooled) not in _schedulers:
+            config = dict(SCHEDULER_CONFIG[provider])
+            if pooled:
+                config["max_retries"] = min(config["max_retries"], ROUTING_CONFIG["max_retries"])
+            _schedulers[provider, pooled] = LLMScheduler(**config)
+        return _schedulers[provider, pooled]
+
 # ---------------------------------------------------------------------------
 # ToxicityRAG
 # ---------------------------------------------------------------------------
 
 class ToxicityRAG:
-    def __init__(self):
-        self._llm_qwen  = None
-        self._llm_llama = None
+    def __init__(self, cache: bool = True, scheduler: LLMScheduler | None = None,
+                 backends: list[tuple[LLMProvider, str | None]] | None = None):
+        self.backends   = backends or ROUTING_CONFIG["backends"]
+        self.pooled     = len(self.backends) > 1
+        self._own_scheduler = scheduler
+        self.scheduler  = scheduler or shared_scheduler(self.backends[0][0], pooled=self.pooled)
+        self._clients   = {}     # stage -> client (single backend)
+        self._pool      = None   # BackendPool (several backends)
+        self._reachable = set()  # (base_url, model) pairs that answered an Ollama ping
+        self._embedder  = None
+        self._index     = None   # ExampleIndex, or False once known to be unavailable
+        self._embedder_lock = threading.Lock()
+        self._index_lock    = threading.Lock()
+        self._connect_lock  = threading.Lock()
+
+        # disabled → a zero-size, memory-only cache: every lookup is a miss
+        self.cache = StageCache(**CACHE_CONFIG) if cache else StageCache(path=None, memory_entries=0)
+
+    def model_for(self, stage: str) -> str:
+        family = GENERATION_PROFILES[stage]["model"]
+        # in a pool any backend may answer: results are keyed by all of them
+        return "+".join(MODELS[provider][family] for provider, _ in self.backends)
+
+    # embeddings
+    @property
+    def embedder(self):
+        with self._embedder_lock:
+            if self._embedder is None:
+                from sentence_transformers import SentenceTransformer   # torch is heavy — load on first use
+                log.info("   Loading embedding model (%s, cpu) …", EMBEDDING_MODEL)
+                self._embedder = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+                log.info("   ✓ %s loaded", EMBEDDING_MODEL)
+        return self._embedder
+
+    def embed(self, texts: list[str]):
+        """L2-normalized float32 embeddings, so a dot product is cosine similarity."""
+        return self.embedder.encode(
+            texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False,
+        ).astype("float32")
+
+    # few-shot retrieval
+    @property
+    def index(self) -> ExampleIndex | None:
+        """The memory-mapped example index, or None if it was never built."""
+        with self._index_lock:
+            if self._index is None:
+                self._index = self._load_index()
+        return self._index or None
+
+    def _load_index(self):
+        if not ExampleIndex.exists(INDEX_DIR):
+            log.warning("   No example index in %s — classifier runs without few-shot examples "
+                        "(build it with: python preprocess_data.py)", INDEX_DIR)
+            return False
+        index = ExampleIndex.load(INDEX_DIR)
+        if index.manifest["embedding_model"] != EMBEDDING_MODEL:
+            log.warning("   Example index was built with %s, not %s — ignoring it "
+                        "(rebuild with: python preprocess_data.py)", index.manifest["embedding_model"], EMBEDDING_MODEL)
+            return False
+        log.info("   ✓ Example index mapped (%d examples)", len(index))
+        return index
+
+    @property
+    def index_version(self) -> str | None:
+        index = self.index
+        return index.version if index is not None else None
+
+    def retrieve(self, text: str, k: int = 4) -> list[dict]:
+        """The `k` labeled examples most similar to `text` (empty without an index)."""
+        index = self.index
+        if index is None or k <= 0:
+            return []
+        return [example for _, example in index.search(self.embed([text])[0], k)]
+
+    async def aretrieve(self, text: str, k: int = 4) -> list[dict]:
+        # query embedding is CPU-bound — keep it off the event loop
+        return await asyncio.to_thread(self.retrieve, text, k)
 
     # models
+    def llm_for(self, stage: str) -> ScheduledLLM | StageRouter:
+        """The client for `stage` — its own model and generation profile.
+        Created on first use; with several backends, a view of the pool."""
+        if self.pooled:
+            return self.pool.for_stage(stage)
+        client = self._clients.get(stage)
+        if client is None:
+            # built outside any lock so warmup() connects stages in parallel;
+            # a lost race only builds (and health-checks) a client twice
+            provider, base_url = self.backends[0]
+            client = ScheduledLLM(self._connect_stage(stage, provider, base_url), self.scheduler, stage)
+            client = self._clients.setdefault(stage, client)
+        return client
+
     @property
-    def llm_qwen(self) -> OllamaLLM:
-        if self._llm_qwen is None:
-            self._llm_qwen = self._connect_llm(LLM_QWEN)
-        return self._llm_qwen
+    def pool(self) -> BackendPool:
+        if self._pool is None:
+            with self._connect_lock:
+                if self._pool is None:
+                    self._pool = BackendPool(
+                        [self._backend(provider, base_url) for provider, base_url in self.backends],
+                        hedge_after_s=ROUTING_CONFIG["hedge_after_s"],
+                    )
+        return self._pool
+
+    def _backend(self, provider: LLMProvider, base_url: str | None) -> Backend:
+        scheduler = self._own_scheduler or shared_scheduler(provider, pooled=True)
+        return Backend(
+            provider.value + (f"@{base_url}" if base_url else ""),
+            connect=lambda stage: ScheduledLLM(self._connect_stage(stage, provider, base_url), scheduler, stage),
+        )
+
+    def routing_stats(self) -> dict | None:
+        """Per-backend latency / error stats, when routing across a pool."""
+        return self._pool.stats() if self._pool is not None else None
 
     @property
-    def llm_llama(self) -> OllamaLLM:
-        if self._llm_llama is None:
-            self._llm_llama = self._connect_llm(LLM_LLAMA)
-        return self._llm_llama
+    def connected(self) -> bool:
+        return self._pool is not None or bool(self._clients)
+
+    def _connect_tasks(self) -> dict:
+        """One task per stage client (per backend, when pooled)."""
+        if not self.pooled:
+            return {stage: functools.partial(self.llm_for, stage) for stage in GENERATION_PROFILES}
+        return {(backend.name, stage): functools.partial(backend.client, stage)
+                for backend in self.pool.backends for stage in GENERATION_PROFILES}
+
+    def _check_connected(self, outcomes: dict) -> None:
+        failures = {name: outcome for name, outcome in outcomes.items() if isinstance(outcome, Exception)}
+        if not self.pooled:
+            for outcome in failures.values():
+                raise outcome
+            return
+        # a pooled backend is routed around until it answers; the pool retries the connection later
+        for backend, error in {name[0]: e for name, e in failures.items() if isinstance(name, tuple)}.items():
+            if not isinstance(error, RuntimeError):
+                raise error
+            log.warning("   ✗ backend %s unavailable (%s)", backend, error)
+
+    def connect(self) -> None:
+        """Create the clients used by the pipeline stages (blocking I/O, all
+        stages at once)."""
+        self._check_connected(run_concurrently(self._connect_tasks()))
+
+    def warmup(self, embedder: bool | None = None, extra: dict | None = None) -> dict:
+        """Do every first-use cost up front, concurrently: connect (and
+        health-check) each stage client, map the example index, load the
+        embedding model — by default only if the index exists, since nothing
+        else here needs it — plus any `extra` {name: callable} tasks.
+        Returns {task: seconds} (or the exception a task raised)."""
+        connect = self._connect_tasks()
+        tasks = {**connect, "example_index": lambda: self.index}
+        if embedder or (embedder is None and ExampleIndex.exists(INDEX_DIR)):
+            tasks["embedder"] = lambda: self.embedder
+        tasks.update(extra or {})
+        start = time.perf_counter()
+        outcomes = run_concurrently(tasks)
+        self._check_connected({name: outcomes[name] for name in connect})
+        for name in tasks.keys() - connect.keys():
+            if isinstance(outcomes[name], Exception):
+                raise outcomes[name]
+        log.info("   ✓ Warm in %.2fs (%s)", time.perf_counter() - start, ", ".join(
+            f"{'/'.join(name) if isinstance(name, tuple) else name} {seconds:.2f}s"
+            for name, seconds in outcomes.items() if not isinstance(seconds, Exception)))
+        return outcomes
+
+    async def awarmup(self, embedder: bool | None = None, extra: dict | None = None) -> dict:
+        return await asyncio.to_thread(self.warmup, embedder, extra)
+
+    async def aconnect(self) -> None:
+        # _connect_llm does network I/O (the Ollama health check) and mapping
+        # the example index touches disk — never on the event loop
+        if not self.connected:
+            await asyncio.to_thread(self.connect)
+        if self._index is None:
+            await asyncio.to_thread(lambda: self.index)
 
     # agents
     @property
-    def llm_sarcasm(self) -> OllamaLLM:
-        return self.llm_qwen
+    def llm_translator(self) -> ScheduledLLM | StageRouter:
+        return self.llm_for("translator")
+
+    @property
+    def llm_sarcasm(self) -> ScheduledLLM | StageRouter:
+        return self.llm_for("sarcasm")
 
     @property
-    def llm_classifier(self) -> OllamaLLM:
-        return self.llm_qwen
+    def llm_classifier(self) -> ScheduledLLM | StageRouter:
+        return self.llm_for("classifier")
 
     @property
-    def llm_responder(self) -> OllamaLLM:
-        return self.llm_qwen
+    def llm_responder(self) -> ScheduledLLM | StageRouter:
+        return self.llm_for("responder")
+
+    def _connect_stage(self, stage: str, provider: LLMProvider, base_url: str | None):
+        profile = GENERATION_PROFILES[stage]
+        return self._connect_llm(
+            MODELS[provider][profile["model"]], provider, base_url,
+            {**MODEL_CONFIGS[provider][profile["model"]], **{k: v for k, v in profile.items() if k != "model"}},
+        )
 
-    def _connect_llm(self, model_name: str):
-        config = MODEL_CONFIGS[ACTIVE_PROVIDER]["qwen"]
+    def _connect_llm(self, model_name: str, provider: LLMProvider = ACTIVE_PROVIDER,
+                     base_url: str | None = None, settings: dict | None = None):
+        """One client for `model_name`. `settings` holds the model's extra
+        kwargs plus the stage's temperature / max_tokens / stop."""
+        config = dict(settings or {})
+        max_tokens = config.pop("max_tokens", None)
+        if base_url:
+            config["base_url"] = base_url
 
-        if ACTIVE_PROVIDER == LLMProvider.GROQ:
+        if provider == LLMProvider.GROQ:
             from langchain_groq import ChatGroq
             api_key = os.environ.get("GROQ_API_KEY")
             if not api_key:
@@ -114,30 +439,74 @@ class ToxicityRAG:
                     "GROQ_API_KEY not found. "
                     "Add it to your .env file: GROQ_API_KEY=your_key_here"
                 )
-            print(f"   Connecting to Groq ({model_name}) …")
+            log.info("   Connecting to Groq (%s, max_tokens=%s) …", model_name, max_tokens)
             llm = ChatGroq(
                 model=model_name,
                 api_key=api_key,
+                max_tokens=max_tokens,
+                max_retries=0,   # the LLMScheduler owns retries and backoff
                 **config,
             )
-            print(f"   ✓ {model_name} connected")
+            log.info("   ✓ %s connected", model_name)
             return llm
 
         # LOCAL — Ollama
+        from langchain_ollama import OllamaLLM
         ctx = CTX_WINDOWS.get(model_name, 2048)
-        print(f"   Connecting to Ollama ({model_name}, ctx={ctx}) …")
-        llm = OllamaLLM(
+        log.info("   Connecting to Ollama (%s, ctx=%d, max_tokens=%s) …", model_name, ctx, max_tokens)
+        if (base_url, model_name) not in self._reachable:   # else already checked for another stage
+            check_ollama_model(base_url, model_name)
+            self._reachable.add((base_url, model_name))
+            log.info("   ✓ %s available", model_name)
+        return OllamaLLM(
             model=model_name,
             num_ctx=ctx,
+            num_predict=max_tokens,
             **config,
         )
+
+
+def run_concurrently(tasks: dict) -> dict:
+    """Run {name: callable} on a thread pool; {name: seconds taken, or the
+    exception raised}."""
+    def timed(fn):
+        start = time.perf_counter()
         try:
-            llm.invoke("ping")
-            print(f"   ✓ {model_name} connected")
+            fn()
         except Exception as e:
-            raise RuntimeError(
-                f"Cannot reach Ollama model '{model_name}': {e}\n"
-                f"Make sure Ollama is running and the model is pulled:\n"
-                f"  ollama pull {model_name}"
-            ) from e
-        return llm
\ No newline at end of file
+            return e
+        return time.perf_counter() - start
+
+    if not tasks:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="warmup") as pool:
+        futures = {name: pool.submit(timed, fn) for name, fn in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+OLLAMA_CHECK_TIMEOUT_S = 3.0
+
+
+def ollama_url(base_url: str | None) -> str:
+    """`base_url`, else OLLAMA_HOST (as the ollama client reads it), else the default."""
+    url = base_url or os.environ.get("OLLAMA_HOST") or "http://127.0.0.1:11434"
+    return (url if "://" in url else f"http://{url}").rstrip("/")
+
+
+def check_ollama_model(base_url: str | None, model_name: str) -> None:
+    """Cheap reachability check: list the server's models (GET /api/tags)
+    instead of generating. Raises RuntimeError if Ollama does not answer
+    or `model_name` is not pulled."""
+    import urllib.request
+
+    url = ollama_url(base_url)
+    try:
+        with urllib.request.urlopen(f"{url}/api/tags", timeout=OLLAMA_CHECK_TIMEOUT_S) as response:
+            models = json.load(response).get("models", [])
+    except Exception as e:
+        raise RuntimeError(f"Cannot reach Ollama at {url}: {e}\nMake sure Ollama is running (ollama serve).") from e
+    names = {m.get("name") for m in models} | {m.get("model") for m in models}
+    if model_name not in names and f"{model_name}:latest" not in names:
+        raise RuntimeError(f"Ollama at {url} does not have model '{model_name}'. Pull it with:\n"
+                           f"  ollama pull {model_name}")
+
@@ -0,0 +1,223 @@
+from collections import OrderedDict
+from instrumentation import CACHE_LOOKUPS
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# ---------------------------------------------------------------------------
+# Content-addressed cache for per-stage LLM results.
+#
+#   StageCache.get(stage, key)  →  memory LRU  →  SQLite  →  None (miss)
+#
+# Keys are SHA-256 digests of (stage, model, prompt version, inputs), so a
+# prompt or model change never serves stale answers. Values are stored as
+# JSON, which also means every hit hands the caller a fresh copy.
+# ---------------------------------------------------------------------------
+
+DEFAULT_TTL_S = 7 * 24 * 3600
+
+_LOOKUP_RESULTS = {"memory_hits": "memory", "disk_hits": "disk", "misses": "miss"}
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize, casefold and collapse whitespace so trivial
+    variations of a repeated message ("lol ok", "LOL  ok ") share a key."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def make_key(stage: str, model: str, prompt_version, *parts) -> str:
+    payload = json.dumps([stage, model, prompt_version, *parts], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()   # key -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, payload: str, expires_at: float) -> None:
+        with self._lock:
+            self._data[key] = (expires_at, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteTier:
+    EVICT_CHECK_EVERY = 500   # sets between size / expiry sweeps
+
+    def __init__(self, path: str, max_entries: int = 500_000):
+        self.path        = path
+        self.max_entries = max_entries
+        self._lock       = threading.Lock()
+        self._sets       = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stage_cache (
+                key         TEXT PRIMARY KEY,
+                stage       TEXT NOT NULL,
+                payload     TEXT NOT NULL,
+                expires_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_stage_cache_accessed ON stage_cache (accessed_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expires_at FROM stage_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM stage_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE stage_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+
+    def set(self, key: str, stage: str, payload: str, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stage_cache (key, stage, payload, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, stage, payload, expires_at, time.time()),
+            )
+            self._sets += 1
+            if self._sets % self.EVICT_CHECK_EVERY == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        # caller holds the lock
+        self._conn.execute("DELETE FROM stage_cache WHERE expires_at < ?", (time.time(),))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM stage_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM stage_cache WHERE key IN "
+                "(SELECT key FROM stage_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stage_cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class StageCache:
+    def __init__(self, path: str | None = None, memory_entries: int = 10_000,
+                 disk_entries: int = 500_000, ttl_s: float = DEFAULT_TTL_S):
+        self.ttl_s  = ttl_s
+        self.memory = MemoryTier(memory_entries)
+        self.disk   = SQLiteTier(path, disk_entries) if path else None
+        self._stats = {}
+        self._lock  = threading.Lock()
+
+    def _count(self, stage: str, field: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(
+                stage, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0}
+            )
+            counters[field] += 1
+        if field in _LOOKUP_RESULTS:
+            CACHE_LOOKUPS.inc(stage=stage, result=_LOOKUP_RESULTS[field])
+
+    def get(self, stage: str, key: str):
+        payload = self.memory.get(key)
+        if payload is not None:
+            self._count(stage, "memory_hits")
+            return json.loads(payload)
+
+        if self.disk is not None:
+            return self._get_from_disk(stage, key)
+
+        self._count(stage, "misses")
+        return None
+
+    def set(self, stage: str, key: str, value) -> None:
+        payload    = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + self.ttl_s
+        self.memory.set(key, payload, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, stage, payload, expires_at)
+        self._count(stage, "sets")
+
+    # async callers: the memory tier is answered inline, SQLite I/O
+    # (reads, the accessed_at touch, writes) runs in a worker thread so it
+    # never stalls the event loop
+    async def aget(self, stage: str, key: str):
+        payload = self.memory.get(key)
+        if payload is not None:
+            self._count(stage, "memory_hits")
+            return json.loads(payload)
+        if self.disk is None:
+            self._count(stage, "misses")
+            return None
+        return await asyncio.to_thread(self._get_from_disk, stage, key)
+
+    def _get_from_disk(self, stage: str, key: str):
+        row = self.disk.get(key)
+        if row is None:
+            self._count(stage, "misses")
+            return None
+        payload, expires_at = row
+        self.memory.set(key, payload, expires_at)   # promote
+        self._count(stage, "disk_hits")
+        return json.loads(payload)
+
+    async def aset(self, stage: str, key: str, value) -> None:
+        payload    = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + self.ttl_s
+        self.memory.set(key, payload, expires_at)
+        self._count(stage, "sets")
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, stage, payload, expires_at)
+
+    def stats(self) -> dict:
+        """Per-stage hit/miss counters plus overall hit rate and tier sizes."""
+        with self._lock:
+            stages = {stage: dict(c) for stage, c in self._stats.items()}
+        total_hits = total_lookups = 0
+        for counters in stages.values():
+            hits    = counters["memory_hits"] + counters["disk_hits"]
+            lookups = hits + counters["misses"]
+            counters["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+            total_hits    += hits
+            total_lookups += lookups
+        return {
+            "stages":         stages,
+            "hit_rate":       round(total_hits / total_lookups, 4) if total_lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries":   len(self.disk) if self.disk is not None else 0,
+        }
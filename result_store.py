@@ -0,0 +1,304 @@
+from datetime import datetime
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Append-only store of every analysis ToxicityAgent returns.
+#
+#   ToxicityAgent(result_store=True)  →  ResultStore.add()  →  writer thread  →  SQLite (WAL)
+#
+# add() only queues the row; one writer thread drains the queue and inserts
+# whatever has accumulated (up to `batch_size` rows) in a single
+# transaction, so under load rows are written in large batches and a
+# pipeline never waits on the disk. Each row keeps the full result dict as
+# JSON, plus the wall-clock time of the analysis and the stage models /
+# prompt versions that produced it (deduplicated in a `versions` table).
+#
+# classification, sub_label, language, is_sarcasm and created_at are
+# indexed together with the row id, so a filter plus keyset paging
+# (`WHERE … AND id > ? ORDER BY id LIMIT n`) reads only the rows it returns:
+# query() streams any number of results page by page, page() serves one
+# page and a cursor, counts() aggregates without fetching payloads. WAL
+# lets readers run while the writer appends.
+#
+#   python result_store.py query --classification TOXIC --since 2026-10-01 > toxic.jsonl
+#   python result_store.py counts --by language --is-sarcasm sarcastic
+# ---------------------------------------------------------------------------
+
+FILTER_COLUMNS = ("classification", "sub_label", "language", "is_sarcasm")
+PAGE_SIZE      = 1000
+
+_STOP = object()
+
+
+def _to_sql(filters: dict, since: float | None, until: float | None) -> tuple[list[str], list]:
+    clauses, params = [], []
+    for column, value in filters.items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown filter '{column}', expected one of {FILTER_COLUMNS}")
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+        params += values
+    if since is not None:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(until)
+    return clauses, params
+
+
+class ResultStore:
+    def __init__(self, path: str, batch_size: int = 500, max_queue: int = 100_000):
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        self.path       = path
+        self.batch_size = batch_size
+        self.written    = 0
+        self.failed     = 0
+        self._versions  = {}   # versions JSON -> versions.id
+        self._queue     = queue.Queue(max_queue)
+        self._closed    = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS versions (
+                id   INTEGER PRIMARY KEY,
+                spec TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                id             INTEGER PRIMARY KEY,
+                created_at     REAL NOT NULL,
+                classification TEXT NOT NULL,
+                sub_label      TEXT,
+                language       TEXT,
+                is_sarcasm     TEXT,
+                elapsed_s      REAL,
+                versions_id    INTEGER REFERENCES versions (id),
+                payload        TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_classification ON results (classification, id);
+            CREATE INDEX IF NOT EXISTS idx_results_sub_label      ON results (sub_label, id);
+            CREATE INDEX IF NOT EXISTS idx_results_language       ON results (language, id);
+            CREATE INDEX IF NOT EXISTS idx_results_is_sarcasm     ON results (is_sarcasm, id);
+            CREATE INDEX IF NOT EXISTS idx_results_created_at     ON results (created_at);
+        """)
+        self._writer = threading.Thread(target=self._write_loop, name="result-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)   # rows still queued at exit are written, not lost
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ------------------------------------------------------------------
+    # writing
+    # ------------------------------------------------------------------
+
+    def add(self, result: dict, elapsed_s: float | None = None, versions: dict | None = None) -> None:
+        """Queue one result for the writer; blocks only if `max_queue` rows are already waiting."""
+        if self._closed:
+            raise RuntimeError("ResultStore is closed")
+        self._queue.put((time.time(), result, elapsed_s, versions))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while item is not _STOP and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            rows = [row for row in batch if row is not _STOP]
+            try:
+                if rows:
+                    self._insert(rows)
+                    self.written += len(rows)
+            except sqlite3.Error:
+                self.failed += len(rows)
+                log.exception("Could not store %d results", len(rows))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(rows) < len(batch):
+                return
+
+    def _insert(self, rows: list) -> None:
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "INSERT INTO results (created_at, classification, sub_label, language, is_sarcasm, "
+                "elapsed_s, versions_id, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(created_at, result["classification"], result.get("sub_label"),
+                  result.get("detected_language"), result.get("is_sarcasm"),
+                  round(elapsed_s, 4) if elapsed_s is not None else None,
+                  self._versions_id(versions), json.dumps(result, ensure_ascii=False, default=str))
+                 for created_at, result, elapsed_s, versions in rows],
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _versions_id(self, versions: dict | None) -> int | None:
+        # writer thread only, inside its transaction
+        if not versions:
+            return None
+        spec = json.dumps(versions, sort_keys=True)
+        if spec not in self._versions:
+            self._conn.execute("INSERT OR IGNORE INTO versions (spec) VALUES (?)", (spec,))
+            (self._versions[spec],) = self._conn.execute("SELECT id FROM versions WHERE spec = ?", (spec,)).fetchone()
+        return self._versions[spec]
+
+    def flush(self) -> None:
+        """Wait until every queued result is written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._conn.close()
+        atexit.unregister(self.close)
+
+    # ------------------------------------------------------------------
+    # reading
+    # ------------------------------------------------------------------
+
+    def page(self, cursor: int | None = None, limit: int = 50, newest_first: bool = False,
+             since: float | None = None, until: float | None = None, **filters) -> tuple[list[dict], int | None]:
+        """One page of matching records and the cursor for the next one (None at the end).
+
+        Filters are column=value or column=[values] for FILTER_COLUMNS;
+        `since` / `until` are Unix timestamps."""
+        clauses, params = _to_sql(filters, since, until)
+        if cursor is not None:
+            clauses.append("r.id < ?" if newest_first else "r.id > ?")
+            params.append(cursor)
+        sql = ("SELECT r.id, r.created_at, r.elapsed_s, v.spec, r.payload FROM results r "
+               "LEFT JOIN versions v ON v.id = r.versions_id"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "")
+               + f" ORDER BY r.id {'DESC' if newest_first else 'ASC'} LIMIT ?")
+        # a connection per page: no read transaction stays open between pages to hold back WAL checkpoints
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+        finally:
+            conn.close()
+        records = [{"id": row_id, "created_at": created_at, "elapsed_s": elapsed_s,
+                    "versions": json.loads(spec) if spec else None, "result": json.loads(payload)}
+                   for row_id, created_at, elapsed_s, spec, payload in rows]
+        return records, (records[-1]["id"] if len(records) == limit else None)
+
+    def query(self, limit: int | None = None, page_size: int = PAGE_SIZE, **kwargs):
+        """Yield matching records (see page()) one keyset page at a time, so
+        memory stays flat however many match."""
+        cursor = None
+        while limit is None or limit > 0:
+            size = page_size if limit is None else min(page_size, limit)
+            records, cursor = self.page(cursor, size, **kwargs)
+            yield from records
+            if limit is not None:
+                limit -= len(records)
+            if cursor is None:
+                return
+
+    def counts(self, by: str = "classification", since: float | None = None, until: float | None = None,
+               **filters) -> dict:
+        """{value of `by`: number of matching results}, most frequent first."""
+        if by not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot group by '{by}', expected one of {FILTER_COLUMNS}")
+        clauses, params = _to_sql(filters, since, until)
+        sql = (f"SELECT {by}, COUNT(*) FROM results"
+               + (" WHERE " + " AND ".join(clauses) if clauses else "")
+               + f" GROUP BY {by} ORDER BY COUNT(*) DESC")
+        conn = self._connect()
+        try:
+            return dict(conn.execute(sql, params).fetchall())
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        try:
+            (last_id,) = conn.execute("SELECT MAX(id) FROM results").fetchone()
+        finally:
+            conn.close()
+        # rows are never deleted, so the last id is the row count without a full scan
+        return {"results": last_id or 0, "queued": self._queue.qsize(),
+                "written": self.written, "failed": self.failed}
+
+
+def parse_time(value: str) -> float:
+    """Unix seconds, or an ISO date / datetime (local time unless it has an offset)."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main(argv=None):
+    from rag_setup import RESULT_STORE_CONFIG
+
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument("--db", default=RESULT_STORE_CONFIG["path"],
+                         help=f"result store (default: {RESULT_STORE_CONFIG['path']})")
+    for column in FILTER_COLUMNS:
+        filters.add_argument(f"--{column.replace('_', '-')}", dest=column, action="append",
+                             help=f"only results with this {column} (repeatable)")
+    filters.add_argument("--since", type=parse_time, help="only results stored at or after this time (ISO or Unix)")
+    filters.add_argument("--until", type=parse_time, help="only results stored before this time (ISO or Unix)")
+
+    parser = argparse.ArgumentParser(description="Query the stored analysis results.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    query = commands.add_parser("query", parents=[filters], help="stream matching results as JSONL")
+    query.add_argument("--limit", type=int, help="stop after this many results")
+    query.add_argument("--newest-first", action="store_true", help="newest results first (default: oldest)")
+    query.add_argument("--results-only", action="store_true",
+                       help="print only the result dicts, without id / time / versions")
+    counts = commands.add_parser("counts", parents=[filters], help="count matching results by a column")
+    counts.add_argument("--by", choices=FILTER_COLUMNS, default="classification",
+                        help="column to group by (default: classification)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"no result store at {args.db}")
+    store = ResultStore(args.db)
+    selected = {column: getattr(args, column) for column in FILTER_COLUMNS}
+    try:
+        if args.command == "counts":
+            json.dump(store.counts(args.by, since=args.since, until=args.until, **selected), sys.stdout, indent=2)
+            sys.stdout.write("\n")
+            return
+        for record in store.query(limit=args.limit, newest_first=args.newest_first,
+                                  since=args.since, until=args.until, **selected):
+            sys.stdout.write(json.dumps(record["result"] if args.results_only else record, ensure_ascii=False) + "\n")
+    except BrokenPipeError:   # e.g. piped into head
+        sys.stderr.close()
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
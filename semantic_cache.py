@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from instrumentation import CACHE_LOOKUPS, SEMANTIC_VERIFICATIONS
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Near-duplicate result cache in front of ToxicityAgent.detect_and_respond.
+#
+# Raids and spam repeat the same message with small edits (misspellings,
+# emojis, swapped names) that defeat the exact-text StageCache. Here every
+# analyzed message is embedded (the CPU MiniLM model the few-shot index
+# uses) and added to an incremental FAISS IndexIDMap over IndexFlatIP; a new
+# message whose nearest neighbour has cosine similarity >= `threshold`
+# reuses that neighbour's whole result.
+#
+#   size      at most `max_entries` vectors; the least recently matched /
+#             added ones are removed (remove_ids) once the cap is passed
+#   disk      <path>/semantic.faiss + semantic.meta.jsonl + manifest.json,
+#             written every `save_every` additions and on save(); a manifest
+#             from another embedding model / pipeline setup is ignored
+#   quality   a `verify_rate` sample of hits is analyzed anyway and compared:
+#             a different label counts as a false reuse (the fresh result
+#             is returned). stats() reports hit and false-reuse rates.
+# ---------------------------------------------------------------------------
+
+INDEX_FILE    = "semantic.faiss"
+META_FILE     = "semantic.meta.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+
+def degraded(result: dict) -> bool:
+    # a result cut short by a deadline must not stand in for later messages
+    return bool(result.get("deadline", {}).get("degraded"))
+
+
+class SemanticCache:
+    def __init__(self, embed, namespace: str, path: str | None = None, threshold: float = 0.93,
+                 max_entries: int = 50_000, verify_rate: float = 0.02, save_every: int = 100):
+        """`embed(texts)` returns L2-normalized float32 vectors; `namespace`
+        names what the cached results depend on (models, pipeline mode)."""
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.embed       = embed
+        self.namespace   = namespace
+        self.path        = path
+        self.threshold   = threshold
+        self.max_entries = max_entries
+        self.verify_rate = verify_rate
+        self.save_every  = save_every
+        self.index       = None            # faiss.IndexIDMap, created at the first add (dim unknown until then)
+        self.entries     = OrderedDict()   # id -> (text, result), least recently used first
+        self._next_id    = 0
+        self._unsaved    = 0
+        self._lock       = threading.Lock()
+        self._stats      = {"hits": 0, "misses": 0, "verified": 0, "false_reuses": 0, "evictions": 0}
+        if path:
+            self._load()
+
+    # ------------------------------------------------------------------
+    # lookup / insert
+    # ------------------------------------------------------------------
+
+    def lookup(self, content: str, embedding: np.ndarray) -> dict | None:
+        """The cached result of the nearest prior message, if similar enough."""
+        with self._lock:
+            if self.index is None or not self.index.ntotal:
+                hit = None
+            else:
+                scores, ids = self.index.search(embedding.reshape(1, -1), 1)
+                hit = int(ids[0][0]) if ids[0][0] >= 0 and scores[0][0] >= self.threshold else None
+            if hit is None:
+                self._count("misses")
+                return None
+            self.entries.move_to_end(hit)
+            text, result = self.entries[hit]
+            self._count("hits")
+        # a fresh copy that describes the new message, plus what it matched
+        return {**json.loads(json.dumps(result)), "original": content,
+                "semantic_match": {"text": text, "similarity": round(float(scores[0][0]), 4)}}
+
+    def add(self, content: str, embedding: np.ndarray, result: dict) -> None:
+        import faiss
+
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexIDMap(faiss.IndexFlatIP(len(embedding)))
+            entry_id, self._next_id = self._next_id, self._next_id + 1
+            self.index.add_with_ids(embedding.reshape(1, -1), np.array([entry_id], dtype="int64"))
+            self.entries[entry_id] = (content, json.loads(json.dumps(result)))   # callers may mutate theirs
+            self._evict()
+            self._unsaved += 1
+            save = bool(self.path) and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def _evict(self) -> None:
+        # caller holds the lock; drop 1% extra so remove_ids (a scan) runs rarely
+        overflow = len(self.entries) - self.max_entries
+        if overflow <= 0:
+            return
+        overflow += self.max_entries // 100
+        stale = [self.entries.popitem(last=False)[0] for _ in range(min(overflow, len(self.entries)))]
+        self.index.remove_ids(np.array(stale, dtype="int64"))
+        self._stats["evictions"] += len(stale)
+
+    def should_verify(self) -> bool:
+        return self.verify_rate > 0 and random.random() < self.verify_rate
+
+    def verify(self, cached: dict, fresh: dict) -> bool:
+        """Record a sampled hit's check; True when the reuse was correct."""
+        correct = cached["classification"] == fresh["classification"]
+        with self._lock:
+            self._stats["verified"] += 1
+            if not correct:
+                self._stats["false_reuses"] += 1
+        SEMANTIC_VERIFICATIONS.inc(outcome="match" if correct else "false_reuse")
+        if not correct:
+            log.info("Semantic cache false reuse: '%.80s' matched '%.80s' (%s, fresh %s)", fresh["original"],
+                     cached["semantic_match"]["text"], cached["classification"], fresh["classification"])
+        return correct
+
+    def _count(self, field: str) -> None:
+        self._stats[field] += 1
+        CACHE_LOOKUPS.inc(stage="semantic", result="hit" if field == "hits" else "miss")
+
+    # the pipeline entry points: embed once, then hit / verify / analyze + add
+    def through(self, content: str, analyze) -> dict:
+        embedding = self.embed([content])[0]
+        cached = self.lookup(content, embedding)
+        if cached is not None and not self.should_verify():
+            return cached
+        result = analyze(content)
+        if degraded(result):
+            return result
+        if cached is not None:
+            self.verify(cached, result)
+        else:
+            self.add(content, embedding, result)
+        return result
+
+    async def athrough(self, content: str, aanalyze) -> dict:
+        # embedding and FAISS search are CPU-bound — keep them off the event loop
+        embedding = (await asyncio.to_thread(self.embed, [content]))[0]
+        cached = await asyncio.to_thread(self.lookup, content, embedding)
+        if cached is not None and not self.should_verify():
+            return cached
+        result = await aanalyze(content)
+        if degraded(result):
+            return result
+        if cached is not None:
+            self.verify(cached, result)
+        else:
+            await asyncio.to_thread(self.add, content, embedding, result)
+        return result
+
+    # ------------------------------------------------------------------
+    # persistence
+    # ------------------------------------------------------------------
+
+    def save(self) -> None:
+        """Write index, entries (LRU order) and manifest; files are swapped in
+        with os.replace, manifest last."""
+        import faiss
+
+        if not self.path:
+            return
+        with self._lock:
+            if self.index is None:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            faiss.write_index(self.index, os.path.join(self.path, INDEX_FILE + ".tmp"))
+            with open(os.path.join(self.path, META_FILE + ".tmp"), "w", encoding="utf-8") as f:
+                for entry_id, (text, result) in self.entries.items():
+                    f.write(json.dumps({"id": entry_id, "text": text, "result": result}, ensure_ascii=False) + "\n")
+            manifest = {"namespace": self.namespace, "dim": self.index.d, "count": len(self.entries),
+                        "next_id": self._next_id, "saved_at": round(time.time(), 3)}
+            with open(os.path.join(self.path, MANIFEST_FILE + ".tmp"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            for name in (INDEX_FILE, META_FILE, MANIFEST_FILE):
+                os.replace(os.path.join(self.path, name + ".tmp"), os.path.join(self.path, name))
+            self._unsaved = 0
+
+    def _load(self) -> None:
+        import faiss
+
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["namespace"] != self.namespace:
+            log.info("   Semantic cache in %s belongs to another setup — starting empty", self.path)
+            return
+        index = faiss.read_index(os.path.join(self.path, INDEX_FILE))
+        entries = OrderedDict()
+        with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                entries[record["id"]] = (record["text"], record["result"])
+        if index.ntotal != len(entries) or len(entries) != manifest["count"]:
+            log.warning("   Semantic cache in %s is inconsistent — starting empty", self.path)
+            return
+        self.index, self.entries, self._next_id = index, entries, manifest["next_id"]
+        with self._lock:
+            self._evict()   # max_entries may have shrunk since the save
+        log.info("   ✓ Semantic cache loaded (%d entries)", len(entries))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"]         = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["false_reuse_rate"] = round(stats["false_reuses"] / stats["verified"], 4) if stats["verified"] else None
+        return stats
@@ -0,0 +1,381 @@
+from agentai.agent import EXPLAIN_POLICIES, PIPELINE_MODES, ToxicityAgent
+from agentai.pipelineRunner import PipelineRunner
+from instrumentation import REGISTRY, SERVICE_REQUESTS, SERVICE_TEXTS, setup_logging
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import json
+import logging
+import signal
+
+# Responsibility: put ToxicityAgent behind HTTP for the chat backend.
+#
+#   POST /v1/moderate        {"text": "..."}            → one result
+#                            {"text": "...", "thread_id": "...", "speaker": "..."}
+#                                                        → one result, read in the thread's context
+#   POST /v1/moderate/batch  {"texts": ["...", ...]}    → {"results": [...]}
+#   GET  /health                                         → 200 ok / 503 starting|overloaded|draining
+#   GET  /metrics                                        → Prometheus text
+#
+# One process holds one ToxicityRAG, warmed at startup (/health says
+# `starting` until the stage clients are connected), and one PipelineRunner,
+# so at most `concurrency` pipelines talk to the provider at once whatever
+# the request rate.
+#
+# Coalescing: a text that is already being analyzed is not analyzed again —
+# the new request awaits the same task. Keys are the exact text (the result
+# echoes it back as `original`); near-duplicates still share the stage cache.
+#
+# Thread messages are never coalesced (each one is a turn of its thread)
+# and run one at a time per thread, in arrival order, so every message sees
+# the turns before it; see agentai/conversation.py.
+#
+# Backpressure: `max_pending` bounds the distinct analyses that are running
+# or queued for the runner. A request that would go past it gets 503 with
+# Retry-After instead of queueing without limit; coalesced texts are free.
+# A batch is admitted or rejected as a whole.
+#
+# Latency SLA: with `deadline_s` every analysis returns within that budget
+# (queueing included), degrading stages as needed; see agentai/deadline.py.
+#
+# The server is a small HTTP/1.1 implementation on asyncio streams
+# (keep-alive, Content-Length bodies, no chunked uploads) so the service
+# needs nothing beyond the pipeline's own dependencies.
+
+log = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1 << 20
+IDLE_TIMEOUT_S = 30        # keep-alive connections idle longer than this are closed
+DRAIN_TIMEOUT_S = 60       # on shutdown, wait this long for in-flight analyses
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 502: "Bad Gateway",
+           503: "Service Unavailable"}
+ROUTES = {"/v1/moderate": "POST", "/v1/moderate/batch": "POST", "/health": "GET", "/metrics": "GET"}
+
+
+class Overloaded(Exception):
+    """Admitting the request would exceed `max_pending` analyses."""
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ModerationService:
+    def __init__(self, agent: ToxicityAgent, concurrency: int = 16, max_pending: int = 256,
+                 max_batch: int = 64, deadline_s: float | None = None):
+        if max_pending < 1:
+            raise ValueError("max_pending must be >= 1")
+        self.agent       = agent
+        self.runner      = PipelineRunner(agent, concurrency, deadline_s=deadline_s)
+        self.max_pending = max_pending
+        self.max_batch   = max_batch
+        self.state       = "starting"   # → ok → draining
+        self.server      = None
+        self._inflight   = {}           # text (or (thread_id, n)) -> Task running its analysis
+        self._last_turn  = {}           # thread_id -> Task of the thread's latest message
+        self._turns      = 0
+        self.stats       = {"analyzed": 0, "coalesced": 0, "rejected": 0, "errors": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._inflight)
+
+    # ------------------------------------------------------------------
+    # coalescing + admission
+    # ------------------------------------------------------------------
+
+    def _count(self, outcome: str, n: int = 1) -> None:
+        self.stats[outcome] += n
+        SERVICE_TEXTS.inc(n, outcome=outcome)
+
+    def _admit(self, texts: list[str]) -> list[asyncio.Task]:
+        """One task per text, reusing in-flight ones; all or nothing."""
+        if self.state == "draining":
+            raise Overloaded("shutting down")
+        new = {text for text in texts if text not in self._inflight}
+        if self.pending + len(new) > self.max_pending:
+            self._count("rejected", len(texts))
+            raise Overloaded(f"{self.pending} analyses pending (limit {self.max_pending})")
+
+        tasks = []
+        for text in texts:
+            task = self._inflight.get(text)
+            if task is None:
+                task = self._inflight[text] = asyncio.ensure_future(self.runner.run(text))
+                task.add_done_callback(lambda done, text=text: self._settle(text, done))
+                self._count("analyzed")
+            else:
+                self._count("coalesced")
+            tasks.append(task)
+        return tasks
+
+    def _admit_turn(self, thread_id: str, text: str, speaker: str | None) -> asyncio.Task:
+        """A task for the thread's next message, started once its previous one is done."""
+        if self.state == "draining":
+            raise Overloaded("shutting down")
+        if self.pending >= self.max_pending:
+            self._count("rejected")
+            raise Overloaded(f"{self.pending} analyses pending (limit {self.max_pending})")
+
+        async def _turn(previous):
+            if previous is not None:
+                await asyncio.wait([previous])   # its failure is reported to its own client
+            return await self.runner.run_in_thread(thread_id, text, speaker)
+
+        self._turns += 1
+        key  = (thread_id, self._turns)
+        task = self._inflight[key] = asyncio.ensure_future(_turn(self._last_turn.get(thread_id)))
+        self._last_turn[thread_id] = task
+        task.add_done_callback(lambda done: self._settle(key, done))
+        self._count("analyzed")
+        return task
+
+    def _settle(self, key, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if isinstance(key, tuple) and self._last_turn.get(key[0]) is task:
+            del self._last_turn[key[0]]
+        # retrieve the exception even if every waiting client disconnected
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+            log.warning("Analysis failed: %s", task.exception())
+
+    async def analyze(self, text: str) -> dict:
+        # shield: a client that disconnects must not cancel a shared analysis
+        return await asyncio.shield(self._admit([text])[0])
+
+    async def analyze_in_thread(self, thread_id: str, text: str, speaker: str | None = None) -> dict:
+        return await asyncio.shield(self._admit_turn(thread_id, text, speaker))
+
+    async def analyze_many(self, texts: list[str]) -> list[dict | Exception]:
+        """Results in input order; a failed text is returned as its exception."""
+        tasks = self._admit(texts)
+        return await asyncio.gather(*(asyncio.shield(t) for t in tasks), return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    # routes
+    # ------------------------------------------------------------------
+
+    def health(self) -> tuple[int, dict]:
+        state = "overloaded" if self.state == "ok" and self.pending >= self.max_pending else self.state
+        body = {"status": state, "pending": self.pending, "max_pending": self.max_pending,
+                "mode": self.agent.mode, **self.stats}
+        if self.agent.semantic_cache is not None:
+            body["semantic_cache"] = self.agent.semantic_cache.stats()
+        if self.agent.graph is not None:
+            body["early_exit"] = self.agent.graph.summary()
+        if self.agent.threads.threads:
+            body["threads"] = self.agent.threads.stats()
+        return (200 if state == "ok" else 503), body
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> tuple[int, dict | str]:
+        if path not in ROUTES:
+            raise HTTPError(404, f"no route {path}")
+        if method != ROUTES[path]:
+            raise HTTPError(405, f"{path} expects {ROUTES[path]}")
+        if path == "/health":
+            return self.health()
+        if path == "/metrics":
+            return 200, REGISTRY.render()
+        if self.state == "starting":
+            raise Overloaded("warming up")
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        if path == "/v1/moderate/batch":
+            return await self._moderate_batch(payload)
+        return await self._moderate(payload)
+
+    async def _moderate(self, payload) -> tuple[int, dict]:
+        text = payload.get("text") if isinstance(payload, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, 'expected {"text": "<non-empty string>"}')
+        thread_id, speaker = payload.get("thread_id"), payload.get("speaker")
+        if thread_id is not None and (not isinstance(thread_id, str) or not thread_id
+                                      or not isinstance(speaker, (str, type(None)))):
+            raise HTTPError(400, '"thread_id" and "speaker" must be strings')
+        if thread_id is not None and self.agent.mode != "staged":
+            raise HTTPError(400, "thread_id is only supported with mode='staged'")
+        try:
+            if thread_id is not None:
+                return 200, await self.analyze_in_thread(thread_id, text, speaker)
+            return 200, await self.analyze(text)
+        except Overloaded:
+            raise
+        except Exception as e:
+            return 502, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _moderate_batch(self, payload) -> tuple[int, dict]:
+        texts = payload.get("texts") if isinstance(payload, dict) else None
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t.strip() for t in texts):
+            raise HTTPError(400, 'expected {"texts": ["<non-empty string>", ...]}')
+        if len(texts) > self.max_batch:
+            raise HTTPError(413, f"at most {self.max_batch} texts per batch")
+        results = await self.analyze_many(texts)
+        return 200, {"results": [
+            {"error": f"{type(r).__name__}: {r}"} if isinstance(r, Exception) else r for r in results
+        ]}
+
+    # ------------------------------------------------------------------
+    # HTTP/1.1 on asyncio streams
+    # ------------------------------------------------------------------
+
+    async def _handle(self, method: str, path: str, body: bytes) -> tuple[int, dict | str, dict]:
+        try:
+            status, payload = await self.dispatch(method, path, body)
+            headers = {}
+        except Overloaded as e:
+            status, payload, headers = 503, {"error": f"overloaded: {e}"}, {"Retry-After": "1"}
+        except HTTPError as e:
+            status, payload, headers = e.status, {"error": str(e)}, {}
+        except Exception as e:
+            log.exception("Unhandled error on %s %s", method, path)
+            status, payload, headers = 500, {"error": f"{type(e).__name__}: {e}"}, {}
+        SERVICE_REQUESTS.inc(route=path if path in ROUTES else "other", status=status)
+        return status, payload, headers
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool,
+                     headers: dict | None = None) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT_S)
+                except asyncio.TimeoutError:
+                    return
+                if not request_line.strip():
+                    return
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+                    await self._write(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    return
+                method, target, version = parts
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    await self._write(writer, 413 if length > 0 else 400,
+                                      {"error": f"Content-Length must be 0..{MAX_BODY_BYTES}"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload, extra = await self._handle(method, urlsplit(target).path, body)
+                keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                              and self.state != "draining")
+                await self._write(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass   # client went away or sent garbage mid-request
+        finally:
+            writer.close()
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.Server:
+        """Open the port, then connect the stage clients; /health reports
+        `starting` (and moderation requests get 503) until they are warm."""
+        self.server = await asyncio.start_server(self._serve_connection, host, port)
+        await self.agent.awarmup()
+        self.state = "ok"
+        log.info("Moderation service ready on %s", ", ".join(
+            f"http://{s.getsockname()[0]}:{s.getsockname()[1]}" for s in self.server.sockets))
+        return self.server
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_S) -> None:
+        """Stop accepting, let in-flight analyses finish, then close."""
+        self.state = "draining"
+        if self.server is not None:
+            self.server.close()
+        if self._inflight:
+            log.info("Draining %d in-flight analyses …", self.pending)
+            await asyncio.wait(list(self._inflight.values()), timeout=timeout)
+        if self.server is not None:
+            await self.server.wait_closed()
+        if self.agent.semantic_cache is not None:
+            await asyncio.to_thread(self.agent.semantic_cache.save)
+        if self.agent.result_store is not None:
+            await asyncio.to_thread(self.agent.result_store.close)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        """Run until SIGINT / SIGTERM, then drain."""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await self.start(host, port)
+        await stop.wait()
+        await self.drain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the toxicity pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port (default: 8080)")
+    parser.add_argument("--concurrency", type=int, default=16, help="pipelines running at once (default: 16)")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="distinct analyses running or queued before requests get 503 (default: 256)")
+    parser.add_argument("--max-batch", type=int, default=64, help="texts per batch request (default: 64)")
+    parser.add_argument("--mode", choices=PIPELINE_MODES, default="staged", help="pipeline mode (default: staged)")
+    parser.add_argument("--cascade", action="store_true", help="settle clear GOOD / TOXIC messages locally (staged mode only)")
+    parser.add_argument("--speculative", action="store_true", help="overlap sarcasm detection and classification (staged mode only)")
+    parser.add_argument("--explain", choices=EXPLAIN_POLICIES, default="always",
+                        help="when to generate LLM explanations (default: always; staged mode only)")
+    parser.add_argument("--micro-batch", type=int, metavar="N",
+                        help="pack up to N concurrent sarcasm / classifier calls into one LLM call (staged mode only)")
+    parser.add_argument("--long-document", type=int, metavar="TOKENS",
+                        help="split messages longer than TOKENS (~4 chars each) into overlapping chunks, "
+                             "analyze them concurrently and report the worst label with its spans")
+    parser.add_argument("--early-exit", action="store_true",
+                        help="skip the classifier and responder when the sarcasm stage already says sincere "
+                             "and GOOD (staged mode only)")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="reuse the result of a near-duplicate message analyzed before (embedding "
+                             "similarity; kept across runs in .cache/semantic)")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="answer every text within SECONDS, dropping the responder, then translation, then "
+                             "sarcasm detection as needed (staged mode only)")
+    parser.add_argument("--store-results", action="store_true",
+                        help="append every result to the result store (data/results.sqlite3; query it with "
+                             "python result_store.py)")
+    parser.add_argument("--log-level", default="INFO", help="log level (default: INFO)")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level)
+    agent = ToxicityAgent(mode=args.mode, cascade=args.cascade, explain=args.explain,
+                          speculative=args.speculative,
+                          micro_batch={"max_batch": args.micro_batch} if args.micro_batch else None,
+                          long_document={"max_tokens": args.long_document} if args.long_document else None,
+                          semantic_cache=args.semantic_cache, early_exit=args.early_exit,
+                          result_store=args.store_results)
+    service = ModerationService(agent, concurrency=args.concurrency, max_pending=args.max_pending,
+                                max_batch=args.max_batch, deadline_s=args.deadline)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
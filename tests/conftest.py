@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# tests import the top-level modules (rag_setup, batch, result_cache …)
+# the same way main.py / app.py do: from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# never let a test touch the real on-disk stage cache
+os.environ.setdefault("TOXICITY_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "stage_cache.sqlite3"))
+os.environ.setdefault("TOXICITY_SEMANTIC_CACHE_DIR", os.path.join(tempfile.mkdtemp(), "semantic"))
+os.environ.setdefault("TOXICITY_RESULT_STORE_PATH", os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+
+# …and never pick up a locally built few-shot index (it would need torch)
+os.environ.setdefault("TOXICITY_INDEX_DIR", os.path.join(tempfile.mkdtemp(), "index"))
@@ -0,0 +1,84 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fakes import REPLIES, stage_of
+
+
+class FakeLLMServer:
+    """Local OpenAI-compatible chat endpoint (the API Groq speaks).
+
+    `failures` is a list of HTTP statuses served, in order, before the
+    server starts answering; a 429 carries `Retry-After: 0`. `models` are
+    listed on GET /api/tags, like an Ollama server's pulled models.
+
+        with FakeLLMServer(failures=[429, 503]) as server:
+            ChatGroq(base_url=server.url, api_key="test", ...)
+    """
+
+    def __init__(self, failures: list[int] | None = None, models: list[str] | None = None):
+        self.failures = list(failures or [])
+        self.models   = list(models or [])
+        self.requests = []   # (status, stage)
+        self._lock    = threading.Lock()
+        self._server  = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict | None = None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path != "/api/tags":
+                    return self._send(404, {"error": "not found"})
+                with server._lock:
+                    server.requests.append((200, "tags"))
+                self._send(200, {"models": [{"name": m, "model": m} for m in server.models]})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt  = request["messages"][-1]["content"]
+                stage   = stage_of(prompt)
+                with server._lock:
+                    status = server.failures.pop(0) if server.failures else 200
+                    server.requests.append((status, stage))
+
+                if status != 200:
+                    headers = {"Retry-After": "0"} if status == 429 else {}
+                    return self._send(status, {"error": {"message": f"fake {status}", "type": "fake"}}, headers)
+
+                content = REPLIES.get(stage, "GOOD - SUPPORTIVE").format(text="x")
+                prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+                self._send(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": request["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import io
+import re
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# Canned replies in each agent's expected format, picked by prompt content.
+REPLIES = {
+    "translator": "DETECTED_LANGUAGE: English\nIS_ENGLISH: YES\nTRANSLATED: {text}",
+    "sarcasm":    "IS_SARCASTIC: NO\nTOXICITY: GOOD\nTRUE_MEANING: {text}",
+    "classifier": "GOOD - SUPPORTIVE",
+    "responder":  "Explanation: The message is friendly.",
+    "fused":      "DETECTED_LANGUAGE: English\nIS_ENGLISH: YES\nTRANSLATED: {text}\nIS_SARCASTIC: NO\n"
+                  "TRUE_MEANING: {text}\nCLASSIFICATION: GOOD - SUPPORTIVE\nEXPLANATION: Friendly.",
+}
+
+
+def stage_of(prompt: str) -> str:
+    if "Analyze each numbered text" in prompt:
+        return "sarcasm_batch"
+    if "Classify each numbered text" in prompt:
+        return "classifier_batch"
+    if "content moderation engine. Analyze the text in one pass" in prompt:
+        return "fused"
+    if "DETECTED_LANGUAGE" in prompt:
+        return "translator"
+    if "IS_SARCASTIC" in prompt:
+        return "sarcasm"
+    if "Explanation:" in prompt:
+        return "responder"
+    return "classifier"
+
+
+class FakeLLM:
+    """Deterministic stand-in for a LangChain chat model."""
+
+    def __init__(self, delay: float = 0.0, replies: dict | None = None):
+        self.delay   = delay
+        self.replies = {**REPLIES, **(replies or {})}
+        self.calls   = []
+        self.active  = 0
+        self.peak    = 0
+
+    def _reply(self, prompt: str) -> AIMessage:
+        stage = stage_of(prompt)
+        self.calls.append(stage)
+        if stage.endswith("_batch") and stage not in self.replies:
+            # one numbered block per `[n] """text"""` line, each the single-item reply
+            count = len(re.findall(r'^\s*\[\d+\] """', prompt, re.MULTILINE))
+            single = self.replies[stage.removesuffix("_batch")].format(text="x")
+            return AIMessage(content="\n".join(f"[{i}]\n{single}" for i in range(1, count + 1)))
+        return AIMessage(content=self.replies[stage].format(text="x"))
+
+    def invoke(self, prompt, *args, **kwargs):
+        time.sleep(self.delay)
+        return self._reply(prompt)
+
+    def stream(self, prompt, *args, **kwargs):
+        # a few characters per chunk, like a real token stream
+        text = self._reply(prompt).content
+        for i in range(0, len(text), 4):
+            time.sleep(self.delay / 10)
+            yield AIMessageChunk(content=text[i:i + 4])
+
+    async def astream(self, prompt, *args, **kwargs):
+        text = self._reply(prompt).content
+        for i in range(0, len(text), 4):
+            await asyncio.sleep(self.delay / 10)
+            yield AIMessageChunk(content=text[i:i + 4])
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._reply(prompt)
+        finally:
+            self.active -= 1
+
+
+def make_agent(llm=None, **kwargs):
+    """A ToxicityAgent whose every stage talks to `llm` (a FakeLLM by
+    default; a BackendPool stands in for the pooled setup)."""
+    from agentai.agent import ToxicityAgent
+    from llm_router import BackendPool
+    from rag_setup import GENERATION_PROFILES
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = ToxicityAgent(**kwargs)
+    llm = llm or FakeLLM()
+    if isinstance(llm, BackendPool):
+        agent.rag.pooled, agent.rag._pool = True, llm
+    else:
+        agent.rag._clients = dict.fromkeys(GENERATION_PROFILES, llm)
+    return agent
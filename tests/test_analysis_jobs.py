@@ -0,0 +1,72 @@
+import asyncio
+import io
+import json
+import time
+
+from analysis_jobs import DONE, FAILED, QUEUED, JobPool
+from batch import read_records
+from fakes import FakeLLM, make_agent
+from llm_scheduler import BATCH, PRIORITY
+
+
+def wait(job, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return job
+
+
+class StubAgent:
+    """Records the priority each message ran at; 'bad' messages fail."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay      = delay
+        self.priorities = []
+
+    async def adetect_and_respond(self, content):
+        self.priorities.append(PRIORITY.get())
+        await asyncio.sleep(self.delay)
+        if content == "bad":
+            raise RuntimeError("429 Too Many Requests")
+        return {"classification": "GOOD", "original": content}
+
+
+def test_message_runs_in_the_background_and_streams_partials():
+    pool = JobPool(make_agent(FakeLLM(delay=0.05), cache=False))
+    job = pool.submit_message("have a nice day")
+    assert not job.finished   # submit does not wait for the pipeline
+    wait(job)
+
+    assert job.status == [DONE] and job.progress == 1.0
+    assert job.results[0]["classification"] == "GOOD"
+    assert job.partial is job.results[0]
+
+
+def test_file_fans_out_at_batch_priority_and_keeps_failures():
+    agent = StubAgent(delay=0.01)
+    pool = JobPool(agent, concurrency=4)
+    texts = ["fine"] * 9 + ["bad"]
+    job = wait(pool.submit_file("chat.jsonl", texts, record_ids=list(range(100, 110))))
+
+    assert job.completed == 10 and job.failed == 1 and job.status[9] == FAILED
+    assert set(agent.priorities) == {BATCH}
+    lines = [json.loads(line) for line in job.to_jsonl().decode().splitlines()]
+    assert [line["id"] for line in lines] == list(range(100, 110))
+    assert lines[9]["error"] == "RuntimeError: 429 Too Many Requests"
+
+
+def test_cancel_stops_admitting_records():
+    pool = JobPool(StubAgent(delay=0.05), concurrency=2)
+    job = pool.submit_file("big.csv", ["fine"] * 50)
+    time.sleep(0.02)
+    job.cancel()
+    wait(job)
+
+    assert 2 <= job.completed < 50
+    assert job.status.count(QUEUED) == 50 - job.completed
+
+
+def test_records_are_read_from_an_uploaded_stream():
+    upload = io.StringIO("id,text\n1,hello\n2,\"you, again\"\n")
+    assert list(read_records(upload, ".CSV")) == [(0, "1", "hello", None), (1, "2", "you, again", None)]
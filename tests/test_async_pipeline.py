@@ -0,0 +1,73 @@
+import asyncio
+import contextlib
+import io
+import time
+
+from agentai.pipelineRunner import PipelineRunner
+from fakes import FakeLLM, make_agent
+
+# distinct, confidently-English texts so neither the stage cache nor the
+# translator fast path hides LLM calls from the concurrency check
+TEXTS = [f"thank you for message number {i}" for i in range(24)]
+
+
+def test_runner_bounds_concurrency_and_keeps_order():
+    llm = FakeLLM(delay=0.02)
+    agent = make_agent(llm)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = PipelineRunner(agent, max_concurrency=6).run_all(TEXTS)
+    assert [r["original"] for r in results] == TEXTS
+    assert llm.peak == 6
+
+
+def test_iter_completed_yields_errors_without_cancelling():
+    agent = make_agent(FakeLLM())
+    original = agent.adetect_and_respond
+
+    async def flaky(content):
+        if content.endswith("3"):
+            raise RuntimeError("429")
+        return await original(content)
+
+    agent.adetect_and_respond = flaky
+
+    async def go():
+        out = {}
+        async for key, result, error in PipelineRunner(agent, 4).iter_completed(enumerate(TEXTS[:6])):
+            out[key] = error
+        return out
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        errors = asyncio.run(go())
+    assert sorted(errors) == list(range(6))
+    assert isinstance(errors[3], RuntimeError)
+    assert sum(e is not None for e in errors.values()) == 1
+
+
+def test_lazy_connect_does_not_block_event_loop():
+    agent = make_agent(FakeLLM())
+    agent.rag._clients = {}
+
+    def slow_connect(model_name, *args):
+        time.sleep(0.3)   # e.g. the Ollama reachability check
+        return FakeLLM()
+
+    agent.rag._connect_llm = slow_connect
+
+    async def go():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.ensure_future(heartbeat())
+        await asyncio.gather(*(agent.adetect_and_respond(t) for t in TEXTS[:3]))
+        beat.cancel()
+        return ticks
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ticks = asyncio.run(go())
+    assert ticks >= 10
@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+import io
+import json
+
+import batch
+
+
+class FakeAgent:
+    """Only what PipelineRunner needs: an async adetect_and_respond."""
+
+    def __init__(self, fail=(), delays=None):
+        self.fail   = set(fail)
+        self.delays = delays or {}
+        self.calls  = []
+
+    async def adetect_and_respond(self, content):
+        self.calls.append(content)
+        await asyncio.sleep(self.delays.get(content, 0))
+        if content in self.fail:
+            raise RuntimeError("429 Too Many Requests")
+        return {"classification": "GOOD", "original": content}
+
+
+def write_input(path, n, extra_lines=()):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"m{i}", "text": f"msg {i}"}) + "\n")
+        for line in extra_lines:
+            f.write(line + "\n")
+
+
+def read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def run(job):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return job.run()
+
+
+def test_full_run_writes_every_record(tmp_path):
+    inp, out = tmp_path / "in.jsonl", str(tmp_path / "out.jsonl")
+    write_input(inp, 30, extra_lines=["", "not json", "   "])
+    stats = run(batch.BatchJob(FakeAgent(), str(inp), out, concurrency=4, checkpoint_every=7))
+
+    lines = read_output(out)
+    assert stats["processed"] == 30
+    assert stats["errors"] == 1                      # "not json"; blank lines are skipped
+    # indices are input line numbers, so the skipped blank line leaves a gap
+    assert sorted(l["index"] for l in lines) == list(range(30)) + [31]
+    assert not any(l.get("error") == "empty line" for l in lines)
+
+
+def test_resume_after_crash_skips_finished_and_truncates_torn_line(tmp_path):
+    inp, out = tmp_path / "in.jsonl", str(tmp_path / "out.jsonl")
+    write_input(inp, 50)
+
+    first = batch.BatchJob(FakeAgent(delays={f"msg {i}": 0.01 for i in range(50)}),
+                           str(inp), out, concurrency=4, checkpoint_every=5)
+
+    async def crash():
+        task = asyncio.ensure_future(first.arun())
+        await asyncio.sleep(0.06)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(crash())
+    with open(out, "ab") as f:
+        f.write(b'{"index": 4')                      # torn write from the crash
+    with open(out, "rb") as f:
+        done_before = len(f.read().splitlines()) - 1
+    assert 0 < done_before < 50
+
+    agent = FakeAgent()
+    stats = run(batch.BatchJob(agent, str(inp), out, concurrency=4))
+    lines = read_output(out)
+    assert sorted(l["index"] for l in lines) == list(range(50))
+    assert len(agent.calls) == 50 - done_before       # nothing analyzed twice
+    assert stats["skipped"] == done_before
+
+
+def test_pipeline_errors_are_retried_on_the_next_run(tmp_path):
+    inp, out = tmp_path / "in.jsonl", str(tmp_path / "out.jsonl")
+    write_input(inp, 20)
+
+    stats = run(batch.BatchJob(FakeAgent(fail={"msg 3", "msg 11"}), str(inp), out, concurrency=4))
+    assert stats["errors"] == 2
+    assert {l["index"] for l in read_output(out)} == set(range(20)) - {3, 11}
+
+    agent = FakeAgent()
+    stats = run(batch.BatchJob(agent, str(inp), out, concurrency=4))
+    assert sorted(agent.calls) == ["msg 11", "msg 3"]
+    assert stats["retried"] == 2 and stats["errors"] == 0
+    assert sorted(l["index"] for l in read_output(out)) == list(range(20))
+    assert read_output(out + batch.ERRORS_SUFFIX) == []
+
+    # nothing left to do
+    agent = FakeAgent()
+    run(batch.BatchJob(agent, str(inp), out, concurrency=4))
+    assert agent.calls == []
+
+
+def test_stalled_head_does_not_grow_done_above_past_max_ahead(tmp_path):
+    inp, out = tmp_path / "in.jsonl", str(tmp_path / "out.jsonl")
+    write_input(inp, 200)
+    job = batch.BatchJob(FakeAgent(delays={"msg 0": 0.3}), str(inp), out, concurrency=4, max_ahead=20)
+
+    peak = 0
+    mark_done = job.checkpoint.mark_done
+
+    def tracking_mark_done(index):
+        nonlocal peak
+        mark_done(index)
+        peak = max(peak, len(job.checkpoint.done_above))
+
+    job.checkpoint.mark_done = tracking_mark_done
+    stats = run(job)
+    assert stats["processed"] == 200
+    assert peak <= 20 + 4                             # limit + in-flight window
+
+
+def test_checkpoint_watermark_and_persistence(tmp_path):
+    ckpt = batch.Checkpoint(str(tmp_path / "x.ckpt"))
+    for i in (0, 2, 3, 1, 5):
+        ckpt.mark_done(i)
+    assert ckpt.watermark == 4 and ckpt.done_above == {5}
+    ckpt.save(123)
+
+    loaded = batch.Checkpoint(str(tmp_path / "x.ckpt"))
+    assert loaded.load()
+    assert (loaded.watermark, loaded.done_above, loaded.output_offset) == (4, {5}, 123)
+    assert loaded.is_done(3) and loaded.is_done(5) and not loaded.is_done(4)
@@ -0,0 +1,30 @@
+import asyncio
+import contextlib
+import io
+import time
+
+from agentai.agent import ToxicityAgent
+from benchmarks.fake_llm import FakeLLM, install, parse_latency
+
+
+def test_latency_is_seeded_by_prompt():
+    a, b = FakeLLM(seed=1), FakeLLM(seed=1)
+    assert a._plan("Classify: hi") == b._plan("Classify: hi")
+    assert a._plan("Classify: hi")[1] != FakeLLM(seed=2)._plan("Classify: hi")[1]
+    assert parse_latency("constant:0.25")(None) == 0.25
+
+
+def test_installed_fake_drives_the_whole_pipeline():
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = ToxicityAgent(cache=False)
+    fake = FakeLLM(latency={"classifier": "constant:0"}, time_scale=0)
+    install(agent, fake)
+
+    start = time.perf_counter()
+    result = agent.detect_and_respond("you are an idiot")
+    assert time.perf_counter() - start < 1
+    assert result["classification"] == "TOXIC"
+    assert fake.calls["classifier"] == 1 and fake.calls["responder"] == 1
+
+    result = asyncio.run(agent.adetect_and_respond("thanks, you saved my day"))
+    assert result["classification"] == "GOOD"
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from agentai.conversation import ConversationStore
+from fakes import FakeLLM, make_agent, stage_of
+from service import ModerationService
+
+SARCASTIC = {"sarcasm": "IS_SARCASTIC: YES\nTOXICITY: TOXIC\nTRUE_MEANING: you are useless",
+             "classifier": "TOXIC - INSULT"}
+
+
+class PromptLLM(FakeLLM):
+    """FakeLLM that keeps every prompt it was sent."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.prompts = []
+
+    def _reply(self, prompt):
+        self.prompts.append(str(prompt))
+        return super()._reply(prompt)
+
+    def last(self, stage: str) -> str:
+        return [p for p in self.prompts if stage_of(p) == stage][-1]
+
+
+def test_sarcasm_and_classifier_prompts_see_the_earlier_turns():
+    llm = PromptLLM()
+    agent = make_agent(llm, cache=False)
+    first = agent.detect_in_thread("t1", "did you push the release notes?", speaker="ana")
+    assert "CONVERSATION SO FAR" not in llm.last("sarcasm")
+    assert first["thread"]["id"] == "t1" and first["thread"]["turns"] == 1
+
+    second = asyncio.run(agent.adetect_in_thread("t1", "oh sure, great timing as always", speaker="ben"))
+    assert "ana: did you push the release notes?" in llm.last("sarcasm")
+    assert "ana: did you push the release notes?" in llm.last("classifier")
+    assert "ben:" not in llm.last("sarcasm")   # the message itself is the TEXT, not context
+    assert second["thread"]["turns"] == 2
+
+    # other threads and plain calls are unaffected
+    agent.detect_and_respond("did you push the release notes?")
+    assert "CONVERSATION SO FAR" not in llm.last("classifier")
+
+
+def test_context_stays_bounded_as_the_thread_grows():
+    llm = PromptLLM(replies=SARCASTIC)
+    agent = make_agent(llm, cache=False, conversation={"max_context_tokens": 120, "summary_tokens": 40})
+    lengths = []
+    for i in range(40):
+        agent.detect_in_thread("long", f"message number {i}: yeah, brilliant plan, really top work there")
+        lengths.append(len(llm.last("sarcasm")))
+
+    assert max(lengths[20:]) - min(lengths[20:]) < 40   # flat, not growing with the thread
+    prompt = llm.last("sarcasm")
+    assert "earlier messages: " in prompt and "sarcastic]" in prompt and "earlier: " in prompt
+    assert "message number 38" in prompt and "message number 0:" not in prompt
+    thread = agent.threads.threads["long"]
+    assert thread.total_turns == 40 and thread.folded + len(thread.turns) == 40 and thread.window <= 80
+
+
+def test_stage_cache_and_semantic_cache_respect_the_context():
+    llm = FakeLLM()
+    agent = make_agent(llm, semantic_cache={"path": None, "verify_rate": 0})
+    agent.semantic_cache.embed = lambda texts: np.ones((len(texts), 3), dtype="float32") / np.sqrt(3)
+    agent.detect_and_respond("conversation cache probe, nice one")
+    calls = len(llm.calls)
+
+    agent.detect_in_thread("a", "we shipped on friday")
+    before = len(llm.calls)
+    agent.detect_in_thread("a", "conversation cache probe, nice one")
+    assert {"sarcasm", "classifier"} <= set(llm.calls[before:])   # neither cache answered
+    assert len(agent.semantic_cache.entries) == 1 and calls > 0
+
+
+def test_idle_threads_are_evicted_and_the_store_is_capped():
+    store = ConversationStore(max_context_tokens=100, summary_tokens=20, idle_ttl_s=0.0, max_threads=2)
+    result = {"classification": "GOOD", "is_sarcasm": "no"}
+    for thread_id in ("a", "b", "c"):
+        store.record(thread_id, None, "hello there", result)
+    assert list(store.threads) == ["b", "c"] and store.evicted == 1
+
+    assert store.evict_idle() == 2
+    assert store.context("b") is None and store.stats() == {"threads": 0, "evicted": 3, "turns": 0}
+
+    with pytest.raises(ValueError, match="summary_tokens"):
+        ConversationStore(max_context_tokens=50, summary_tokens=50)
+    with pytest.raises(ValueError, match="mode='staged'"):
+        make_agent(cache=False, mode="fused").detect_in_thread("a", "hi")
+
+
+def test_service_runs_a_threads_messages_in_order():
+    llm = PromptLLM(delay=0.02)
+    service = ModerationService(make_agent(llm, cache=False))
+    service.state = "ok"
+
+    async def go():
+        payloads = [{"text": f"turn {i} of the standup chat", "thread_id": "room", "speaker": "sam"}
+                    for i in range(3)]
+        return await asyncio.gather(*(service.dispatch("POST", "/v1/moderate", json.dumps(p).encode())
+                                      for p in payloads))
+
+    results = asyncio.run(go())
+    assert [body["thread"]["turns"] for _, body in results] == [1, 2, 3]
+    assert "sam: turn 1 of the standup chat" in llm.last("sarcasm")
+    assert service.pending == 0 and not service._last_turn
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from agentai.deadline import DEADLINE, StageEstimates, pipeline_deadline
+from fakes import FakeLLM, make_agent, stage_of
+
+FAST = {"translator": 0.01, "sarcasm": 0.01, "classifier": 0.01, "responder": 0.01}
+
+
+class StageDelayLLM(FakeLLM):
+    """FakeLLM whose calls take `delays[stage]` seconds."""
+
+    def __init__(self, delays: dict, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = delays
+
+    def invoke(self, prompt, *args, **kwargs):
+        time.sleep(self.delays.get(stage_of(prompt), 0.0))
+        return self._reply(prompt)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        await asyncio.sleep(self.delays.get(stage_of(prompt), 0.0))
+        return self._reply(prompt)
+
+
+def agent_with(delays: dict, estimates: dict | None = None, **kwargs):
+    agent = make_agent(StageDelayLLM(delays), cache=False, **kwargs)
+    agent.estimates = StageEstimates(estimates)
+    return agent
+
+
+def test_slow_responder_is_cut_off_and_templated():
+    agent = agent_with({"responder": 2.0}, FAST)
+    start = time.monotonic()
+    result = asyncio.run(agent.adetect_and_respond("thanks for the review", deadline_s=0.4))
+
+    assert time.monotonic() - start < 0.6
+    assert result["classification"] == "GOOD" and result["explanation_source"] == "template"
+    assert result["deadline"]["timed_out"] == ["responder"] and result["deadline"]["degraded"]
+
+
+def test_stages_are_dropped_in_order_to_fit_the_budget():
+    # default estimates: translator + sarcasm + classifier + responder ≈ 3.3s > 1.5s,
+    # so the responder goes, then translation; sarcasm + classifier fit
+    agent = agent_with({})
+    result = agent.detect_and_respond("hola amigos, ¿qué tal el examen de mañana?", deadline_s=1.5)
+
+    assert result["deadline"]["skipped"] == ["translator", "responder"]
+    assert result["translation_path"] == "skipped" and result["detected_language"] == "unknown"
+    assert result["is_sarcasm"] == "no" and result["classification"] == "GOOD"
+
+
+def test_sync_timeouts_fall_back_to_face_value_and_the_sarcasm_verdict():
+    agent = agent_with({"sarcasm": 1.0}, FAST)
+    start = time.monotonic()
+    result = agent.detect_and_respond("see you at standup", deadline_s=0.3)
+    assert time.monotonic() - start < 0.5
+    assert result["deadline"]["timed_out"] == ["sarcasm"]
+    assert result["is_sarcasm"] == "unchecked" and result["classification"] == "GOOD"
+
+    agent = agent_with({"classifier": 1.0}, FAST)
+    result = agent.detect_and_respond("see you at standup", deadline_s=0.3)
+    assert result["deadline"]["timed_out"] == ["classifier"]
+    assert (result["classification"], result["sub_label"]) == ("GOOD", "UNVERIFIED")
+
+
+def test_degraded_results_are_not_reused_by_the_semantic_cache():
+    agent = agent_with({"responder": 1.0}, FAST, semantic_cache={"path": None, "verify_rate": 0})
+    agent.semantic_cache.embed = lambda texts: np.ones((len(texts), 3), dtype="float32") / np.sqrt(3)
+
+    assert agent.detect_and_respond("thanks for the review", deadline_s=0.2)["deadline"]["degraded"]
+    assert not agent.semantic_cache.entries
+
+
+def test_nested_deadlines_keep_the_earlier_one_and_fused_mode_is_rejected():
+    with pipeline_deadline(10):
+        outer = DEADLINE.get()
+        with pipeline_deadline(60):
+            assert DEADLINE.get() == outer
+    assert DEADLINE.get() is None
+
+    with pytest.raises(ValueError, match="mode='staged'"):
+        make_agent(FakeLLM(), cache=False, mode="fused").detect_and_respond("hi", deadline_s=1)
@@ -0,0 +1,64 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+import preprocess_data
+from example_index import ExampleIndex
+from fakes import make_agent
+
+EXAMPLES = [
+    {"text": "thank you so much",   "label": "GOOD",    "sub_label": "APPRECIATIVE"},
+    {"text": "you are an idiot",    "label": "TOXIC",   "sub_label": "PERSONAL ATTACK"},
+    {"text": "la reunión es a las 3", "label": "NEUTRAL", "sub_label": "FACTUAL STATEMENTS"},
+]
+VECTORS = np.eye(3, dtype="float32")
+
+
+def test_build_then_mmap_load_and_search(tmp_path):
+    manifest = ExampleIndex.build(str(tmp_path), EXAMPLES, VECTORS, "fake-model")
+    index = ExampleIndex.load(str(tmp_path))
+
+    assert len(index) == 3 and index.version == manifest["corpus_digest"]
+    hits = index.search(np.array([0.1, 0.9, 0.0], dtype="float32"), k=2)
+    assert [e["label"] for _, e in hits] == ["TOXIC", "GOOD"]
+    assert index.example(2)["text"] == "la reunión es a las 3"
+    assert index.search(VECTORS[0], k=10)[0][1] == EXAMPLES[0]
+
+
+def test_build_rejects_mismatched_embeddings(tmp_path):
+    with pytest.raises(ValueError):
+        ExampleIndex.build(str(tmp_path), EXAMPLES, VECTORS[:2], "fake-model")
+    assert not ExampleIndex.exists(str(tmp_path))
+
+
+def test_load_examples_validates_rows(tmp_path):
+    path = tmp_path / "examples.jsonl"
+    path.write_text('{"text": "hi", "label": "GOOD", "sub_label": "FRIENDLY"}\n\n'
+                    '{"text": "x", "label": "MEAN", "sub_label": "?"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match=":3: unknown label"):
+        preprocess_data.load_examples(str(path))
+
+
+def test_classifier_prompt_includes_retrieved_examples(tmp_path):
+    ExampleIndex.build(str(tmp_path), EXAMPLES, VECTORS, "fake-model")
+    agent = make_agent()
+    agent.rag._index = ExampleIndex.load(str(tmp_path))
+    agent.rag.embed = lambda texts: np.array([[0.0, 1.0, 0.0]], dtype="float32")
+
+    sarcasm = {"is_sarcasm": "no", "meaning": "you fool"}
+    examples = agent.rag.retrieve("you fool", k=1)
+    prompt = agent.classifier._build_prompt("you fool", sarcasm, examples)
+    assert '"you are an idiot" → TOXIC - PERSONAL ATTACK' in prompt
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent.classifier.classify("you fool", sarcasm)
+    assert agent.rag.cache.stats()["stages"]["classifier"]["sets"] == 1
+
+
+def test_missing_index_means_zero_shot():
+    agent = make_agent()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert agent.rag.retrieve("anything") == []
+    assert agent.rag.index_version is None
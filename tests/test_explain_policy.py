@@ -0,0 +1,53 @@
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from fakes import FakeLLM, make_agent
+
+TOXIC = {"classifier": "TOXIC - PERSONAL ATTACK"}
+
+
+def _run(agent, text):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return agent.detect_and_respond(text)
+
+
+def test_always_explains_every_result():
+    llm = FakeLLM()
+    result = _run(make_agent(llm), "thanks for the quick review")
+    assert result["explanation_source"] == "llm" and llm.calls[-1] == "responder"
+
+
+def test_toxic_policy_templates_non_toxic_results():
+    llm = FakeLLM()
+    result = _run(make_agent(llm, explain="toxic"), "thanks for the quick review")
+    assert "responder" not in llm.calls
+    assert result["explanation_source"] == "template"
+    assert result["explanation"].startswith("Classified as GOOD (supportive)")
+
+
+def test_toxic_policy_still_explains_toxic_results():
+    llm = FakeLLM(replies=TOXIC)
+    result = _run(make_agent(llm, explain="toxic"), "you are the worst person here")
+    assert result["explanation_source"] == "llm" and llm.calls.count("responder") == 1
+
+
+def test_on_demand_explains_only_when_asked():
+    llm = FakeLLM(replies=TOXIC)
+    agent = make_agent(llm, explain="on_demand")
+    result = _run(agent, "you are the worst reviewer on this team")
+    assert result["explanation_source"] == "template" and "responder" not in llm.calls
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        explained = asyncio.run(agent.aexplain(result))
+        again = agent.explain(explained)
+    assert explained["explanation"] == "The message is friendly."
+    assert explained["explanation_source"] == "llm" and again is explained
+    assert llm.calls.count("responder") == 1
+
+
+def test_explain_policy_requires_staged_mode():
+    with pytest.raises(ValueError):
+        make_agent(mode="fused", explain="toxic")
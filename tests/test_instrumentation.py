@@ -0,0 +1,95 @@
+import asyncio
+import urllib.request
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from fakes import FakeLLM, make_agent
+from instrumentation import (CACHE_LOOKUPS, LLM_CALLS, LLM_TOKENS, PARSES, QUEUE_WAIT, RESULTS, STAGE_SECONDS,
+                             Registry, serve_metrics, timed_stage)
+from llm_scheduler import LLMScheduler, ScheduledLLM
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    h = registry.histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        h.observe(value, stage="x")
+    text = registry.render()
+    assert '# TYPE t_seconds histogram' in text
+    assert 't_seconds_bucket{stage="x",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="x",le="1.0"} 3' in text
+    assert 't_seconds_bucket{stage="x",le="+Inf"} 4' in text
+    assert 't_seconds_count{stage="x"} 4' in text
+    assert 't_seconds_sum{stage="x"} 4.25' in text
+
+
+def test_counter_labels_are_checked_and_disabled_registry_is_a_noop():
+    registry = Registry()
+    c = registry.counter("t_total", "test", ("stage",))
+    with pytest.raises(ValueError):
+        c.inc(stag="typo")
+    registry.enabled = False
+    c.inc(stage="x")
+    assert c.value(stage="x") == 0
+    with pytest.raises(ValueError):
+        registry.counter("t_total", "again")
+
+
+def test_timed_stage_times_generators_to_exhaustion():
+    @timed_stage("test_gen")
+    def gen():
+        yield 1
+        yield 2
+
+    @timed_stage("test_async")
+    async def coro():
+        return 3
+
+    assert list(gen()) == [1, 2]
+    assert asyncio.run(coro()) == 3
+    assert STAGE_SECONDS.count(stage="test_gen") == 1
+    assert STAGE_SECONDS.count(stage="test_async") == 1
+
+
+def test_pipeline_records_stages_parses_cache_and_results(capsys):
+    agent = make_agent(FakeLLM(), cache=False)
+    before = {
+        "classifier": STAGE_SECONDS.count(stage="classifier"),
+        "parse_ok":   PARSES.value(stage="classifier", outcome="ok"),
+        "miss":       CACHE_LOOKUPS.value(stage="classifier", result="miss"),
+        "good":       RESULTS.value(classification="GOOD", tier="llm", explanation_source="llm"),
+    }
+    agent.detect_and_respond("metrics are friendly")
+    assert STAGE_SECONDS.count(stage="classifier") == before["classifier"] + 1
+    assert PARSES.value(stage="classifier", outcome="ok") == before["parse_ok"] + 1
+    assert CACHE_LOOKUPS.value(stage="classifier", result="miss") == before["miss"] + 1
+    assert RESULTS.value(classification="GOOD", tier="llm", explanation_source="llm") == before["good"] + 1
+    # progress goes to logging now — nothing on stdout unless it is configured
+    assert capsys.readouterr().out == ""
+
+
+def test_scheduled_llm_records_calls_tokens_and_queue_wait():
+    class WithUsage:
+        def invoke(self, prompt):
+            return AIMessage(content="ok", usage_metadata={"input_tokens": 40, "output_tokens": 5, "total_tokens": 45})
+
+    llm = ScheduledLLM(WithUsage(), LLMScheduler(), stage="test_stage")
+    waits = QUEUE_WAIT.count(priority="interactive")
+    llm.invoke("hello")
+    assert LLM_CALLS.value(stage="test_stage", outcome="ok") == 1
+    assert LLM_TOKENS.count(stage="test_stage", kind="prompt") == 1
+    assert LLM_TOKENS.count(stage="test_stage", kind="completion") == 1
+    assert QUEUE_WAIT.count(priority="interactive") == waits + 1
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    server = serve_metrics(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode()
+            assert response.headers["Content-Type"].startswith("text/plain")
+        assert "# TYPE toxicity_stage_seconds histogram" in body
+    finally:
+        server.shutdown()
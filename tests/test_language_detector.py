@@ -0,0 +1,27 @@
+from agentai.languageDetector import LanguageDetector
+
+detector = LanguageDetector()
+
+
+def test_plain_english_is_confident():
+    result = detector.detect("thank you so much for the help, this is really great")
+    assert result["confident"] and result["is_english"]
+
+
+def test_emoji_only_needs_no_translation():
+    assert detector.detect("😂😂 !!!")["confident"]
+
+
+def test_a_single_code_switched_word_goes_to_the_llm():
+    result = detector.detect("you are such a stupid gago lol")
+    assert not result["confident"]
+
+
+def test_foreign_text_is_not_confident():
+    for text in ("eres muy tonto y no sabes nada", "ang tanga mo talaga", "je suis très fatigué"):
+        assert not detector.detect(text)["confident"], text
+
+
+def test_non_latin_script_is_not_english():
+    result = detector.detect("ты идиот")
+    assert result == {"language": "non-Latin script", "is_english": False, "confident": False, "confidence": 0.0}
@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from fakes import FakeLLM, make_agent
+from llm_router import CIRCUIT_FAILURES, MIN_SAMPLES, Backend, BackendPool
+
+PROMPT = "Classify: hello"
+
+
+class Down:
+    """A backend that refuses every call."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt, *args, **kwargs):
+        self.calls += 1
+        raise ConnectionError("backend down")
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        return self.invoke(prompt)
+
+    def stream(self, prompt, *args, **kwargs):
+        self.calls += 1
+        raise ConnectionError("backend down")
+        yield
+
+    async def astream(self, prompt, *args, **kwargs):
+        self.calls += 1
+        raise ConnectionError("backend down")
+        yield
+
+
+def quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def test_async_hedge_takes_the_faster_backend():
+    slow, fast = FakeLLM(delay=0.5), FakeLLM(delay=0.01)
+    pool = BackendPool([Backend("slow", slow), Backend("fast", fast)], hedge_after_s=0.05)
+
+    async def go():
+        start = asyncio.get_running_loop().time()
+        reply = await pool.ainvoke("classifier", PROMPT)
+        return reply, asyncio.get_running_loop().time() - start
+
+    reply, elapsed = asyncio.run(go())
+    assert reply.content == "GOOD - SUPPORTIVE"
+    assert elapsed < 0.3   # bounded by hedge delay + fast backend, not the slow one
+    stats = pool.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    # the cancelled call still taught the slow backend's window how slow it is
+    assert pool.backends[0].window("classifier").latencies[-1] >= 0.05
+
+
+def test_sync_hedge_takes_the_faster_backend():
+    pool = BackendPool([Backend("slow", FakeLLM(delay=0.5)), Backend("fast", FakeLLM())], hedge_after_s=0.05)
+    assert pool.invoke("classifier", PROMPT).content == "GOOD - SUPPORTIVE"
+    assert pool.stats()["hedge_wins"] == 1
+
+
+def test_no_hedge_when_primary_is_fast():
+    primary, spare = FakeLLM(), FakeLLM()
+    pool = BackendPool([Backend("a", primary), Backend("b", spare)], hedge_after_s=0.2)
+    asyncio.run(pool.ainvoke("classifier", PROMPT))
+    assert len(primary.calls) == 1 and spare.calls == []
+    assert pool.stats()["hedges"] == 0
+
+
+def test_failover_on_error_sync_and_async():
+    down, up = Down(), FakeLLM()
+    pool = BackendPool([Backend("down", down), Backend("up", up)], hedge_after_s=None)
+    assert pool.invoke("sarcasm", "IS_SARCASTIC?").content.startswith("IS_SARCASTIC: NO")
+    assert asyncio.run(pool.ainvoke("sarcasm", "IS_SARCASTIC?")).content.startswith("IS_SARCASTIC: NO")
+    assert pool.stats()["failovers"] == 2
+
+
+def test_all_backends_failing_raises_the_error():
+    pool = BackendPool([Backend("a", Down()), Backend("b", Down())], hedge_after_s=0.01)
+    with pytest.raises(ConnectionError):
+        asyncio.run(pool.ainvoke("classifier", PROMPT))
+    with pytest.raises(ConnectionError):
+        pool.invoke("classifier", PROMPT)
+
+
+def test_circuit_opens_after_consecutive_failures():
+    down, up = Down(), FakeLLM()
+    pool = BackendPool([Backend("down", down), Backend("up", up)], hedge_after_s=None)
+    for _ in range(CIRCUIT_FAILURES):
+        quiet(pool.invoke, "classifier", PROMPT)
+    assert not pool.backends[0].available
+    calls = down.calls
+    pool.invoke("classifier", PROMPT)
+    assert down.calls == calls   # out of rotation: not even tried
+
+
+def test_routing_prefers_the_observed_faster_backend():
+    a, b = Backend("a", FakeLLM()), Backend("b", FakeLLM())
+    pool = BackendPool([a, b], hedge_after_s=None)
+    for _ in range(MIN_SAMPLES):
+        a.record("classifier", 0.8, True)
+        b.record("classifier", 0.1, True)
+    assert pool.ranked("classifier") == [b, a]
+    # routing is per stage: nothing observed for the responder yet
+    assert pool.ranked("responder") == [a, b]
+    # a high error rate outweighs a small latency lead
+    for _ in range(3 * MIN_SAMPLES):
+        b.record("classifier", None, False)
+    b.consecutive_failures = 0
+    assert pool.ranked("classifier")[0] is a
+
+
+def test_stream_fails_over_before_first_chunk():
+    pool = BackendPool([Backend("down", Down()), Backend("up", FakeLLM())])
+    text = "".join(chunk.content for chunk in pool.stream("responder", "Explanation:"))
+    assert text == "Explanation: The message is friendly."
+
+    async def go():
+        return "".join([c.content async for c in pool.astream("responder", "Explanation:")])
+
+    assert asyncio.run(go()) == "Explanation: The message is friendly."
+
+
+def test_pipeline_runs_through_a_pool():
+    down, up = Down(), FakeLLM()
+    pool = BackendPool([Backend("down", down), Backend("up", up)], hedge_after_s=None)
+    agent = make_agent(pool, cache=False)
+    result = quiet(agent.detect_and_respond, "a pooled hello")
+    assert result["classification"] == "GOOD"
+    assert {"sarcasm", "classifier", "responder"} <= set(up.calls)
+    # each stage keeps its own window
+    assert {"sarcasm", "classifier", "responder"} <= set(pool.backends[1].stages)
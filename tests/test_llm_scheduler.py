@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fake_llm_server import FakeLLMServer
+from llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, ScheduledLLM, TokenBucket, llm_priority
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class Flaky:
+    """Fails with the given statuses, then answers."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.statuses:
+            raise StatusError(self.statuses.pop(0))
+        return "ok"
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+def test_token_bucket_refills_and_tracks_debt():
+    clock = FakeClock()
+    bucket = TokenBucket(per_minute=60, capacity=2, clock=clock)
+    bucket.take(1)
+    bucket.take(1)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now = 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    bucket.adjust(2)                     # usage came in higher than reserved
+    assert bucket.wait_time(1) == pytest.approx(2.5)
+    assert bucket.wait_time(100) == pytest.approx(3.5)   # capped at capacity
+
+
+def test_retries_429_and_5xx_then_succeeds():
+    scheduler = LLMScheduler(base_delay_s=0.001)
+    llm = Flaky([429, 503])
+    assert ScheduledLLM(llm, scheduler).invoke("hi") == "ok"
+    stats = scheduler.stats()
+    assert llm.calls == 3 and stats["retries"] == 2 and stats["rate_limited"] == 1
+
+
+def test_client_errors_and_exhausted_retries_raise():
+    scheduler = LLMScheduler(max_retries=1, base_delay_s=0.001)
+    with pytest.raises(StatusError):
+        ScheduledLLM(Flaky([400]), scheduler).invoke("hi")
+    with pytest.raises(StatusError):
+        asyncio.run(ScheduledLLM(Flaky([500, 500]), scheduler).ainvoke("hi"))
+    assert scheduler.stats()["failed"] == 2
+
+
+def test_rpm_budget_spaces_requests():
+    scheduler = LLMScheduler(rpm=600, burst=1)   # one request per 100ms
+    llm = ScheduledLLM(Flaky([]), scheduler)
+
+    async def go():
+        await asyncio.gather(*(llm.ainvoke("x") for _ in range(4)))
+
+    start = time.perf_counter()
+    asyncio.run(go())
+    assert time.perf_counter() - start >= 0.28
+    assert scheduler.stats()["max_queue_depth"] >= 3
+
+
+def test_interactive_requests_jump_the_batch_queue():
+    scheduler = LLMScheduler(rpm=1200, burst=1)   # one request per 50ms
+    order = []
+
+    class Recorder:
+        async def ainvoke(self, prompt):
+            order.append(prompt)
+            return prompt
+
+    llm = ScheduledLLM(Recorder(), scheduler)
+
+    async def go():
+        with llm_priority(BATCH):
+            batch = [asyncio.ensure_future(llm.ainvoke(f"batch {i}")) for i in range(4)]
+        await asyncio.sleep(0.01)   # batch 0 admitted, the rest queued
+        with llm_priority(INTERACTIVE):
+            await llm.ainvoke("ui")
+        await asyncio.gather(*batch)
+
+    asyncio.run(go())
+    assert order[:2] == ["batch 0", "ui"]
+    stats = scheduler.stats()
+    assert stats["by_priority"] == {INTERACTIVE: 1, BATCH: 4}
+    assert stats["mean_wait_s"]["batch"] > stats["mean_wait_s"]["interactive"]
+
+
+def test_sync_threads_share_the_budget():
+    scheduler = LLMScheduler(rpm=1200, burst=1)
+    llm = ScheduledLLM(Flaky([]), scheduler)
+    threads = [threading.Thread(target=llm.invoke, args=("x",)) for _ in range(3)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.perf_counter() - start >= 0.09
+    assert scheduler.stats()["admitted"] == 3
+
+
+def test_chatgroq_against_a_local_fake_server():
+    from langchain_groq import ChatGroq
+
+    scheduler = LLMScheduler(rpm=600, tpm=100_000, base_delay_s=0.01)
+    with FakeLLMServer(failures=[429, 502]) as server:
+        client = ChatGroq(model="fake-model", api_key="test", base_url=server.url, max_retries=0)
+        reply = ScheduledLLM(client, scheduler).invoke("Classify this. TOXIC - HATE SPEECH")
+    assert reply.content == "GOOD - SUPPORTIVE"
+    assert [status for status, _ in server.requests] == [429, 502, 200]
+    assert scheduler.stats()["rate_limited"] == 1
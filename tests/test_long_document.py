@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from agentai.longDocument import CHARS_PER_TOKEN, merge_results, split_text
+from fakes import FakeLLM, make_agent
+
+POST = "\n\n".join(
+    " ".join(f"Paragraph {p} sentence {s} talks about the weekly release plan." for s in range(6))
+    for p in range(5)
+)
+
+
+def test_chunks_respect_the_budget_and_overlap_on_sentences():
+    spans = split_text(POST, max_tokens=60, overlap_tokens=20)
+    assert len(spans) > 3
+    assert spans[0][0] == 0 and spans[-1][1] == len(POST)
+    for (s1, e1), (s2, e2) in zip(spans, spans[1:]):
+        assert e1 - s1 <= 60 * CHARS_PER_TOKEN
+        assert s2 <= e1                          # no gap …
+        assert e1 - s2 <= 20 * CHARS_PER_TOKEN   # … and a bounded overlap
+        assert POST[s2:s2 + 9] == "Paragraph"    # chunks start on a sentence
+    assert split_text("short text", 60, 20) == [(0, 10)]
+
+
+def test_overlong_words_are_cut_by_characters():
+    blob = "x" * 1000
+    spans = split_text(f"see {blob} here", max_tokens=50, overlap_tokens=0)
+    assert all(e - s <= 200 for s, e in spans)
+    with pytest.raises(ValueError):
+        split_text(POST, max_tokens=10, overlap_tokens=10)
+
+
+def test_merge_takes_the_worst_label_and_merges_its_spans():
+    content = "a" * 30
+
+    def result(label):
+        return {"classification": label, "sub_label": f"{label} SUB", "is_sarcasm": "no", "explanation": label,
+                "tier": "llm", "translated": None, "original": "chunk"}
+
+    merged = merge_results(content, [(0, 10), (8, 20), (18, 30)],
+                           [result("GOOD"), result("TOXIC"), result("TOXIC")])
+    assert merged["classification"] == "TOXIC" and merged["explanation"] == "TOXIC"
+    assert merged["original"] == content
+    assert [(s["start"], s["end"]) for s in merged["spans"]] == [(8, 30)]
+    assert [c["classification"] for c in merged["chunks"]] == ["GOOD", "TOXIC", "TOXIC"]
+
+
+def test_agent_routes_long_inputs_through_concurrent_chunks():
+    llm = FakeLLM(delay=0.02, replies={"classifier": "NEUTRAL - FACTUAL STATEMENTS"})
+    agent = make_agent(llm, cache=False, long_document={"max_tokens": 60, "overlap_tokens": 10})
+
+    result = asyncio.run(agent.adetect_and_respond(POST))
+    chunks = len(split_text(POST, 60, 10))
+    assert result["original"] == POST and len(result["chunks"]) == chunks
+    assert llm.calls.count("classifier") == chunks and llm.peak > 1
+    assert result["classification"] == "NEUTRAL" and result["spans"]
+
+    sync = agent.detect_and_respond(POST)
+    assert sync["chunks"] == result["chunks"]
+
+    llm.calls.clear()
+    agent.detect_and_respond("a short message")
+    assert llm.calls.count("classifier") == 1
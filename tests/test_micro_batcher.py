@@ -0,0 +1,78 @@
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from agentai.microBatcher import MicroBatcher, split_numbered_blocks
+from agentai.pipelineRunner import PipelineRunner
+from fakes import FakeLLM, make_agent
+
+
+def test_split_numbered_blocks_tolerates_gaps_and_duplicates():
+    raw = "<think>[1]\nignored</think>\n[1]\nGOOD - KIND\n[3]\nTOXIC - INSULT\n[3]\nNEUTRAL - X\n[9]\nnope"
+    assert split_numbered_blocks(raw, 3) == ["GOOD - KIND", None, None]
+
+
+def test_batches_by_size_and_by_deadline():
+    seen = []
+
+    async def run_batch(items):
+        seen.append(list(items))
+        return [i * 10 for i in items]
+
+    async def run_one(item):
+        seen.append([item])
+        return -item
+
+    async def go():
+        batcher = MicroBatcher(run_batch, run_one, max_batch=3, max_wait_ms=10)
+        full = await asyncio.gather(*(batcher.submit(i) for i in range(1, 4)))
+        partial = await asyncio.gather(*(batcher.submit(i) for i in (4, 5)))
+        alone = await batcher.submit(6)
+        return full, partial, alone, batcher.summary()
+
+    full, partial, alone, summary = asyncio.run(go())
+    assert full == [10, 20, 30] and partial == [40, 50] and alone == -6
+    assert seen == [[1, 2, 3], [4, 5], [6]]
+    assert summary["batches"] == 2 and summary["singles"] == 1 and summary["mean_batch_size"] == 2.5
+
+
+def test_unparsed_items_and_batch_errors_fall_back_to_single_calls():
+    async def run_batch(items):
+        if 0 in items:
+            raise RuntimeError("reply truncated")
+        return [None if i == 2 else i for i in items]
+
+    async def run_one(item):
+        if item == 5:
+            raise ValueError("bad item")
+        return f"single {item}"
+
+    async def go():
+        batcher = MicroBatcher(run_batch, run_one, max_batch=2, max_wait_ms=5)
+        first = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        second = await asyncio.gather(batcher.submit(0), batcher.submit(5), return_exceptions=True)
+        return first, second, batcher.stats["fallbacks"]
+
+    first, second, fallbacks = asyncio.run(go())
+    assert first == [1, "single 2"]
+    assert second[0] == "single 0" and isinstance(second[1], ValueError)
+    assert fallbacks == 3
+
+
+def test_pipeline_packs_sarcasm_and_classifier_calls():
+    llm = FakeLLM(delay=0.01)
+    agent = make_agent(llm, cache=False, explain="on_demand", micro_batch={"max_batch": 8, "max_wait_ms": 20})
+    texts = [f"thanks a bunch for batch item {i}" for i in range(8)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = PipelineRunner(agent, max_concurrency=8).run_all(texts)
+
+    assert [r["classification"] for r in results] == ["GOOD"] * 8
+    assert llm.calls.count("sarcasm_batch") == 1 and "sarcasm" not in llm.calls
+    assert llm.calls.count("classifier_batch") == 1 and "classifier" not in llm.calls
+
+
+def test_micro_batch_requires_staged_mode():
+    with pytest.raises(ValueError):
+        make_agent(mode="fused", micro_batch={"max_batch": 4})
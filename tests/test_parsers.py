@@ -0,0 +1,65 @@
+import contextlib
+import io
+
+from fakes import FakeLLM, make_agent
+
+
+def _parse(agent_stage, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return agent_stage._parse_response(*args)
+
+
+def test_well_formed_replies_parse():
+    agent = make_agent()
+    translation, ok = _parse(agent.translator, "DETECTED_LANGUAGE: Spanish\nIS_ENGLISH: NO\nTRANSLATED: hello", "hola")
+    assert ok and translation["translated"] == "hello" and not translation["is_english"]
+
+    sarcasm, ok = _parse(agent.sarcasm, "IS_SARCASTIC: YES\nTOXICITY: TOXIC\nTRUE_MEANING: you failed", "great job")
+    assert ok and sarcasm["is_sarcasm"] == "sarcastic" and sarcasm["toxicity"] == "TOXIC"
+
+    assert _parse(agent.classifier, "TOXIC - PERSONAL ATTACK") == (("TOXIC", "PERSONAL ATTACK"), True)
+    assert _parse(agent.responder, "Explanation: It insults the reader.") == ("It insults the reader.", True)
+
+
+def test_malformed_replies_fall_back_and_say_so():
+    agent = make_agent()
+    assert _parse(agent.translator, "I think this is Spanish", "hola")[1] is False
+    sarcasm, ok = _parse(agent.sarcasm, "Sorry, I can't tell.", "great job")
+    assert not ok and sarcasm["is_sarcasm"] == "no" and sarcasm["meaning"] == "great job"
+    assert _parse(agent.classifier, "This looks toxic to me.") == (("TOXIC", "UNKNOWN"), False)
+    assert _parse(agent.responder, "It insults the reader.") == ("It insults the reader.", False)
+
+
+def test_fallback_results_are_not_cached():
+    llm = FakeLLM(replies={"classifier": "hard to say, probably fine"})
+    agent = make_agent(llm)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(2):
+            agent.classifier.classify("you did fine", {"is_sarcasm": "no", "meaning": "you did fine"})
+    assert llm.calls == ["classifier", "classifier"]
+    assert agent.rag.cache.stats()["stages"]["classifier"]["sets"] == 0
+
+
+def test_fused_reply_parses_into_the_staged_shape():
+    agent = make_agent(mode="fused")
+    raw = ("DETECTED_LANGUAGE: Tagalog\nIS_ENGLISH: NO\nTRANSLATED: you are stupid\nIS_SARCASTIC: NO\n"
+           "TRUE_MEANING: you are stupid\nCLASSIFICATION: TOXIC - PERSONAL ATTACK\n"
+           "EXPLANATION: It insults the reader\ndirectly.")
+    result, ok = _parse(agent.fused, raw, "ang tanga mo")
+    assert ok
+    assert (result["classification"], result["sub_label"]) == ("TOXIC", "PERSONAL ATTACK")
+    assert result["translated"] == "you are stupid" and result["original"] == "ang tanga mo"
+    assert result["explanation"] == "It insults the reader directly."
+
+    result, ok = _parse(agent.fused, "This is toxic.", "ang tanga mo")
+    assert not ok and result["sub_label"] == "UNKNOWN"
+
+
+def test_fused_results_are_cached_under_their_own_stage():
+    llm = FakeLLM()
+    agent = make_agent(llm, mode="fused")
+    with contextlib.redirect_stdout(io.StringIO()):
+        first  = agent.detect_and_respond("have a lovely fused day")
+        second = agent.detect_and_respond("have a lovely fused day")
+    assert first == second and llm.calls == ["fused"]
+    assert agent.rag.cache.stats()["stages"]["fused"]["memory_hits"] == 1
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from agentai.preClassifier import PreClassifier, has_sarcasm_markers
+
+# 3-d "embeddings": axis 0 = praise, axis 1 = insult, axis 2 = logistics
+VECTORS = {
+    "great work, thanks":          [1.0, 0.0, 0.0],
+    "love this, thank you":        [0.98, 0.0, 0.2],
+    "you are an idiot":            [0.0, 1.0, 0.0],
+    "shut up, loser":              [0.0, 0.97, 0.2],
+    "meeting moved to 3pm":        [0.0, 0.0, 1.0],
+}
+
+
+class FakeRAG:
+    def __init__(self, queries: dict):
+        self.vectors = {**VECTORS, **queries}
+        self.embed_calls = 0
+
+    def embed(self, texts):
+        self.embed_calls += 1
+        out = np.array([self.vectors[t] for t in texts], dtype="float32")
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.where(norms == 0, 1, norms)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "examples.jsonl"
+    labels = {
+        "great work, thanks":   ("GOOD", "APPRECIATIVE"),
+        "love this, thank you": ("GOOD", "APPRECIATIVE"),
+        "you are an idiot":     ("TOXIC", "PERSONAL ATTACK"),
+        "shut up, loser":       ("TOXIC", "HARASSMENT"),
+        "meeting moved to 3pm": ("NEUTRAL", "FACTUAL STATEMENTS"),
+    }
+    with open(path, "w") as f:
+        for text, (label, sub) in labels.items():
+            f.write(json.dumps({"text": text, "label": label, "sub_label": sub}) + "\n")
+    return str(path)
+
+
+def make(corpus, queries, **kwargs):
+    return PreClassifier(FakeRAG(queries), examples_path=corpus, k=3, min_similarity=0.5, **kwargs)
+
+
+def test_settles_clear_toxic(corpus):
+    pre = make(corpus, {"what an idiot": [0.0, 1.0, 0.0]})
+    result = pre.classify("what an idiot")
+    assert result["settled"] and result["label"] == "TOXIC"
+    assert pre.summary()["settled"]["TOXIC"] == 1
+
+
+def test_settles_clear_good(corpus):
+    pre = make(corpus, {"thanks, great job": [1.0, 0.0, 0.0]})
+    result = pre.classify("thanks, great job")
+    assert result["settled"] and result["label"] == "GOOD"
+
+
+def test_sarcastic_praise_is_escalated(corpus):
+    text = "Great work, you really nailed it… not"
+    pre = make(corpus, {text: [1.0, 0.0, 0.0]})
+    result = pre.classify(text)
+    assert result["label"] == "GOOD" and not result["settled"]
+    assert pre.summary()["escalated"] == 1
+
+
+def test_neutral_counts_under_its_own_label(corpus):
+    pre = make(corpus, {"moved to 4pm": [0.0, 0.0, 1.0]}, thresholds={"NEUTRAL": 0.5})
+    result = pre.classify("moved to 4pm")
+    summary = pre.summary()
+    assert result["settled"] and result["label"] == "NEUTRAL"
+    assert summary["settled"] == {"GOOD": 0, "TOXIC": 0, "NEUTRAL": 1}
+
+
+def test_zero_similarity_escalates_instead_of_crashing(corpus):
+    pre = make(corpus, {"qwerty": [-1.0, -1.0, -1.0]})
+    result = pre.classify("qwerty")
+    assert not result["settled"]
+    assert result["sub_label"] == "UNKNOWN"
+
+
+def test_async_loads_corpus_once(corpus):
+    pre = make(corpus, {"what an idiot": [0.0, 1.0, 0.0]})
+
+    async def go():
+        return await asyncio.gather(*(pre.aclassify("what an idiot") for _ in range(5)))
+
+    results = asyncio.run(go())
+    assert all(r["settled"] for r in results)
+    assert pre.summary()["total"] == 5
+    assert pre.rag.embed_calls == 1 + 5   # corpus once, then one per query
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("Oh great, another Monday.", True),
+    ("nice job genius", True),
+    ("thanks 🙄", True),
+    ("Thank you for the help!", False),
+])
+def test_sarcasm_markers(text, expected):
+    assert has_sarcasm_markers(text) is expected
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from result_cache import MemoryTier, SQLiteTier, StageCache, make_key, normalize_text
+
+
+def test_normalized_keys_share_an_entry():
+    a = make_key("sarcasm", "m", 1, normalize_text("LOL  ok "))
+    b = make_key("sarcasm", "m", 1, normalize_text("lol ok"))
+    assert a == b
+    assert a != make_key("sarcasm", "m", 2, normalize_text("lol ok"))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = MemoryTier(max_entries=2)
+    far = time.time() + 60
+    tier.set("a", "1", far)
+    tier.set("b", "2", far)
+    tier.get("a")              # a is now most recent
+    tier.set("c", "3", far)
+    assert tier.get("b") is None
+    assert tier.get("a") == "1" and tier.get("c") == "3"
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = StageCache(str(tmp_path / "c.sqlite3"), ttl_s=-1)
+    cache.set("classifier", "k", ["GOOD", "SUPPORTIVE"])
+    assert cache.get("classifier", "k") is None
+    assert cache.stats()["stages"]["classifier"]["misses"] == 1
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    StageCache(path).set("responder", "k", "because")
+
+    cache = StageCache(path)   # fresh process: empty memory tier
+    assert cache.get("responder", "k") == "because"
+    assert cache.get("responder", "k") == "because"
+    counters = cache.stats()["stages"]["responder"]
+    assert counters["disk_hits"] == 1 and counters["memory_hits"] == 1
+
+
+def test_sqlite_tier_trims_oldest_on_overflow(tmp_path):
+    tier = SQLiteTier(str(tmp_path / "c.sqlite3"), max_entries=3)
+    tier.EVICT_CHECK_EVERY = 5
+    far = time.time() + 60
+    for i in range(5):
+        tier.set(f"k{i}", "s", str(i), far)
+        time.sleep(0.001)
+    assert len(tier) == 3
+    assert tier.get("k0") is None and tier.get("k4") is not None
+
+
+def test_async_api_round_trips_through_disk(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+
+    async def go():
+        await StageCache(path).aset("translator", "k", {"translated": "hi"})
+        fresh = StageCache(path)
+        return await fresh.aget("translator", "k"), await fresh.aget("translator", "missing")
+
+    hit, miss = asyncio.run(go())
+    assert hit == {"translated": "hi"} and miss is None
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+import result_store
+from fakes import FakeLLM, make_agent
+from result_store import ResultStore
+
+LABELS = ("GOOD", "NEUTRAL", "TOXIC")
+
+
+def fill(store: ResultStore, n: int) -> None:
+    for i in range(n):
+        store.add({"classification": LABELS[i % 3], "sub_label": "X", "detected_language": "en" if i % 2 else "es",
+                   "is_sarcasm": "no", "original": f"message {i}"}, elapsed_s=0.01 * i, versions={"mode": "staged"})
+    store.flush()
+
+
+def test_every_public_entry_point_stores_its_result_once(tmp_path):
+    agent = make_agent(FakeLLM(), cache=False, result_store={"path": str(tmp_path / "r.sqlite3")},
+                       long_document={"max_tokens": 20, "overlap_tokens": 2})
+    agent.detect_and_respond("thanks for the review")
+    asyncio.run(agent.adetect_and_respond("see you at standup"))
+    list(agent.stream_detect_and_respond("nice work on the release"))
+    agent.detect_and_respond("a long message that goes on and on " * 10)   # chunks are not stored on their own
+    agent.result_store.flush()
+
+    records = list(agent.result_store.query())
+    assert [r["result"]["original"][:12] for r in records] == ["thanks for t", "see you at s", "nice work on", "a long messa"]
+    assert records[0]["versions"]["mode"] == "staged" and "@v" in records[0]["versions"]["classifier"]
+    assert all(r["elapsed_s"] is not None for r in records)
+    assert agent.result_store.stats()["results"] == 4
+    agent.result_store.close()
+
+
+def test_filters_and_keyset_pages(tmp_path):
+    store = ResultStore(str(tmp_path / "r.sqlite3"), batch_size=16)
+    fill(store, 100)
+
+    toxic = list(store.query(page_size=7, classification="TOXIC"))
+    assert len(toxic) == 33 and all(r["result"]["classification"] == "TOXIC" for r in toxic)
+    assert [r["id"] for r in toxic] == sorted(r["id"] for r in toxic)
+
+    page, cursor = store.page(limit=10, newest_first=True, classification=["GOOD", "NEUTRAL"], language="en")
+    assert [r["result"]["original"] for r in page[:2]] == ["message 99", "message 97"]
+    rest, end = store.page(cursor, limit=100, newest_first=True, classification=["GOOD", "NEUTRAL"], language="en")
+    assert len(page) + len(rest) == 34 and end is None and rest[0]["id"] < page[-1]["id"]
+
+    assert len(list(store.query(limit=5))) == 5
+    assert list(store.query(until=0)) == [] and len(list(store.query(since=0))) == 100
+    assert store.counts() == {"GOOD": 34, "NEUTRAL": 33, "TOXIC": 33}
+    assert store.counts(by="language", classification="TOXIC") == {"es": 17, "en": 16}
+    with pytest.raises(ValueError, match="Unknown filter"):
+        store.page(tier="llm")
+    store.close()
+
+
+def test_filtered_pages_are_served_from_the_indexes(tmp_path):
+    store = ResultStore(str(tmp_path / "r.sqlite3"))
+    conn = sqlite3.connect(store.path)
+    for column in result_store.FILTER_COLUMNS:
+        plan = " ".join(row[-1] for row in conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT id FROM results WHERE {column} IN (?) AND id > ? ORDER BY id LIMIT 50", ("x", 0)))
+        assert f"idx_results_{column}" in plan and "TEMP B-TREE" not in plan
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM results WHERE created_at >= ?", (0,)))
+    assert "idx_results_created_at" in plan
+    conn.close()
+    store.close()
+
+
+def test_close_writes_queued_rows_and_versions_are_shared(tmp_path):
+    store = ResultStore(str(tmp_path / "r.sqlite3"), batch_size=50)
+    for i in range(500):
+        store.add({"classification": "GOOD", "original": str(i)}, versions={"mode": "fused", "fused": "m@v2"})
+    store.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        store.add({"classification": "GOOD"})
+
+    conn = sqlite3.connect(store.path)
+    assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT versions_id) FROM results").fetchone() == (500, 1)
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    conn.close()
+    assert store.written == 500 and store.failed == 0
+
+
+def test_cli_streams_jsonl_and_counts(tmp_path, capsys):
+    path = str(tmp_path / "r.sqlite3")
+    store = ResultStore(path)
+    fill(store, 12)
+    store.close()
+
+    result_store.main(["query", "--db", path, "--classification", "TOXIC", "--newest-first", "--limit", "3",
+                       "--results-only"])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["original"] for r in lines] == ["message 11", "message 8", "message 5"]
+
+    result_store.main(["counts", "--db", path, "--by", "language", "--since", "2000-01-01"])
+    assert json.loads(capsys.readouterr().out) == {"es": 6, "en": 6}
+    with pytest.raises(SystemExit):
+        result_store.main(["query", "--db", str(tmp_path / "missing.sqlite3")])
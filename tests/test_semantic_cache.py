@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+
+from fakes import FakeLLM, make_agent
+from semantic_cache import SemanticCache
+
+# 3-d "embeddings": near-duplicates of a raid message share a direction
+VECTORS = {
+    "you are all idiots":        [1.0, 0.0, 0.0],
+    "you are all idiots!!! 🤡":   [0.99, 0.1, 0.0],
+    "u r all idiots":            [0.97, 0.2, 0.0],
+    "lunch is at noon":          [0.0, 0.0, 1.0],
+    "thanks for the fix":        [0.0, 1.0, 0.0],
+}
+
+
+def embed(texts):
+    out = np.array([VECTORS[t] for t in texts], dtype="float32")
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+def result(text, label="TOXIC"):
+    return {"classification": label, "sub_label": "X", "original": text}
+
+
+def test_near_duplicates_reuse_the_nearest_result():
+    cache = SemanticCache(embed, "test", threshold=0.95, verify_rate=0)
+    cache.add("you are all idiots", embed(["you are all idiots"])[0], result("you are all idiots"))
+
+    hit = cache.lookup("you are all idiots!!! 🤡", embed(["you are all idiots!!! 🤡"])[0])
+    assert hit["classification"] == "TOXIC" and hit["original"] == "you are all idiots!!! 🤡"
+    assert hit["semantic_match"]["text"] == "you are all idiots"
+    assert cache.lookup("lunch is at noon", embed(["lunch is at noon"])[0]) is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_eviction_bounds_the_index_and_keeps_recent_matches():
+    cache = SemanticCache(embed, "test", threshold=0.95, max_entries=2, verify_rate=0)
+    for text in ("you are all idiots", "lunch is at noon"):
+        cache.add(text, embed([text])[0], result(text))
+    cache.lookup("u r all idiots", embed(["u r all idiots"])[0])   # touch the raid entry
+    cache.add("thanks for the fix", embed(["thanks for the fix"])[0], result("thanks for the fix", "GOOD"))
+
+    assert cache.index.ntotal == len(cache.entries) == 2
+    assert [text for text, _ in cache.entries.values()] == ["you are all idiots", "thanks for the fix"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_saved_index_survives_a_restart_and_checks_its_namespace(tmp_path):
+    cache = SemanticCache(embed, "test", path=str(tmp_path), threshold=0.95, save_every=1)
+    cache.add("you are all idiots", embed(["you are all idiots"])[0], result("you are all idiots"))
+
+    reloaded = SemanticCache(embed, "test", path=str(tmp_path), threshold=0.95)
+    assert reloaded.lookup("u r all idiots", embed(["u r all idiots"])[0])["classification"] == "TOXIC"
+    reloaded.add("lunch is at noon", embed(["lunch is at noon"])[0], result("lunch is at noon", "NEUTRAL"))
+    assert sorted(reloaded.entries) == [0, 1]   # ids continue after the saved ones
+
+    other = SemanticCache(embed, "another-model", path=str(tmp_path))
+    assert other.index is None and not other.entries
+
+
+def test_agent_skips_the_pipeline_for_near_duplicates_and_samples_false_reuse():
+    llm = FakeLLM()
+    agent = make_agent(llm, cache=False, semantic_cache={"path": None, "threshold": 0.95, "verify_rate": 0})
+    agent.semantic_cache.embed = embed   # instead of the MiniLM model
+
+    first = agent.detect_and_respond("you are all idiots")
+    calls = len(llm.calls)
+    again = asyncio.run(agent.adetect_and_respond("u r all idiots"))
+    assert len(llm.calls) == calls
+    assert again["classification"] == first["classification"] and again["original"] == "u r all idiots"
+
+    # every hit verified; the fake labels everything GOOD, so force a mismatch
+    agent.semantic_cache.verify_rate = 1.0
+    agent.semantic_cache.entries[0][1]["classification"] = "TOXIC"
+    fresh = agent.detect_and_respond("you are all idiots!!! 🤡")
+    stats = agent.semantic_cache.stats()
+    assert fresh["classification"] == "GOOD" and "semantic_match" not in fresh
+    assert stats["verified"] == 1 and stats["false_reuse_rate"] == 1.0
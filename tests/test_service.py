@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+from fakes import FakeLLM, make_agent
+from service import ModerationService, Overloaded
+
+
+async def request(port: int, method: str, path: str, payload=None, keep_alive: bool = False):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    raw = await reader.readexactly(int(headers["content-length"]))
+    writer.close()
+    return status, headers, json.loads(raw) if headers["content-type"] == "application/json" else raw.decode()
+
+
+async def started(service: ModerationService) -> int:
+    server = await service.start("127.0.0.1", 0)
+    return server.sockets[0].getsockname()[1]
+
+
+def test_identical_inflight_texts_share_one_analysis():
+    llm = FakeLLM(delay=0.05)
+    service = ModerationService(make_agent(llm, cache=False))
+    service.state = "ok"   # skip start(): no port needed
+
+    async def go():
+        return await asyncio.gather(*(service.analyze("thanks for the help") for _ in range(5)),
+                                    service.analyze("a different message"))
+
+    results = asyncio.run(go())
+    assert all(r == results[0] for r in results[:5])
+    assert service.stats["analyzed"] == 2 and service.stats["coalesced"] == 4
+    assert llm.calls.count("classifier") == 2
+    assert service.pending == 0
+
+
+def test_overload_rejects_with_503_and_health_reports_it():
+    service = ModerationService(make_agent(FakeLLM(delay=0.2), cache=False), max_pending=2)
+
+    async def go():
+        port = await started(service)
+        slow = [asyncio.ensure_future(service.analyze(f"message {i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        # same text again is coalesced — no new capacity needed
+        coalesced = asyncio.ensure_future(service.analyze("message 0"))
+        status, headers, body = await request(port, "POST", "/v1/moderate", {"text": "one more"})
+        health = await request(port, "GET", "/health")
+        await asyncio.gather(*slow, coalesced)
+        after = await request(port, "GET", "/health")
+        await service.drain()
+        return status, headers, body, health, after
+
+    status, headers, body, health, after = asyncio.run(go())
+    assert status == 503 and headers["retry-after"] == "1" and "overloaded" in body["error"]
+    assert health[0] == 503 and health[2]["status"] == "overloaded"
+    assert after[0] == 200 and after[2]["status"] == "ok"
+    assert service.stats == {"analyzed": 2, "coalesced": 1, "rejected": 1, "errors": 0}
+
+
+def test_http_single_batch_and_errors():
+    service = ModerationService(make_agent(FakeLLM(), cache=False), max_batch=3)
+
+    async def go():
+        port = await started(service)
+        single = await request(port, "POST", "/v1/moderate", {"text": "nice work on the release"})
+        batch = await request(port, "POST", "/v1/moderate/batch", {"texts": ["hello there", "hello there", "bye"]})
+        too_big = await request(port, "POST", "/v1/moderate/batch", {"texts": ["a", "b", "c", "d"]})
+        bad = await request(port, "POST", "/v1/moderate", {"txt": "typo"})
+        wrong_method = await request(port, "GET", "/v1/moderate")
+        metrics = await request(port, "GET", "/metrics")
+        await service.drain()
+        return single, batch, too_big, bad, wrong_method, metrics
+
+    single, batch, too_big, bad, wrong_method, metrics = asyncio.run(go())
+    assert single[0] == 200 and single[2]["classification"] == "GOOD"
+    assert single[2]["original"] == "nice work on the release"
+    assert batch[0] == 200 and [r["original"] for r in batch[2]["results"]] == ["hello there", "hello there", "bye"]
+    assert too_big[0] == 413 and bad[0] == 400 and wrong_method[0] == 405
+    assert "toxicity_http_requests_total" in metrics[2]
+
+
+def test_keep_alive_serves_several_requests_on_one_connection():
+    service = ModerationService(make_agent(FakeLLM(), cache=False))
+
+    async def go():
+        port = await started(service)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        statuses = []
+        for _ in range(3):
+            writer.write(b"GET /health HTTP/1.1\r\nHost: test\r\n\r\n")
+            await writer.drain()
+            statuses.append(int((await reader.readline()).split()[1]))
+            length = 0
+            while (line := await reader.readline()) != b"\r\n":
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+        writer.close()
+        await service.drain()
+        return statuses
+
+    assert asyncio.run(go()) == [200, 200, 200]
+
+
+def test_draining_rejects_new_work():
+    service = ModerationService(make_agent(FakeLLM(), cache=False))
+    service.state = "draining"
+
+    async def go():
+        try:
+            await service.analyze("late message")
+        except Overloaded:
+            return True
+
+    assert asyncio.run(go())
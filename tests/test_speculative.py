@@ -0,0 +1,60 @@
+import asyncio
+import contextlib
+import io
+import time
+
+import pytest
+
+from fakes import FakeLLM, make_agent
+
+SARCASTIC = {"sarcasm": "IS_SARCASTIC: YES\nTOXICITY: TOXIC\nTRUE_MEANING: you broke it"}
+
+
+def _run(agent, text):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return agent.detect_and_respond(text)
+
+
+def test_hit_overlaps_sarcasm_and_classifier():
+    llm = FakeLLM(delay=0.1)
+    agent = make_agent(llm, speculative=True, cache=False)
+    start = time.perf_counter()
+    result = _run(agent, "thanks for reviewing my speculative patch")
+    elapsed = time.perf_counter() - start
+
+    assert result["classification"] == "GOOD"
+    assert llm.calls.count("classifier") == 1
+    assert elapsed < 0.35   # three sequential 0.1s calls would be ~0.4s (translator is local)
+    summary = agent.speculation_summary()
+    assert summary["hit_rate"] == 1.0 and summary["time_saved_s"] > 0.05
+
+
+def test_miss_reclassifies_with_the_sarcasm_context():
+    llm = FakeLLM(replies={**SARCASTIC, "classifier": "TOXIC - MOCKERY"})
+    agent = make_agent(llm, speculative=True, cache=False)
+    _run(agent, "wow great job breaking the build again")
+    assert llm.calls.count("classifier") == 2
+    summary = agent.speculation_summary()
+    assert (summary["runs"], summary["hit_rate"], summary["wasted_classifier_calls"]) == (1, 0.0, 1)
+    assert summary["time_saved_s"] <= 0
+
+
+def test_async_speculation_counts_hits_and_misses():
+    llm = FakeLLM(delay=0.02)
+    agent = make_agent(llm, speculative=True, cache=False)
+
+    async def go():
+        await agent.adetect_and_respond("a friendly async note")
+        llm.replies.update(SARCASTIC)
+        await agent.adetect_and_respond("oh sure, brilliant idea")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(go())
+    summary = agent.speculation_summary()
+    assert (summary["runs"], summary["hits"]) == (2, 1)
+    assert llm.calls.count("classifier") == 3
+
+
+def test_speculation_requires_staged_mode():
+    with pytest.raises(ValueError):
+        make_agent(mode="fused", speculative=True)
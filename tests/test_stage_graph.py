@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from fakes import FakeLLM, make_agent
+
+SARCASTIC = {"sarcasm": "IS_SARCASTIC: YES\nTOXICITY: TOXIC\nTRUE_MEANING: you are useless",
+             "classifier": "TOXIC - INSULT"}
+
+
+def test_sincere_good_skips_the_classifier_and_responder():
+    llm = FakeLLM()   # the sarcasm stage answers IS_SARCASTIC: NO / TOXICITY: GOOD
+    agent = make_agent(llm, cache=False, early_exit=True)
+    result = agent.detect_and_respond("thanks for fixing the build")
+
+    assert "classifier" not in llm.calls and "responder" not in llm.calls
+    assert result["classification"] == "GOOD" and result["sub_label"] == "SINCERE"
+    assert result["explanation_source"] == "template"
+    summary = agent.graph.summary()
+    assert summary["paths"] == {"sincere_good": 1} and summary["early_exit_rate"] == 1.0
+    assert summary["calls_saved_stage"] == {"sincere_good": {"classifier": 1, "responder": 1}}
+
+
+def test_sarcastic_text_takes_the_full_path_async():
+    llm = FakeLLM(replies=SARCASTIC)
+    agent = make_agent(llm, cache=False, early_exit=True)
+    result = asyncio.run(agent.adetect_and_respond("great job, genius"))
+
+    assert llm.calls.count("classifier") == 1 and llm.calls.count("responder") == 1
+    assert (result["classification"], result["sub_label"]) == ("TOXIC", "INSULT")
+    assert agent.graph.summary()["paths"] == {"full": 1}
+
+
+def test_graph_without_rules_matches_the_plain_pipeline():
+    plain_llm, graph_llm = FakeLLM(), FakeLLM()
+    plain = make_agent(plain_llm, cache=False).detect_and_respond("see you tomorrow")
+    graphed = make_agent(graph_llm, cache=False, early_exit={}).detect_and_respond("see you tomorrow")
+
+    assert graphed == plain and graph_llm.calls == plain_llm.calls
+
+
+def test_responder_savings_follow_the_explain_policy():
+    # under explain="toxic" a GOOD result never had an LLM explanation to save
+    agent = make_agent(FakeLLM(), cache=False, explain="toxic", early_exit=True)
+    events = list(agent.stream_detect_and_respond("nice work"))
+
+    assert events[-1][1]["sub_label"] == "SINCERE"
+    assert agent.graph.summary()["calls_saved_stage"] == {"sincere_good": {"classifier": 1}}
+
+
+def test_invalid_configurations_are_rejected():
+    with pytest.raises(ValueError, match="needs 'toxicity' labels"):
+        make_agent(early_exit={"bad": {"is_sarcasm": ("no",), "skip": ("classifier",)}})
+    with pytest.raises(ValueError, match="cannot be combined"):
+        make_agent(early_exit=True, speculative=True)
@@ -0,0 +1,59 @@
+import asyncio
+import contextlib
+import io
+
+from fakes import FakeLLM
+from rag_setup import GENERATION_PROFILES, MODELS, LLMProvider, ToxicityRAG
+
+
+def recording_rag(**kwargs):
+    rag = ToxicityRAG(cache=False, **kwargs)
+    built = {}
+
+    def connect(model_name, provider, base_url=None, settings=None):
+        llm = FakeLLM()
+        built[id(llm)] = (provider, model_name, settings)
+        return llm
+
+    rag._connect_llm = connect
+    return rag, built
+
+
+def test_each_stage_gets_its_own_model_and_profile():
+    rag, built = recording_rag(backends=[(LLMProvider.GROQ, None)])
+    provider, model, settings = built[id(rag.llm_classifier.llm)]
+    assert model == MODELS[LLMProvider.GROQ]["small"]
+    assert settings["max_tokens"] == GENERATION_PROFILES["classifier"]["max_tokens"]
+    assert settings["stop"] == ["\n\n"]
+
+    _, model, settings = built[id(rag.llm_responder.llm)]
+    assert model == MODELS[LLMProvider.GROQ]["qwen"]
+    assert settings["reasoning_effort"] == "none"   # model-specific kwargs ride along
+
+    assert rag.llm_translator is not rag.llm_sarcasm
+    assert rag.llm_for("classifier") is rag.llm_classifier   # built once
+
+
+def test_label_stages_are_small_and_terse():
+    for stage in ("sarcasm", "classifier"):
+        assert GENERATION_PROFILES[stage]["model"] == "small"
+    assert GENERATION_PROFILES["responder"]["model"] == "qwen"
+    assert GENERATION_PROFILES["classifier"]["max_tokens"] < GENERATION_PROFILES["responder"]["max_tokens"]
+
+
+def test_model_for_names_the_stage_model():
+    rag = ToxicityRAG(cache=False, backends=[(LLMProvider.LOCAL, None)])
+    assert rag.model_for("classifier") == MODELS[LLMProvider.LOCAL]["small"]
+    pooled = ToxicityRAG(cache=False, backends=[(LLMProvider.GROQ, None), (LLMProvider.LOCAL, None)])
+    assert pooled.model_for("responder") == "+".join(
+        (MODELS[LLMProvider.GROQ]["qwen"], MODELS[LLMProvider.LOCAL]["qwen"]))
+
+
+def test_pooled_backends_connect_per_stage():
+    rag, built = recording_rag(backends=[(LLMProvider.GROQ, None), (LLMProvider.LOCAL, "http://gpu:11434")])
+    reply = asyncio.run(rag.llm_classifier.ainvoke("Classify: hi"))
+    assert reply.content == "GOOD - SUPPORTIVE"
+    assert [(p, m) for p, m, _ in built.values()] == [(LLMProvider.GROQ, MODELS[LLMProvider.GROQ]["small"])]
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag.connect()
+    assert len(built) == 2 * len(GENERATION_PROFILES)
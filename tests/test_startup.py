@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from fake_llm_server import FakeLLMServer
+from fakes import FakeLLM
+from rag_setup import GENERATION_PROFILES, MODELS, LLMProvider, ToxicityRAG, check_ollama_model
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_after(statement: str, modules: tuple) -> set:
+    probe = f"import sys; {statement}; print(','.join(m for m in {modules!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    return set(filter(None, out.stdout.strip().split(",")))
+
+
+def test_imports_stay_lazy():
+    assert loaded_after("import agentai", ("rag_setup", "agentai.agent", "numpy")) == set()
+    assert loaded_after("from agentai import ToxicityAgent",
+                        ("langchain_ollama", "langchain_groq", "sentence_transformers", "http.server")) == set()
+
+
+def test_ollama_check_lists_models_instead_of_generating():
+    with FakeLLMServer(models=["qwen2.5:7b", "phi3:latest"]) as server:
+        check_ollama_model(server.url, "qwen2.5:7b")
+        check_ollama_model(server.url, "phi3")
+        with pytest.raises(RuntimeError, match="ollama pull llama3.1:8b"):
+            check_ollama_model(server.url, "llama3.1:8b")
+
+        server.models = list(MODELS[LLMProvider.LOCAL].values())
+        rag = ToxicityRAG(cache=False, backends=[(LLMProvider.LOCAL, server.url)])
+        rag.llm_for("translator")
+        rag.llm_for("responder")   # same model: not checked again
+        assert server.requests == [(200, "tags")] * 4
+
+    with pytest.raises(RuntimeError, match="Cannot reach Ollama"):
+        check_ollama_model(server.url, "qwen2.5:7b")
+
+
+def test_warmup_connects_every_stage_concurrently():
+    rag = ToxicityRAG(cache=False, backends=[(LLMProvider.GROQ, None)])
+
+    def slow_connect(model_name, *args):
+        time.sleep(0.2)
+        return FakeLLM()
+
+    rag._connect_llm = slow_connect
+    start = time.perf_counter()
+    timings = rag.warmup()
+    assert time.perf_counter() - start < 0.2 * len(GENERATION_PROFILES) / 2
+    assert set(GENERATION_PROFILES) <= set(timings) and "example_index" in timings
+    assert rag.connected and set(rag._clients) == set(GENERATION_PROFILES)
+
+
+def test_warmup_raises_for_a_single_backend_and_routes_around_a_pooled_one():
+    def fail(model_name, provider, *args):
+        if provider == LLMProvider.LOCAL:
+            raise RuntimeError("Cannot reach Ollama")
+        return FakeLLM()
+
+    single = ToxicityRAG(cache=False, backends=[(LLMProvider.LOCAL, None)])
+    single._connect_llm = fail
+    with pytest.raises(RuntimeError):
+        single.warmup()
+
+    pooled = ToxicityRAG(cache=False, backends=[(LLMProvider.GROQ, None), (LLMProvider.LOCAL, None)])
+    pooled._connect_llm = fail
+    timings = pooled.warmup()
+    assert isinstance(timings[("local", "classifier")], RuntimeError)
+    assert not isinstance(timings[("groq", "classifier")], Exception)
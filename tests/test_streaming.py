@@ -0,0 +1,59 @@
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from agentai.responderAgent import ExplanationStream
+from fakes import FakeLLM, make_agent
+
+
+def _feed(chunks):
+    stream = ExplanationStream()
+    out = "".join(stream.feed(c) for c in chunks) + stream.finish()
+    return out, stream.raw
+
+
+@pytest.mark.parametrize("chunks", [
+    ["Expl", "anation", ": It is ", "rude."],
+    ["<thi", "nk>hmm</th", "ink>\nExplanation:", " It is rude."],
+    ["  explanation:   ", "It is rude."],
+    ["It is", " rude."],
+])
+def test_explanation_stream_strips_think_and_prefix(chunks):
+    text, raw = _feed(chunks)
+    assert text == "It is rude." and raw == "".join(chunks)
+
+
+def test_explanation_stream_handles_reply_cut_short():
+    assert _feed(["Explana"])[0] == "Explana"
+    assert _feed(["<think>never closed"])[0] == "<think>never closed"
+
+
+def test_stream_emits_stages_in_order_then_the_result():
+    llm = FakeLLM(replies={"responder": "Explanation: Kind and supportive words throughout."})
+    agent = make_agent(llm)
+    with contextlib.redirect_stdout(io.StringIO()):
+        events = list(agent.stream_detect_and_respond("thanks again for the streaming help"))
+
+    names = [name for name, _ in events]
+    assert names[:3] == ["translation", "sarcasm", "classification"] and names[-1] == "result"
+    deltas = [payload for name, payload in events if name == "explanation"]
+    assert len(deltas) > 1
+    result = events[-1][1]
+    assert result["explanation"] == "".join(deltas) == "Kind and supportive words throughout."
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert agent.detect_and_respond("thanks again for the streaming help") == result   # cached by the stream
+
+
+def test_async_stream_matches_sync_shape():
+    agent = make_agent(FakeLLM(), explain="toxic")
+
+    async def go():
+        return [event async for event in agent.astream_detect_and_respond("a calm async streaming note")]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        events = asyncio.run(go())
+    assert [name for name, _ in events] == ["translation", "sarcasm", "classification", "explanation", "result"]
+    assert events[-1][1]["explanation_source"] == "template"